@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "case_app.middleware.ServerTimingMiddleware",
+    "case_app.routers.PrimaryPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -88,6 +90,42 @@ DATABASES = {
     }
 }
 
+# Set IMAGEGUARD_DB=sqlite to use a local SQLite file instead of MySQL
+# (benchmarks and development on machines without a MySQL server).
+if os.environ.get('IMAGEGUARD_DB') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    }
+
+# Keep connections open between requests (seconds; 0 closes them after every
+# request) and check them before reuse, so a restarted server is survived.
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = int(os.environ.get('IMAGEGUARD_DB_CONN_MAX_AGE', 60))
+    database['CONN_HEALTH_CHECKS'] = True
+
+# Optional read replica for the read-only views (case_app.routers). Set
+# IMAGEGUARD_DB_REPLICA_HOST (and _PORT) for a MySQL replica; with SQLite,
+# IMAGEGUARD_DB_REPLICA=1 adds a second alias on the same file to exercise the
+# routing locally. After writing, a client reads from the primary for
+# REPLICA_PIN_SECONDS while the replica catches up.
+REPLICA_DATABASE = None
+if os.environ.get('IMAGEGUARD_DB_REPLICA_HOST') and 'mysql' in DATABASES['default']['ENGINE']:
+    REPLICA_DATABASE = 'replica'
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['IMAGEGUARD_DB_REPLICA_HOST'],
+        'PORT': os.environ.get('IMAGEGUARD_DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif os.environ.get('IMAGEGUARD_DB_REPLICA') and 'sqlite' in DATABASES['default']['ENGINE']:
+    REPLICA_DATABASE = 'replica'
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['case_app.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+
 LOGOUT_REDIRECT_URL = '/'  # Redirect to the home page after logout
 
 
@@ -135,4 +173,128 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Media is served by case_app.views.serve_media after a permission check, with
+# ETags, 304s and byte ranges. Behind a front proxy, MEDIA_SENDFILE hands the
+# transfer to it: 'x-accel-redirect' (nginx, with an internal location at
+# MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT) or 'x-sendfile' (Apache, lighttpd).
+MEDIA_SENDFILE = os.environ.get('IMAGEGUARD_MEDIA_SENDFILE') or None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
 AUTH_USER_MODEL = 'auth_app.User'
+
+# Copy-move detection: upper bound on overlapping blocks analysed per image.
+# Larger images are downscaled so that detection time stays bounded.
+COPY_MOVE_BLOCK_SIZE = 8
+COPY_MOVE_MAX_BLOCKS = 250000
+
+# Registration before tampering diffs: phase correlation runs on grayscale
+# downscaled to this size; scale estimation costs two extra FFTs.
+REGISTRATION_WORKING_SIZE = 256
+REGISTRATION_ESTIMATE_SCALE = False
+
+# Hot-path timing: Server-Timing headers, per-request query counts and the
+# /metrics/ endpoint. Off by default; spans cost a single flag check then.
+INSTRUMENTATION_ENABLED = os.environ.get('IMAGEGUARD_INSTRUMENTATION') == '1'
+INTERNAL_IPS = ['127.0.0.1', '::1']
+
+# Heavy libraries (PDF export, pHash, SciPy, PyNaCl) are imported on first use
+# (case_app.engines). With IMAGEGUARD_PRELOAD=1 the WSGI/ASGI application
+# imports them when it loads instead, so a preloading prefork server
+# (gunicorn --preload) pays the cost once in the master rather than per worker.
+PRELOAD_ENGINES = os.environ.get('IMAGEGUARD_PRELOAD') == '1'
+
+# Caching for case pages. IMAGEGUARD_CACHE selects 'locmem' (default), 'file'
+# or a full backend path (with IMAGEGUARD_CACHE_LOCATION). Entries are
+# versioned per case and invalidated by signals; the timeout is a backstop.
+_cache_backend = os.environ.get('IMAGEGUARD_CACHE', 'locmem')
+_cache_backends = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backends.get(_cache_backend, _cache_backend),
+        'LOCATION': os.environ.get(
+            'IMAGEGUARD_CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'cache') if _cache_backend == 'file' else 'imageguard',
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 3000},
+    }
+}
+CASE_CACHE_ALIAS = 'default'
+CASE_CACHE_TIMEOUT = 300
+
+# Registration references (case_app.registration) hold an FFT spectrum of
+# about 512 KB per stored image, so they get their own small per-process cache
+# and never evict case pages: at most MAX_ENTRIES (~100 MB), for TIMEOUT seconds.
+CACHES['registration'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'imageguard-registration',
+    'TIMEOUT': 3600,
+    'OPTIONS': {'MAX_ENTRIES': 200},
+}
+REGISTRATION_CACHE_ALIAS = 'registration'
+
+# Progress of long operations (case_app.progress), kept in the case cache for
+# PROGRESS_TIMEOUT seconds. Reporters publish at most every PUBLISH_INTERVAL;
+# each event stream polls every POLL_INTERVAL and holds a worker thread for
+# up to STREAM_SECONDS before the browser reconnects.
+PROGRESS_TIMEOUT = 600
+PROGRESS_PUBLISH_INTERVAL = 0.25
+PROGRESS_POLL_INTERVAL = 0.5
+PROGRESS_STREAM_SECONDS = 120
+
+# Process pool used by the async upload/detection views. 0 workers means one
+# per CPU; at most WORKERS + QUEUE_SIZE jobs are accepted, then clients get
+# 429 with Retry-After (seconds).
+IMAGE_POOL_WORKERS = 0
+IMAGE_POOL_QUEUE_SIZE = 8
+IMAGE_POOL_RETRY_AFTER = 2
+
+# Chunked, resumable uploads (case_app.uploads). Partial files are kept under
+# MEDIA_ROOT/uploads until the session is finalized. A user may have at most
+# UPLOAD_MAX_OPEN_SESSIONS unfinished sessions; sessions idle for
+# UPLOAD_SESSION_TTL seconds expire and their partial files are removed.
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_MAX_CHUNK_SIZE = 32 * 1024 * 1024
+UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024
+UPLOAD_MAX_OPEN_SESSIONS = 5
+UPLOAD_SESSION_TTL = 24 * 3600
+
+# Near-duplicate clustering (case_app.clustering). Images whose pHashes differ
+# in at most CLUSTER_MAX_DISTANCE bits are related; every related pair is
+# found for distances up to 3. CANDIDATE_LIMIT caps the rows examined per save;
+# RELATED_LIMIT caps the copies listed per image on the related images page.
+CLUSTER_MAX_DISTANCE = 3
+CLUSTER_CANDIDATE_LIMIT = 1000
+CLUSTER_RELATED_LIMIT = 24
+
+# Batch verification (case_app.verification): stored images further than
+# VERIFY_MAX_DISTANCE pHash bits from a suspect are not compared pixel by pixel.
+VERIFY_MAX_DISTANCE = 16
+# Slots of the image pool (above) one verification may hold; it gets 429 when
+# none is free instead of filling the pool ahead of the async views.
+VERIFY_POOL_SLOTS = 2
+# Batch verification posts many files at once (Django's default limit is 100)
+DATA_UPLOAD_MAX_NUMBER_FILES = 1000
+
+# Bulk case deletion (case_app.deletion) queues media directories for removal.
+# With MEDIA_CLEANUP_ON_COMMIT they are removed by a background thread once the
+# deletion commits; `manage.py cleanup_media` retries anything left queued.
+MEDIA_CLEANUP_ON_COMMIT = True
+
+# Activity log retention (case_app.log_archive). `manage.py archive_logs` moves
+# entries older than ACTIVITY_LOG_RETENTION_DAYS out of the database into gzip
+# NDJSON files per case and month under ACTIVITY_LOG_ARCHIVE_ROOT; case log
+# pages keep showing them. None keeps every entry in the database.
+ACTIVITY_LOG_RETENTION_DAYS = 365
+ACTIVITY_LOG_ARCHIVE_ROOT = os.path.join(BASE_DIR, 'log_archive')
+
+# Layout of stored images (case_app.storage): "sharded" spreads each case's
+# files over MEDIA_SHARD_LEVELS directory levels named by MEDIA_SHARD_WIDTH
+# hex characters; "flat" keeps them all in cases/<case_id>/. Existing files
+# are moved with `manage.py shard_media`.
+MEDIA_LAYOUT = 'sharded'
+MEDIA_SHARD_LEVELS = 2
+MEDIA_SHARD_WIDTH = 2
@@ -1,13 +1,15 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from case_app.views import metrics, serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('cases/', include('case_app.urls')),  # Include case_app routes
     path('auth/', include('django.contrib.auth.urls')),  # Auth routes
+    path('metrics/', metrics, name='metrics'),  # Stage timing histograms (local only)
+    # Stored media, permission-checked, with ETags and byte ranges (case_app.media)
+    re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.+)$', serve_media, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,5 @@
+"""
+Benchmarks for ImageGuard.
+
+Each module can be run on its own, e.g. ``python -m benchmarks.copy_move``.
+"""
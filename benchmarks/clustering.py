@@ -0,0 +1,54 @@
+"""
+Scaling benchmark for the near-duplicate clustering rebuild.
+
+Generates random 64-bit pHashes with a share of planted near-duplicates
+(1-3 flipped bits), times ``cluster_arrays`` and checks that every planted
+pair ended up in the same cluster.  The database round trips of
+``clustering.rebuild`` are not included.
+
+    python -m benchmarks.clustering --images 1000000 5000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+
+def synthetic_hashes(count, duplicates=0.1, seed=0):
+    """Random pHashes and SHA keys plus (source, copy) index pairs of planted near-duplicates."""
+    rng = np.random.default_rng(seed)
+    phashes = rng.integers(np.iinfo(np.int64).min, np.iinfo(np.int64).max, count, dtype=np.int64)
+    sha_keys = rng.integers(np.iinfo(np.int64).min, np.iinfo(np.int64).max, count, dtype=np.int64)
+    planted = int(count * duplicates)
+    order = rng.permutation(count)
+    sources, copies = order[:planted], order[planted:2 * planted]
+    flips = np.zeros(planted, dtype=np.uint64)
+    for _ in range(3):
+        flips |= np.uint64(1) << rng.integers(0, 64, planted).astype(np.uint64)
+    phashes[copies] = (phashes[sources].view(np.uint64) ^ flips).view(np.int64)
+    return phashes, sha_keys, sources, copies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Share of images that are planted copies.")
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from case_app.clustering import cluster_arrays
+
+    print(f"{'images':>10} {'seconds':>9} {'us/image':>9} {'clusters':>9} {'recall':>7}")
+    for count in args.images:
+        phashes, sha_keys, sources, copies = synthetic_hashes(count, args.duplicates)
+        start = time.perf_counter()
+        labels = cluster_arrays(phashes, sha_keys)
+        elapsed = time.perf_counter() - start
+        clusters = int((np.bincount(labels) > 1).sum())
+        recall = float((labels[sources] == labels[copies]).mean()) if len(sources) else 1.0
+        print(f"{count:>10} {elapsed:>9.2f} {elapsed / count * 1e6:>9.2f} {clusters:>9} {recall:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Concurrency benchmark: many verifiers running detect_tampering at once.
+
+The WSGI side drives the synchronous view from a thread per verifier, the
+way a threaded WSGI server would.  The ASGI side drives the async view
+through Django's ASGI handler on one event loop, with the image work in the
+shared process pool; 429 answers are retried after a short pause and
+counted.  Both produce result dicts in the ``harness.measure`` format.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from case_app import workers
+from .harness import PERCENTILES, peak_rss_kb, percentile, reset_peak_rss
+
+RETRY_PAUSE = 0.05
+
+
+def _summarise(samples, elapsed, rejected, errors):
+    result = {
+        "iterations": len(samples),
+        "total_seconds": round(elapsed, 6),
+        "throughput_per_second": round(len(samples) / elapsed, 3) if elapsed else 0.0,
+        "mean_ms": round(sum(samples) / len(samples), 3) if samples else 0.0,
+        "max_ms": round(max(samples), 3) if samples else 0.0,
+        "peak_rss_kb": peak_rss_kb(),
+        "rejected_429": rejected,
+        "errors": errors,
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_ms"] = round(percentile(samples, pct), 3)
+    return result
+
+
+def run_wsgi(user, stored_image, images, verifiers, requests_each):
+    url = reverse("case_app:detect_tampering", args=[stored_image.id])
+    clients = []
+    for _ in range(verifiers):
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+
+    def verifier(index):
+        client, samples, errors = clients[index], [], 0
+        for request in range(requests_each):
+            name, data = images[(index + request) % len(images)]
+            start = time.perf_counter()
+            response = client.post(url, {"uploaded_image": SimpleUploadedFile(name, data, content_type="image/jpeg")})
+            if response.status_code == 200:
+                samples.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+        return samples, errors
+
+    reset_peak_rss()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=verifiers) as executor:
+        outcomes = list(executor.map(verifier, range(verifiers)))
+    elapsed = time.perf_counter() - started
+    samples = [sample for outcome in outcomes for sample in outcome[0]]
+    return _summarise(samples, elapsed, 0, sum(outcome[1] for outcome in outcomes))
+
+
+def run_asgi(user, stored_image, images, verifiers, requests_each):
+    url = reverse("case_app:detect_tampering_async", args=[stored_image.id])
+
+    async def verifier(index, client, counters):
+        samples = []
+        for request in range(requests_each):
+            name, data = images[(index + request) % len(images)]
+            start = time.perf_counter()
+            while True:
+                upload = SimpleUploadedFile(name, data, content_type="image/jpeg")
+                response = await client.post(url, {"uploaded_image": upload})
+                if response.status_code != 429:
+                    break
+                counters["rejected"] += 1
+                await asyncio.sleep(RETRY_PAUSE)
+            if response.status_code == 200:
+                samples.append((time.perf_counter() - start) * 1000)
+            else:
+                counters["errors"] += 1
+        return samples
+
+    async def main():
+        clients = []
+        for _ in range(verifiers):
+            client = AsyncClient()
+            await client.aforce_login(user)
+            clients.append(client)
+        workers.get_executor()  # start the pool outside the timed section
+
+        counters = {"rejected": 0, "errors": 0}
+        reset_peak_rss()
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(verifier(i, client, counters) for i, client in enumerate(clients)))
+        elapsed = time.perf_counter() - started
+        samples = [sample for outcome in outcomes for sample in outcome]
+        return _summarise(samples, elapsed, counters["rejected"], counters["errors"])
+
+    try:
+        return asyncio.run(main())
+    finally:
+        workers.shutdown()
@@ -0,0 +1,70 @@
+"""
+Scaling benchmark for the copy-move detector.
+
+Runs detection on synthetic images of growing area with an unbounded block
+count and reports time per block, time / (n log n) and the fitted log-log
+slope, which should stay close to 1 for O(n log n) matching.  A final run
+with the default ``max_blocks`` shows the bounded run time on large images.
+
+    python -m benchmarks.copy_move --sizes 256 512 1024 2048
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+from PIL import Image as PILImage
+
+from case_app.copy_move import DEFAULT_MAX_BLOCKS, detect_copy_move
+
+
+def synthetic_image(size, seed=0):
+    """Textured test image with one cloned square region."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, (size // 4, size // 4, 3), dtype=np.uint8)
+    pixels = np.asarray(PILImage.fromarray(base).resize((size, size), PILImage.BICUBIC)).copy()
+    pixels += rng.integers(0, 8, pixels.shape, dtype=np.uint8)
+    patch = size // 8
+    pixels[size // 2:size // 2 + patch, size // 2:size // 2 + patch] = pixels[:patch, :patch]
+    return PILImage.fromarray(pixels)
+
+
+def time_detection(image, max_blocks, repeat):
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        regions = detect_copy_move(image, max_blocks=max_blocks)
+        best = min(best, time.perf_counter() - start)
+    return best, regions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 768, 1024, 1536])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-blocks", type=int, default=DEFAULT_MAX_BLOCKS)
+    args = parser.parse_args(argv)
+
+    print(f"{'size':>6} {'blocks':>10} {'seconds':>9} {'us/block':>9} {'ns/(n log n)':>13} {'regions':>8}")
+    points = []
+    for size in args.sizes:
+        image = synthetic_image(size)
+        blocks = (size - 7) ** 2
+        seconds, regions = time_detection(image, None, args.repeat)
+        points.append((blocks, seconds))
+        print(f"{size:>6} {blocks:>10} {seconds:>9.3f} {seconds / blocks * 1e6:>9.2f} "
+              f"{seconds / (blocks * math.log2(blocks)) * 1e9:>13.2f} {len(regions):>8}")
+
+    if len(points) > 1:
+        x = np.log([blocks for blocks, _ in points])
+        y = np.log([seconds for _, seconds in points])
+        slope = np.polyfit(x, y, 1)[0]
+        print(f"\nlog-log slope: {slope:.2f} (1.0 = linear, 2.0 = quadratic)")
+
+    size = max(args.sizes) * 2
+    seconds, regions = time_detection(synthetic_image(size), args.max_blocks, 1)
+    print(f"bounded: {size}x{size} with max_blocks={args.max_blocks}: {seconds:.3f}s, {len(regions)} region(s)")
+
+
+if __name__ == "__main__":
+    main()
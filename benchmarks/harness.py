@@ -0,0 +1,98 @@
+"""
+Measurement primitives: latency percentiles, throughput and peak RSS, plus
+comparison of two result files for regression checks.
+"""
+import gc
+import math
+import resource
+import time
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def reset_peak_rss():
+    """
+    Reset the kernel's peak-RSS watermark (VmHWM) for this process so each
+    benchmark reports its own peak.  Returns False where unsupported.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as handle:
+            handle.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_kb():
+    """Peak resident set size in KiB, from /proc when available."""
+    try:
+        with open("/proc/self/status") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(func, inputs, warmup=1):
+    """
+    Call ``func`` once per item of ``inputs`` and return a result dict with
+    throughput, latency percentiles (milliseconds) and peak RSS.
+    """
+    inputs = list(inputs)
+    for item in inputs[:warmup]:
+        func(item)
+
+    gc.collect()
+    reset_peak_rss()
+    samples = []
+    started = time.perf_counter()
+    for item in inputs:
+        start = time.perf_counter()
+        func(item)
+        samples.append((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "iterations": len(samples),
+        "total_seconds": round(elapsed, 6),
+        "throughput_per_second": round(len(samples) / elapsed, 3) if elapsed else 0.0,
+        "mean_ms": round(sum(samples) / len(samples), 3) if samples else 0.0,
+        "max_ms": round(max(samples), 3) if samples else 0.0,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_ms"] = round(percentile(samples, pct), 3)
+    return result
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare two result mappings (benchmark name -> result dict).
+
+    Returns a list of ``(name, metric, baseline, current, change)`` for every
+    metric that got worse by more than ``threshold`` (a fraction, e.g. 0.1).
+    """
+    regressions = []
+    for name, result in current.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_rss_kb"):
+            old, new = previous.get(metric), result.get(metric)
+            if old and new is not None and new > old * (1 + threshold):
+                regressions.append((name, metric, old, new, new / old - 1))
+        old, new = previous.get("throughput_per_second"), result.get("throughput_per_second")
+        if old and new is not None and new < old * (1 - threshold):
+            regressions.append((name, "throughput_per_second", old, new, new / old - 1))
+    return regressions
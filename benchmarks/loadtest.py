@@ -0,0 +1,375 @@
+"""
+Load generator simulating investigators against a running ImageGuard server.
+
+Synthetic users are created (or reused) in the server's database and logged
+in by writing their sessions there, each with a case and a few stored images.
+Virtual users then send a weighted mix of requests over real HTTP, like
+browsers would: paging through the case list and logs, opening cases,
+creating cases, uploading images, running ``detect_tampering`` and exporting.
+While they run, the resident memory of the server's process tree is sampled.
+
+The report has throughput, p50/p95/p99 latency and error rates per endpoint,
+plus server RSS over time.  Redirects count as successes; statuses of 400 and
+above and connection errors count as errors.
+
+It runs from ``manage.py loadtest`` with the server's settings, against a
+server it starts itself or one already running:
+
+    python manage.py loadtest --serve --concurrency 20 --duration 60
+    python manage.py loadtest --url http://127.0.0.1:8000 --server-pid 4242 \\
+        --mix case_list=40,detect=20,export_pdf=5
+"""
+import http.client
+import os
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from case_app.deletion import delete_cases
+from case_app.models import Case, Image
+from .datasets import generate_images
+from .harness import PERCENTILES, percentile
+
+USER_PREFIX = "loadtest_"
+
+DEFAULT_MIX = {
+    "case_list": 30,
+    "case_details": 15,
+    "case_logs": 15,
+    "create_case": 5,
+    "upload": 10,
+    "detect": 15,
+    "export_csv": 7,
+    "export_pdf": 3,
+}
+
+
+def parse_mix(text):
+    """``name=weight,...`` as a dict; names must be in ``DEFAULT_MIX``."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown action {name!r}; choose from {', '.join(DEFAULT_MIX)}.")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one action with a positive weight.")
+    return mix
+
+
+def seed_users(count, images_per_user, width, height, seed=0):
+    """
+    Create or reuse ``count`` synthetic users, each with a case of
+    ``images_per_user`` stored images, and log them in.  The users cannot
+    log in with a password; they only get the sessions created here.  Returns
+    one state dict per user with its session cookie, case id and image ids.
+    """
+    User = get_user_model()
+    states = []
+    for index in range(count):
+        user, created = User.objects.get_or_create(username=f"{USER_PREFIX}{index}")
+        if created or user.has_usable_password():
+            user.set_unusable_password()
+            user.save()
+        case = Case.objects.create(name=f"Load test case {index}", investigator=user)
+        image_ids = []
+        for name, data in generate_images(images_per_user, width, height, seed=seed + index * images_per_user):
+            image = Image.objects.create(case=case, image=SimpleUploadedFile(name, data, content_type="image/jpeg"))
+            image_ids.append(image.id)
+        client = Client()
+        client.force_login(user)  # stores a real session the server will accept
+        states.append({"user_id": user.id, "session": client.cookies[settings.SESSION_COOKIE_NAME].value,
+                       "case_id": case.id, "image_ids": image_ids})
+    return states
+
+
+def cleanup():
+    """
+    Delete the synthetic users and every case they own; returns the number
+    of cases deleted.
+    """
+    ids = list(Case.objects.filter(investigator__username__startswith=USER_PREFIX).values_list("id", flat=True))
+    deleted = delete_cases(ids, None)["cases"] if ids else 0
+    get_user_model().objects.filter(username__startswith=USER_PREFIX).delete()
+    return deleted
+
+
+class HttpSession:
+    """
+    A browser-like HTTP client over one keep-alive connection: it keeps
+    cookies and sends forms as multipart.  Redirects are not followed, so
+    each request measures exactly one endpoint.
+    """
+
+    def __init__(self, base_url, cookies=None, headers=None, timeout=300):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=timeout)
+        self.cookies = dict(cookies or {})
+        self.headers = dict(headers or {})
+
+    def request(self, method, path, params=None, data=None, files=None):
+        """Send a request and return the response status after reading the body."""
+        if params:
+            path += "?" + urlencode(params)
+        headers = {**self.headers, "Cookie": "; ".join(f"{name}={value}" for name, value in self.cookies.items())}
+        body = None
+        if data is not None or files is not None:
+            body, headers["Content-Type"] = encode_multipart(data or {}, files or {})
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        for cookie in response.headers.get_all("Set-Cookie") or []:
+            name, _, value = cookie.split(";", 1)[0].partition("=")
+            self.cookies[name.strip()] = value
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+def encode_multipart(fields, files):
+    """A ``multipart/form-data`` body and its content type; ``files`` maps names to (filename, bytes, type)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode() + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _actions(uploads):
+    """name -> function(session, state, rng) returning the response status."""
+    def get(session, path, **kwargs):
+        return session.request("GET", path, **kwargs)
+
+    def post(session, path, **kwargs):
+        return session.request("POST", path, **kwargs)
+
+    def case_form(rng):
+        return {"name": f"Load test case {rng.randrange(1 << 30)}", "description": "Created by the load test",
+                "tampering_threshold": 5, "storage_format": "original", "storage_quality": 70,
+                "similarity_metric": "phash"}
+
+    def upload_file(field, rng):
+        name, data = rng.choice(uploads)
+        return {field: (name, data, "image/jpeg")}
+
+    return {
+        "case_list": lambda s, state, rng: get(
+            s, reverse("case_app:case_list"), params={"page": rng.randint(1, 3)}),
+        "case_details": lambda s, state, rng: get(
+            s, reverse("case_app:case_details", args=[state["case_id"]])),
+        "case_logs": lambda s, state, rng: get(
+            s, reverse("case_app:case_logs", args=[state["case_id"]]), params={"page": rng.randint(1, 3)}),
+        "create_case": lambda s, state, rng: post(
+            s, reverse("case_app:create_case"), data=case_form(rng)),
+        "upload": lambda s, state, rng: post(
+            s, reverse("case_app:upload_image", args=[state["case_id"]]), files=upload_file("image", rng)),
+        "detect": lambda s, state, rng: post(
+            s, reverse("case_app:detect_tampering", args=[rng.choice(state["image_ids"])]),
+            files=upload_file("uploaded_image", rng)),
+        "export_csv": lambda s, state, rng: get(
+            s, reverse("case_app:export_case_csv", args=[state["case_id"]])),
+        "export_pdf": lambda s, state, rng: get(
+            s, reverse("case_app:export_case_pdf", args=[state["case_id"]])),
+    }
+
+
+def tree_rss_kb(pid):
+    """Resident memory of ``pid`` and all its descendants (prefork workers), from /proc."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as handle:
+                    # the command name may contain spaces; the parent pid follows it
+                    parents[int(entry)] = int(handle.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    tree, frontier = {pid}, [pid]
+    while frontier:
+        children = [child for child, parent in parents.items() if parent in frontier and child not in tree]
+        tree.update(children)
+        frontier = children
+    total = 0
+    for member in tree:
+        try:
+            with open(f"/proc/{member}/status") as handle:
+                for line in handle:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+class RssSampler(threading.Thread):
+    """Samples the server's tree RSS every ``interval`` seconds until stopped."""
+
+    def __init__(self, pid, interval=1.0):
+        super().__init__(daemon=True)
+        self.pid, self.interval = pid, interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.started_at = time.perf_counter()
+
+    def run(self):
+        while True:
+            self.samples.append((round(time.perf_counter() - self.started_at, 2), tree_rss_kb(self.pid)))
+            if self.stopped.wait(self.interval):
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.samples
+
+
+def start_server(command, base_url, timeout=60):
+    """Launch a server with ``command`` and wait until ``base_url`` answers."""
+    process = subprocess.Popen(shlex.split(command) if isinstance(command, str) else command)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with status {process.returncode}.")
+        session = HttpSession(base_url, timeout=2)
+        try:
+            session.request("GET", reverse("case_app:case_list"))
+            return process
+        except OSError:
+            time.sleep(0.25)
+        finally:
+            session.close()
+    process.terminate()
+    raise RuntimeError(f"The server did not answer on {base_url} within {timeout} seconds.")
+
+
+def default_server_command(base_url):
+    address = base_url.split("://", 1)[-1].rstrip("/")
+    return [sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "runserver", "--noreload", address]
+
+
+def run(base_url, states, mix=None, concurrency=10, duration=30.0, requests_each=None, think_ms=0,
+        uploads=(), seed=0, server_pid=None, rss_interval=1.0):
+    """
+    Drive ``concurrency`` virtual users, each logged in as one of ``states``,
+    for ``duration`` seconds (or ``requests_each`` requests each).  Returns
+    the report dict.
+    """
+    mix = mix or DEFAULT_MIX
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    actions = _actions(list(uploads))
+    base_url = base_url.rstrip("/")
+    records = []
+    records_lock = threading.Lock()
+
+    def virtual_user(index):
+        state = states[index % len(states)]
+        rng = random.Random(seed * 7919 + index)
+        token = get_random_string(32)
+        session = HttpSession(
+            base_url, cookies={settings.SESSION_COOKIE_NAME: state["session"], settings.CSRF_COOKIE_NAME: token},
+            headers={"X-CSRFToken": token, "Referer": base_url + "/"},
+        )
+        deadline = time.perf_counter() + duration
+        done, local = 0, []
+        while done < requests_each if requests_each is not None else time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = actions[name](session, state, rng)
+            except (OSError, http.client.HTTPException):
+                status = None
+                session.close()  # reconnects on the next request
+            local.append((name, status, (time.perf_counter() - start) * 1000))
+            done += 1
+            if think_ms:
+                time.sleep(rng.uniform(0, 2 * think_ms) / 1000)
+        session.close()
+        with records_lock:
+            records.extend(local)
+
+    sampler = RssSampler(server_pid, rss_interval) if server_pid else None
+    if sampler:
+        sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(virtual_user, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    rss = sampler.stop() if sampler else []
+    return summarise(records, elapsed, rss, concurrency)
+
+
+def _stats(latencies, errors, elapsed):
+    count = len(latencies)
+    result = {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "throughput_per_second": round(count / elapsed, 3) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / count, 3) if count else 0.0,
+        "max_ms": round(max(latencies), 3) if count else 0.0,
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_ms"] = round(percentile(latencies, pct), 3)
+    return result
+
+
+def summarise(records, elapsed, rss, concurrency):
+    """Per-endpoint and overall statistics of ``(name, status, ms)`` records."""
+    endpoints = {}
+    for name in sorted({name for name, _, _ in records}):
+        mine = [(status, ms) for record_name, status, ms in records if record_name == name]
+        errors = sum(1 for status, _ in mine if status is None or status >= 400)
+        endpoints[name] = _stats([ms for _, ms in mine], errors, elapsed)
+        endpoints[name]["statuses"] = dict(sorted(Counter(
+            "failed" if status is None else str(status) for status, _ in mine).items()))
+    errors = sum(result["errors"] for result in endpoints.values())
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "overall": _stats([ms for _, _, ms in records], errors, elapsed),
+        "endpoints": endpoints,
+        "server_rss_kb": rss,
+    }
+
+
+def format_report(report):
+    """The report as lines of text."""
+    lines = [f"{'endpoint':<13} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"]
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, result in rows:
+        lines.append(
+            f"{name:<13} {result['requests']:>8} {result['throughput_per_second']:>8.2f} {result['p50_ms']:>8.1f} "
+            f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['error_rate']:>7.1%}"
+        )
+    rss = report["server_rss_kb"]
+    if rss:
+        peak = max(kb for _, kb in rss)
+        lines.append(f"Server RSS: start {rss[0][1] / 1024:.1f} MiB, peak {peak / 1024:.1f} MiB, "
+                     f"end {rss[-1][1] / 1024:.1f} MiB ({len(rss)} samples)")
+        step = max(len(rss) // 10, 1)
+        lines.append("  " + "  ".join(f"{seconds:.0f}s={kb / 1024:.0f}MiB" for seconds, kb in rss[::step]))
+    return lines
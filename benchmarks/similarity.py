@@ -0,0 +1,59 @@
+"""
+Cost per megapixel of the structural similarity metrics.
+
+Times ``ssim`` and ``ms_ssim`` on synthetic image pairs of several sizes and,
+for the box window, several window sizes: with ``uniform_filter`` the cost
+per megapixel should stay flat as the window grows.
+
+    python -m benchmarks.similarity --sizes 1024x768 4000x3000 --windows 7 15 31
+"""
+import argparse
+import time
+
+import numpy as np
+
+
+def synthetic_pair(width, height, seed=0):
+    """A smooth random float32 image and a copy with a pasted-over patch."""
+    from scipy import ndimage
+    rng = np.random.default_rng(seed)
+    stored = ndimage.gaussian_filter(rng.random((height, width), dtype=np.float32) * 255, 2)
+    uploaded = stored.copy()
+    patch_height, patch_width = height // 2 - height // 4, width // 2 - width // 4
+    uploaded[height // 4:height // 2, width // 4:width // 2] = stored[:patch_height, :patch_width]
+    return stored, uploaded
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1024x768", "4000x3000"], help="WIDTHxHEIGHT sizes.")
+    parser.add_argument("--windows", type=int, nargs="+", default=[7, 15, 31], help="Box window sizes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is reported.")
+    args = parser.parse_args()
+
+    from case_app.similarity import ms_ssim, ssim
+
+    print(f"{'size':>11} {'metric':>8} {'window':>10} {'seconds':>9} {'ms/MP':>8} {'score':>7}")
+    for size in args.sizes:
+        width, height = (int(part) for part in size.lower().split("x"))
+        stored, uploaded = synthetic_pair(width, height)
+        megapixels = width * height / 1e6
+        runs = [("ssim", f"box {window}", lambda w=window: ssim(stored, uploaded, w)) for window in args.windows]
+        runs.append(("ssim", "gauss 1.5", lambda: ssim(stored, uploaded, gaussian=True)))
+        runs.append(("ms_ssim", f"box {args.windows[0]}", lambda: ms_ssim(stored, uploaded, args.windows[0])))
+        for metric, window, func in runs:
+            seconds, (score, _) = timed(func, args.repeat)
+            print(f"{size:>11} {metric:>8} {window:>10} {seconds:>9.3f} {seconds / megapixels * 1000:>8.1f} {score:>7.4f}")
+
+
+if __name__ == "__main__":
+    main()
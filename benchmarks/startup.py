@@ -0,0 +1,85 @@
+"""
+Start-up cost of a process: importing Django, the app and its URLconf.
+
+Runs each scenario in fresh interpreters under ``python -X importtime`` and
+reports the median wall time, the import time and the slowest top-level
+imports.  Exits with status 1 when a budgeted scenario's median exceeds
+``--budget-ms``, so it can guard against heavy imports creeping back into
+module scope (see ``case_app.engines``).
+
+    python -m benchmarks.startup --runs 5 --budget-ms 800
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SETUP = "import django; django.setup()"
+
+# name -> (code, budgeted)
+SCENARIOS = {
+    # what every management command pays
+    "setup": (SETUP, True),
+    # what a worker pays before serving its first request
+    "urls": (f"{SETUP}; import ImageGuard.urls", True),
+    # what a preloading master pays once for all of its workers
+    "warmup": (f"{SETUP}; from case_app import engines; engines.warmup()", False),
+}
+
+
+def parse_importtime(stderr):
+    """``(cumulative microseconds, module)`` of every top-level import in ``-X importtime`` output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):
+            imports.append((int(cumulative), name.strip()))
+    return imports
+
+
+def run_once(code):
+    """Wall seconds and top-level imports of one fresh interpreter running ``code``."""
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "ImageGuard.settings")}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True, text=True,
+    )
+    seconds = time.perf_counter() - started
+    if result.returncode:
+        raise SystemExit(f"{code!r} failed:\n{result.stderr[-2000:]}")
+    return seconds, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Interpreters started per scenario; the median is used.")
+    parser.add_argument("--budget-ms", type=float, default=800, help="Budget for the setup and urls scenarios.")
+    parser.add_argument("--top", type=int, default=8, help="Slowest top-level imports listed per scenario.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    over = []
+    print(f"{'scenario':>9} {'wall ms':>9} {'import ms':>10} {'budget':>8}")
+    for name in args.scenarios:
+        code, budgeted = SCENARIOS[name]
+        runs = [run_once(code) for _ in range(args.runs)]
+        wall = statistics.median(seconds for seconds, _ in runs) * 1000
+        imported = statistics.median(sum(cumulative for cumulative, _ in imports) for _, imports in runs) / 1000
+        verdict = "-"
+        if budgeted:
+            verdict = "ok" if wall <= args.budget_ms else "OVER"
+            if wall > args.budget_ms:
+                over.append(name)
+        print(f"{name:>9} {wall:>9.0f} {imported:>10.0f} {verdict:>8}")
+        for cumulative, module in sorted(runs[-1][1], reverse=True)[:args.top]:
+            print(f"{'':>12}{cumulative / 1000:>8.1f} ms  {module}")
+    if over:
+        raise SystemExit(f"Over the {args.budget_ms:.0f} ms budget: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
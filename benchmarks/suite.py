@@ -0,0 +1,173 @@
+"""
+The ImageGuard benchmark suite.
+
+Runs every benchmark against a throwaway test database and a temporary
+MEDIA_ROOT, so it never touches real data.  Use ``manage.py bench`` to run it
+(with ``IMAGEGUARD_DB=sqlite`` on machines without MySQL).
+"""
+import io
+import platform
+import tempfile
+import time
+from types import SimpleNamespace
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from case_app.models import Case, Image
+from .datasets import generate_images, seed_cases, seed_logs
+from .harness import measure
+from . import concurrency
+
+BENCHMARKS = (
+    "ingest", "phash", "detect_tampering", "export_case_pdf",
+    "export_case_csv", "case_list", "case_logs", "verify_wsgi", "verify_asgi",
+)
+
+DEFAULTS = {
+    "images": 20,
+    "width": 1024,
+    "height": 768,
+    "cases": 10000,
+    "log_rows": 1000000,
+    "page_requests": 50,
+    "export_iterations": 5,
+    "verifiers": 50,
+    "verifier_requests": 2,
+    "seed": 0,
+    "only": None,
+}
+
+QUICK = {"images": 5, "width": 320, "height": 240, "cases": 500, "log_rows": 5000,
+         "page_requests": 10, "export_iterations": 2, "verifiers": 10, "verifier_requests": 1}
+
+
+def _get(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} returned {response.status_code}")
+    # Streaming responses do their work while being consumed
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def _spread_pages(pages, count):
+    """``count`` page numbers spread evenly from the first to the last page."""
+    if pages <= 1:
+        return [1] * count
+    return [1 + round(index * (pages - 1) / max(count - 1, 1)) for index in range(count)]
+
+
+def run_suite(log=print, **options):
+    """
+    Run the selected benchmarks and return a JSON-serializable report with
+    ``meta`` (environment and parameters) and ``results`` (one entry per
+    benchmark, see ``harness.measure``).
+    """
+    params = SimpleNamespace(**{**DEFAULTS, **{k: v for k, v in options.items() if v is not None}})
+    selected = set(params.only or BENCHMARKS)
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            results, seeding = _run(params, selected, log)
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+    return {
+        "meta": {
+            "timestamp": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "platform": platform.platform(),
+            "database": connection.vendor,
+            "params": vars(params),
+            "seed_seconds": seeding,
+        },
+        "results": results,
+    }
+
+
+def _run(params, selected, log):
+    User = get_user_model()
+    user = User.objects.create_superuser(username="bench", password="bench")
+    client = Client()
+    client.force_login(user)
+
+    results, seeding = {}, {}
+    images = list(generate_images(params.images, params.width, params.height, params.seed))
+    case = Case.objects.create(name="Bench case", investigator=user)
+
+    def ingest(item):
+        name, data = item
+        Image.objects.create(case=case, image=SimpleUploadedFile(name, data, content_type="image/jpeg"))
+
+    if "ingest" in selected:
+        log("ingest ...")
+        results["ingest"] = measure(ingest, images, warmup=0)
+    elif selected & {"detect_tampering", "export_case_pdf", "export_case_csv", "verify_wsgi", "verify_asgi"}:
+        for item in images:
+            ingest(item)
+
+    if "phash" in selected:
+        log("phash ...")
+        results["phash"] = measure(lambda item: Image().compute_perceptual_hash(io.BytesIO(item[1])), images)
+
+    if "detect_tampering" in selected:
+        log("detect_tampering ...")
+        url = reverse("case_app:detect_tampering", args=[case.images.first().id])
+
+        def detect(item):
+            name, data = item
+            response = client.post(url, {"uploaded_image": SimpleUploadedFile(name, data, content_type="image/jpeg")})
+            if response.status_code != 200:
+                raise RuntimeError(f"POST {url} returned {response.status_code}")
+
+        results["detect_tampering"] = measure(detect, images)
+
+    for name, runner in (("verify_wsgi", concurrency.run_wsgi), ("verify_asgi", concurrency.run_asgi)):
+        if name in selected:
+            log(f"{name} with {params.verifiers} concurrent verifiers ...")
+            results[name] = runner(user, case.images.first(), images, params.verifiers, params.verifier_requests)
+
+    for name in ("export_case_pdf", "export_case_csv"):
+        if name in selected:
+            log(f"{name} ...")
+            url = reverse(f"case_app:{name}", args=[case.id])
+            results[name] = measure(lambda _: _get(client, url), range(params.export_iterations))
+
+    if "case_list" in selected:
+        log(f"seeding {params.cases} cases ...")
+        start = time.perf_counter()
+        seed_cases(user, params.cases)
+        seeding["cases"] = round(time.perf_counter() - start, 3)
+        log("case_list ...")
+        url = reverse("case_app:case_list")
+        pages = _spread_pages(Case.objects.count() // 5 + 1, params.page_requests)
+        results["case_list"] = measure(lambda page: _get(client, f"{url}?page={page}"), pages)
+
+    if "case_logs" in selected:
+        log(f"seeding {params.log_rows} log rows ...")
+        log_case = Case.objects.create(name="Bench log case", investigator=user)
+        start = time.perf_counter()
+        seed_logs(log_case, user, params.log_rows, seed=params.seed)
+        seeding["log_rows"] = round(time.perf_counter() - start, 3)
+        log("case_logs ...")
+        url = reverse("case_app:case_logs", args=[log_case.id])
+        pages = _spread_pages(params.log_rows // 10 + 1, params.page_requests)
+        results["case_logs"] = measure(lambda page: _get(client, f"{url}?page={page}"), pages)
+
+    return results, seeding
@@ -0,0 +1,22 @@
+from django.test import SimpleTestCase
+from .harness import percentile, compare
+
+
+class HarnessTests(SimpleTestCase):
+    def test_percentile(self):
+        """
+        Test nearest-rank percentiles on a small sample.
+        """
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        """
+        Test that only metrics worse than the threshold are reported.
+        """
+        baseline = {"ingest": {"p50_ms": 10.0, "p95_ms": 20.0, "throughput_per_second": 100.0}}
+        current = {"ingest": {"p50_ms": 10.5, "p95_ms": 30.0, "throughput_per_second": 80.0}}
+        regressions = compare(current, baseline, 0.10)
+        self.assertEqual([metric for _, metric, *_ in regressions], ["p95_ms", "throughput_per_second"])
@@ -1,47 +1,206 @@
-from django.contrib import admin
-from .models import Case, Image, ActivityLog
-
-class ImageInline(admin.TabularInline):
-    model = Image
-    fields = ('thumbnail', 'uploaded_at')  # Show thumbnail
-    readonly_fields = ('thumbnail', 'uploaded_at')
-    extra = 1
-    max_num = 5  # Limit to 5 images at a time
-
-class ActivityLogInline(admin.TabularInline):
-    model = ActivityLog
-    fields = ('user', 'action', 'timestamp')
-    readonly_fields = ('user', 'action', 'timestamp')
-    extra = 0
-    can_delete = False  # Prevent log deletion
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.functional import cached_property
+from .models import Case, Image, ImageIntegrity, ActivityLog, LogArchiveSegment, MediaCleanupTask
+from .deletion import delete_cases, run_cleanup
+from .log_archive import verify as verify_archive
+
+APPROXIMATE_COUNT_THRESHOLD = 10000
+PANEL_PAGE_SIZE = 25
+PANELS = {
+    # panel -> (related name, columns loaded, template)
+    'images': ('images', ('id', 'original_filename', 'uploaded_at', 'frame_count'),
+               'admin/case_app/case/panel_images.html'),
+    'logs': ('logs', ('id', 'user__username', 'action', 'timestamp'), 'admin/case_app/case/panel_logs.html'),
+}
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Changelist paginator that uses the database's row estimate for unfiltered
+    tables above ``APPROXIMATE_COUNT_THRESHOLD`` rows instead of ``COUNT(*)``.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > APPROXIMATE_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def estimated_count(model, using):
+    """Row estimate from the table statistics, or ``None`` where the backend keeps none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists of tables that grow without bound: estimated totals and no extra full count."""
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
 @admin.register(Case)
-class CaseAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'investigator', 'created_at', 'updated_at', 'tampering_threshold')
+class CaseAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'investigator', 'created_at', 'updated_at', 'image_count', 'last_activity_at',
+                    'tampering_threshold')
+    list_select_related = ('investigator',)
     search_fields = ('name', 'investigator__username')
     list_filter = ('created_at', 'updated_at')
     ordering = ('-created_at',)
-    readonly_fields = ('created_at', 'updated_at')
-    inlines = [ImageInline, ActivityLogInline]
+    readonly_fields = ('created_at', 'updated_at') + Case.STATISTICS
+    raw_id_fields = ('investigator',)
+    # Images and logs are shown in panels loaded page by page (see panel_view)
+    # instead of inlines, which render every row of the case at once
+    change_form_template = 'admin/case_app/case/change_form.html'
+    actions = ['delete_cases_in_bulk']
+
+    def get_urls(self):
+        return [
+            path('<int:case_id>/panel/<str:panel>/', self.admin_site.admin_view(self.panel_view),
+                 name='case_app_case_panel'),
+        ] + super().get_urls()
+
+    def panel_view(self, request, case_id, panel):
+        """One page of a case's images or logs, newest first, as an HTML fragment."""
+        if panel not in PANELS:
+            raise PermissionDenied
+        case = get_object_or_404(Case, pk=case_id)
+        if not self.has_view_or_change_permission(request, case):
+            raise PermissionDenied
+        related_name, columns, template = PANELS[panel]
+        rows = getattr(case, related_name).order_by('-id').values(*columns)
+        before = request.GET.get('before', '')
+        if before.isdigit():
+            rows = rows.filter(id__lt=int(before))
+        rows = list(rows[:PANEL_PAGE_SIZE + 1])
+        more = len(rows) > PANEL_PAGE_SIZE
+        rows = rows[:PANEL_PAGE_SIZE]
+        return TemplateResponse(request, template, {
+            'rows': rows,
+            'next_before': rows[-1]['id'] if more else None,
+        })
+
+    def get_actions(self, request):
+        # The default action collects and lists every related object first;
+        # the bulk action replaces it
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_model(self, request, obj):
+        delete_cases([obj.pk], request.user)
+
+    def delete_queryset(self, request, queryset):
+        delete_cases(list(queryset.values_list('pk', flat=True)), request.user)
+
+    @admin.action(permissions=['delete'], description="Delete selected cases with their images")
+    def delete_cases_in_bulk(self, request, queryset):
+        if request.POST.get('post'):
+            deleted = delete_cases(list(queryset.values_list('pk', flat=True)), request.user)
+            self.message_user(
+                request, f"Deleted {deleted['cases']} cases and {deleted['images']} images; "
+                         f"their files are being removed in the background.", messages.SUCCESS,
+            )
+            return None
+        cases = queryset.order_by('name')  # image_count is kept on the case (case_app.stats)
+        return TemplateResponse(request, 'admin/case_app/case/delete_cases_confirmation.html', {
+            **self.admin_site.each_context(request),
+            'title': "Delete cases",
+            'opts': self.model._meta,
+            'cases': cases,
+            'image_total': sum(case.image_count for case in cases),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+class ImageIntegrityInline(admin.StackedInline):
+    """The image's signature and public key, which live in their own table."""
+    model = ImageIntegrity
+    can_delete = False
+    readonly_fields = ('digital_signature', 'public_key')
 
 @admin.register(Image)
-class ImageAdmin(admin.ModelAdmin):
+class ImageAdmin(LargeTableAdmin):
     """
     Admin interface for managing uploaded images.
     """
     list_display = ('id', 'case', 'thumbnail', 'uploaded_at')  # Include thumbnail
+    list_select_related = ('case',)
+    autocomplete_fields = ('case',)
     search_fields = ('case__name',)
     list_filter = ('uploaded_at',)
     ordering = ('-uploaded_at',)  # Order by newest uploads
     readonly_fields = ('uploaded_at', 'thumbnail')
+    inlines = [ImageIntegrityInline]
 
 @admin.register(ActivityLog)
-class ActivityLogAdmin(admin.ModelAdmin):
+class ActivityLogAdmin(LargeTableAdmin):
     """
     Admin interface for viewing activity logs.
     """
     list_display = ('id', 'user', 'case', 'action', 'timestamp')  # Include case in logs
+    list_select_related = ('user', 'case')
+    autocomplete_fields = ('case',)
     search_fields = ('user__username', 'action', 'case__name')
     list_filter = ('timestamp',)
     ordering = ('-timestamp',)
     readonly_fields = ('user', 'action', 'timestamp')
+
+@admin.register(MediaCleanupTask)
+class MediaCleanupTaskAdmin(admin.ModelAdmin):
+    """
+    Admin interface for media paths queued for removal by bulk deletions.
+    """
+    list_display = ('id', 'path', 'created_at', 'attempts', 'last_error')
+    ordering = ('id',)
+    readonly_fields = ('path', 'created_at', 'attempts', 'last_error')
+    actions = ['retry_cleanup']
+
+    @admin.action(description="Remove the selected paths now")
+    def retry_cleanup(self, request, queryset):
+        removed, failed = run_cleanup(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f"Removed {removed} paths; {failed} failed.")
+
+@admin.register(LogArchiveSegment)
+class LogArchiveSegmentAdmin(admin.ModelAdmin):
+    """
+    Admin interface for the index of archived activity log entries.
+    """
+    list_display = ('id', 'case', 'month', 'path', 'count', 'first_timestamp', 'last_timestamp')
+    list_select_related = ('case',)
+    list_filter = ('month',)
+    ordering = ('-id',)
+    actions = ['verify_checksums']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Check the selected segments against their checksums")
+    def verify_checksums(self, request, queryset):
+        failures = verify_archive(queryset)
+        for segment, error in failures:
+            self.message_user(request, f"Segment {segment.pk}: {error}", messages.ERROR)
+        if not failures:
+            self.message_user(request, f"{queryset.count()} segments match their checksums.", messages.SUCCESS)
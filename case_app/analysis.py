@@ -0,0 +1,275 @@
+"""
+CPU-heavy image work, written as plain functions of file paths and values so
+it can run either in the request thread or in the shared process pool
+(``case_app.workers``).  Nothing here touches the database.
+"""
+import hashlib
+import os
+import tempfile
+import uuid
+
+import numpy as np
+from PIL import ImageChops, ImageDraw
+from PIL import Image as PILImage
+
+from .copy_move import detect_copy_move
+from .instrumentation import span
+from . import progress
+from .registration import build_reference, estimate_alignment, align_images
+from .transcoding import ORIGINAL, JPEG, EXTENSIONS, encode_for_storage
+from .metadata import extract_metadata
+from .frames import frame_count, frame_records, frame_sha256, iter_frames, read_frame
+from . import engines
+from .similarity import PHASH, map_image, ssim, to_gray
+from .similarity import compare as similarity_compare
+
+CHUNK_SIZE = 64 * 1024
+
+
+def process_upload(path, sha256_hash=None, storage_format=JPEG, quality=70):
+    """
+    Hash an uploaded file and transcode it to the case's storage format.
+
+    Returns the SHA-256 and pHash of the original and the path of a
+    temporary file holding the transcoded image (the caller removes it), or
+    ``None`` when the format is ``ORIGINAL`` and ``path`` is stored as is.
+    Multi-frame files are always kept original and also get their
+    per-frame records under ``frames``; header metadata is under ``metadata``.
+    Pass ``sha256_hash`` when it is already known to skip reading the file.
+    """
+    if sha256_hash is None:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        sha256_hash = hasher.hexdigest()
+
+    metadata = extract_metadata(path)
+    img = PILImage.open(path)
+    perceptual_hash = str(engines.imagehash.phash(img))
+
+    # Multi-frame files are stored as original bytes with per-frame records
+    frames = None
+    if frame_count(img) > 1:
+        storage_format = ORIGINAL
+        frames = list(frame_records(path))
+
+    encoded_path = None
+    if storage_format != ORIGINAL:
+        fd, encoded_path = tempfile.mkstemp(suffix=EXTENSIONS[storage_format])
+        with os.fdopen(fd, 'wb') as output:
+            encode_for_storage(img, storage_format, quality, output)
+
+    return {
+        'sha256_hash': sha256_hash,
+        'perceptual_hash': perceptual_hash,
+        'encoded_path': encoded_path,
+        'storage_format': storage_format,
+        'frames': frames,
+        'metadata': metadata,
+    }
+
+
+def compare_images(stored_path, uploaded, stored_phash, threshold, temp_dir, uploaded_name,
+                   reference=None, with_scale=False, working_size=256, metric=PHASH):
+    """
+    Align ``uploaded`` (a path or file object) to the stored image, write the
+    aligned upload and the difference image to ``temp_dir`` and compare the
+    perceptual hashes.
+
+    ``reference`` is the stored image's cached registration reference; when
+    it is missing it is computed and returned so the caller can cache it.
+    With an SSIM ``metric`` the similarity is the structural similarity of
+    the aligned images, and a local SSIM map is written to ``temp_dir`` too.
+    """
+    progress.stage("Decoding images")
+    with span("decode"):
+        uploaded_pil = PILImage.open(uploaded).convert("RGB")
+        stored_pil = PILImage.open(stored_path).convert("RGB")
+
+    # Register the upload on the stored image (phase correlation) and
+    # crop both to their overlap; falls back to resizing when unsure
+    progress.stage("Aligning")
+    with span("align"):
+        if reference is None:
+            reference = build_reference(stored_pil, working_size)
+        alignment = estimate_alignment(reference, uploaded_pil, with_scale=with_scale)
+        stored_pil, uploaded_pil = align_images(stored_pil, uploaded_pil, alignment)
+
+    # Save the uploaded image temporarily, under a name that cannot be guessed
+    uploaded_image_name = f"temp_{uuid.uuid4().hex}{os.path.splitext(uploaded_name)[1]}"
+    os.makedirs(temp_dir, exist_ok=True)
+    with span("encode"):
+        uploaded_pil.save(os.path.join(temp_dir, uploaded_image_name))
+
+    # Generate difference image
+    progress.stage("Comparing pixels")
+    with span("diff"):
+        diff_image = ImageChops.difference(stored_pil, uploaded_pil)
+        diff_bbox = diff_image.getbbox()
+    # Unique per comparison so concurrent requests do not overwrite each other
+    diff_image_name = f"diff_{uuid.uuid4().hex}.png"
+    with span("encode"):
+        diff_image.save(os.path.join(temp_dir, diff_image_name))
+
+    # Compute perceptual hashes
+    with span("phash"):
+        uploaded_phash = str(engines.imagehash.phash(uploaded_pil))
+    hamming_distance = engines.imagehash.hex_to_hash(uploaded_phash) - engines.imagehash.hex_to_hash(stored_phash)
+
+    # Calculate similarity percentage
+    similarity = max(0, 100 - (hamming_distance / threshold) * 100)
+    ssim_score = ssim_map_name = None
+    if metric != PHASH:
+        progress.stage("Structural similarity")
+        with span("ssim"):
+            ssim_score, ssim_map = similarity_compare(stored_pil, uploaded_pil, metric)
+        similarity = max(0.0, ssim_score * 100)
+        ssim_map_name = f"ssim_{uuid.uuid4().hex}.png"
+        with span("encode"):
+            map_image(ssim_map).save(os.path.join(temp_dir, ssim_map_name))
+
+    # Determine tampering status
+    tampered = bool(diff_bbox)
+    return {
+        "uploaded_image_name": uploaded_image_name,
+        "diff_image_name": diff_image_name,
+        "uploaded_phash": uploaded_phash,
+        "hamming_distance": int(hamming_distance),
+        "similarity": similarity,
+        "tampered": tampered,
+        "status": "Tampered" if tampered else "Original",
+        "alignment": alignment,
+        "reference": reference,
+        "metric": metric,
+        "ssim": ssim_score,
+        "ssim_map_name": ssim_map_name,
+    }
+
+
+def compare_frames(stored_path, uploaded, stored_frames, threshold, temp_dir):
+    """
+    Compare a multi-frame upload with a stored multi-frame image frame by
+    frame and stop at the first frame that differs.
+
+    ``stored_frames`` lists the stored ``(sha256_hash, perceptual_hash)`` of
+    each frame, so matching frames are checked without decoding the stored
+    file; only the divergent frame is decoded for the difference image.
+    Frames are compared pixel for pixel, without registration.
+    """
+    divergent = shown = first = None
+    compared = 0
+    with PILImage.open(uploaded) as img:
+        uploaded_count = frame_count(img)
+        progress.stage("Comparing frames", min(uploaded_count, len(stored_frames)))
+        with span("frames"):
+            for index, frame in iter_frames(img):
+                progress.advance()
+                if first is None:
+                    first = frame
+                if index >= len(stored_frames):
+                    divergent = index  # extra frames in the upload
+                    break
+                compared += 1
+                if frame_sha256(frame) != stored_frames[index][0]:
+                    divergent = shown = index
+                    break
+    if divergent is None and uploaded_count != len(stored_frames):
+        divergent = uploaded_count  # the upload is missing frames
+
+    # Show the divergent frame with its diff, or the first frame when there is nothing to diff
+    uploaded_image_name = f"temp_{uuid.uuid4().hex}.png"
+    os.makedirs(temp_dir, exist_ok=True)
+    with span("diff"):
+        if shown is None:
+            frame = first
+            diff_image = PILImage.new("RGB", frame.size)
+        else:
+            stored_frame = read_frame(stored_path, shown)
+            if stored_frame.size != frame.size:
+                frame = frame.resize(stored_frame.size)
+            diff_image = ImageChops.difference(stored_frame, frame)
+    diff_image_name = f"diff_{uuid.uuid4().hex}.png"
+    with span("encode"):
+        frame.save(os.path.join(temp_dir, uploaded_image_name))
+        diff_image.save(os.path.join(temp_dir, diff_image_name))
+
+    with span("phash"):
+        uploaded_phash = str(engines.imagehash.phash(frame))
+    stored_phash = stored_frames[shown or 0][1]
+    hamming_distance = engines.imagehash.hex_to_hash(uploaded_phash) - engines.imagehash.hex_to_hash(stored_phash)
+    similarity = max(0, 100 - (hamming_distance / threshold) * 100)
+
+    tampered = divergent is not None
+    return {
+        "uploaded_image_name": uploaded_image_name,
+        "diff_image_name": diff_image_name,
+        "uploaded_phash": uploaded_phash,
+        "hamming_distance": int(hamming_distance),
+        "similarity": similarity,
+        "tampered": tampered,
+        "status": "Tampered" if tampered else "Original",
+        "alignment": None,
+        "reference": None,
+        "frames": {
+            "stored": len(stored_frames),
+            "uploaded": uploaded_count,
+            "compared": compared,
+            "divergent": divergent,
+        },
+    }
+
+
+def copy_move_overlay(stored_path, overlay_path, block_size, max_blocks):
+    """
+    Search the stored image for regions cloned from elsewhere in it and save
+    a copy with every matched pair outlined to ``overlay_path``.  Returns the
+    regions.
+    """
+    with span("decode"):
+        stored_pil = PILImage.open(stored_path).convert("RGB")
+    with span("copy_move"):
+        regions = detect_copy_move(stored_pil, block_size=block_size, max_blocks=max_blocks)
+
+    draw = ImageDraw.Draw(stored_pil)
+    for region in regions:
+        draw.rectangle(region["source"], outline=(0, 128, 255), width=3)
+        draw.rectangle(region["target"], outline=(255, 0, 0), width=3)
+    os.makedirs(os.path.dirname(overlay_path), exist_ok=True)
+    with span("encode"):
+        stored_pil.save(overlay_path)
+    return regions
+
+
+def hash_suspect(path):
+    """SHA-256 and pHash of a suspect file, for batch verification."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    with PILImage.open(path) as img:
+        perceptual_hash = str(engines.imagehash.phash(img))
+    return {'sha256_hash': hasher.hexdigest(), 'perceptual_hash': perceptual_hash}
+
+
+def match_images(stored_path, suspect_path, with_scale=False, working_size=256, score_size=512):
+    """
+    Align a suspect file to a stored image and compare their pixels, without
+    writing any files.  Returns whether the aligned pixels are identical, the
+    share of pixels that differ and the SSIM of the pair, scored at no more
+    than ``score_size`` pixels on the longer side.
+    """
+    with span("decode"):
+        stored_pil = PILImage.open(stored_path).convert("RGB")
+        suspect_pil = PILImage.open(suspect_path).convert("RGB")
+    with span("align"):
+        alignment = estimate_alignment(build_reference(stored_pil, working_size), suspect_pil, with_scale=with_scale)
+        stored_pil, suspect_pil = align_images(stored_pil, suspect_pil, alignment)
+    with span("diff"):
+        diff = np.asarray(ImageChops.difference(stored_pil, suspect_pil).convert("L"))
+        changed = float((diff > 0).mean()) if diff.size else 0.0
+    with span("ssim"):
+        stored_pil.thumbnail((score_size, score_size))
+        suspect_pil = suspect_pil.resize(stored_pil.size)
+        score, _ = ssim(to_gray(stored_pil), to_gray(suspect_pil))
+    return {"identical": changed == 0.0, "changed": changed, "ssim": score}
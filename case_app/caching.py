@@ -0,0 +1,116 @@
+"""
+Versioned caching for the case list, case details and case log pages.
+
+Every cached entry's key embeds a version number for the data it depends on:
+the case list per permission scope, the image corpus (for lists filtered on
+image metadata), and the details and logs of each case.
+Signal receivers in ``case_app.signals`` bump the relevant version whenever a
+``Case``, ``Image`` or ``ActivityLog`` is saved or deleted, which makes the
+old entries unreachable; they then simply age out of the cache.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+
+PREFIX = "case_app"
+
+
+def get_cache():
+    return caches[settings.CASE_CACHE_ALIAS]
+
+
+def scope_for(user):
+    """Permission scope of the case list: superusers see every case."""
+    return "all" if user.is_superuser else f"user:{user.pk}"
+
+
+def list_namespace(scope):
+    return f"list:{scope}"
+
+
+def images_namespace():
+    """Every image and its metadata; case lists filtered on image metadata depend on it."""
+    return "images"
+
+
+def details_namespace(case_id):
+    return f"case:{case_id}:details"
+
+
+def logs_namespace(case_id):
+    return f"case:{case_id}:logs"
+
+
+def get_version(namespace):
+    """Current version of ``namespace``, initialised on first use."""
+    cache = get_cache()
+    key = f"{PREFIX}:version:{namespace}"
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a flushed cache never reuses an old version
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _incr(namespace):
+    cache = get_cache()
+    key = f"{PREFIX}:version:{namespace}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def bump_version(namespace):
+    """
+    Invalidate everything cached under ``namespace``.  The version is bumped
+    now and again after the surrounding transaction commits, so a concurrent
+    reader cannot cache pre-commit data under the new version.
+    """
+    _incr(namespace)
+    transaction.on_commit(lambda: _incr(namespace))
+
+
+def make_key(name, namespaces, *parts, params=None):
+    """
+    Build a cache key from a name, the current versions of ``namespaces``
+    and extra key parts such as a permission scope or the query string.
+    """
+    versions = ":".join(str(get_version(namespace)) for namespace in namespaces)
+    extra = ":".join(str(part) for part in parts)
+    if params:
+        query = "&".join(f"{key}={value}" for key, value in sorted(params.items()))
+        extra += ":" + hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f"{PREFIX}:{name}:{versions}:{extra}"
+
+
+def cached(key, builder):
+    """Return the value cached under ``key``, building and storing it on a miss."""
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, settings.CASE_CACHE_TIMEOUT)
+    return value
+
+
+def cached_page(key, object_list, per_page, page_number):
+    """
+    Paginate ``object_list`` like ``Paginator.get_page`` but cache the page's
+    objects and the total count under ``key``; a hit runs no queries.
+    """
+    cache = get_cache()
+    data = cache.get(key)
+    if data is None:
+        page = Paginator(object_list, per_page).get_page(page_number)
+        data = (page.paginator.count, page.number, list(page.object_list))
+        cache.set(key, data, settings.CASE_CACHE_TIMEOUT)
+
+    count, number, objects = data
+    # A range has the right length for page arithmetic without any queries
+    return Page(objects, number, Paginator(range(count), per_page))
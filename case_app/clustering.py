@@ -0,0 +1,248 @@
+"""
+Near-duplicate clustering of the stored image corpus.
+
+Every ``Image`` has a ``HashIndex`` row holding its 64-bit pHash, the pHash
+split into four indexed 16-bit bands, the first 64 bits of its SHA-256 and a
+``cluster_id``.  Two images are related when their SHA-256 prefixes match
+(exact copies) or their pHashes differ in at most
+``settings.CLUSTER_MAX_DISTANCE`` bits (re-uploads and light edits).  Clusters
+are the connected components of that relation, labelled with the smallest
+image id in each.
+
+Hashes within 3 bits of each other agree on at least one of the four bands, so
+band lookups find every related pair at the default distance; larger distances
+only find pairs that also share a band.
+
+``index_image`` runs for every new image and merges the clusters it touches
+by relabelling them.  ``rebuild`` recomputes every label with a vectorized
+union-find, for backfills and to split clusters left joined by deleted images.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import HashIndex, Image
+
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+SUB_BANDS = 4
+SUB_BAND_BITS = 12
+WINDOW = 4
+BATCH_SIZE = 2000
+
+
+def _signed(value):
+    """Store unsigned 64-bit values in a signed BigIntegerField."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming(a, b):
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+def hash_fields(perceptual_hash, sha256_hash):
+    """``HashIndex`` column values for an image's hashes."""
+    phash = int(perceptual_hash, 16)
+    fields = {"phash": _signed(phash), "sha_key": _signed(int(sha256_hash[:16], 16))}
+    for band in range(BANDS):
+        fields[f"band{band}"] = (phash >> (band * BAND_BITS)) & BAND_MASK
+    return fields
+
+
+def index_image(image):
+    """
+    Add ``image`` to the index, merging every cluster it is related to.
+    Returns the image's cluster id, or ``None`` when it has no hashes yet.
+    """
+    if not image.perceptual_hash or not image.sha256_hash:
+        return None
+    fields = hash_fields(image.perceptual_hash, image.sha256_hash)
+
+    related = Q(sha_key=fields["sha_key"])
+    for band in range(BANDS):
+        related |= Q(**{f"band{band}": fields[f"band{band}"]})
+    candidates = (
+        HashIndex.objects.filter(related).exclude(image_id=image.pk)
+        .values_list("phash", "sha_key", "cluster_id")[:settings.CLUSTER_CANDIDATE_LIMIT]
+    )
+    labels = {
+        cluster_id for phash, sha_key, cluster_id in candidates
+        if sha_key == fields["sha_key"] or hamming(phash, fields["phash"]) <= settings.CLUSTER_MAX_DISTANCE
+    }
+    cluster_id = min(labels | {image.pk})
+
+    with transaction.atomic():
+        HashIndex.objects.update_or_create(image_id=image.pk, defaults={**fields, "cluster_id": cluster_id})
+        merged = labels - {cluster_id}
+        if merged:
+            HashIndex.objects.filter(cluster_id__in=merged).update(cluster_id=cluster_id)
+    return cluster_id
+
+
+def union_find(count, left, right):
+    """
+    Connected components of ``count`` nodes joined by the edges
+    ``left[i]``-``right[i]``: returns each node's label, the smallest node in
+    its component.  Roots are hooked to the smaller root of every edge, then
+    pointer jumping flattens the trees; a few rounds reach the fixed point.
+    """
+    labels = np.arange(count)
+    while True:
+        left_labels, right_labels = labels[left], labels[right]
+        differ = left_labels != right_labels
+        if not differ.any():
+            return labels
+        left_labels, right_labels = left_labels[differ], right_labels[differ]
+        low = np.minimum(left_labels, right_labels)
+        np.minimum.at(labels, left_labels, low)
+        np.minimum.at(labels, right_labels, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+
+def cluster_arrays(phashes, sha_keys, max_distance=3, window=WINDOW):
+    """
+    Label every image with its cluster, given its pHash and SHA-256 key as
+    int64 arrays; labels are indexes into the arrays.
+
+    Exact copies are adjacent after sorting by SHA-256 key.  For pHashes, a
+    pair within 3 bits agrees on one of the four 16-bit bands and, within the
+    other 48 bits, on one of four 12-bit sub-bands; sorting by each of the 16
+    band/sub-band combinations makes related pairs neighbours, and each hash is
+    compared with the next ``window`` hashes in every order.
+    """
+    hashes = phashes.view(np.uint64)
+    left, right = [], []
+
+    def link(keys, values=None):
+        order = np.argsort(keys, kind="stable") if values is None else np.lexsort((values, keys))
+        sorted_keys = keys[order]
+        sorted_hashes = hashes[order]
+        for offset in range(1, window + 1):
+            same = sorted_keys[offset:] == sorted_keys[:-offset]
+            if values is not None:
+                same &= np.bitwise_count(sorted_hashes[offset:] ^ sorted_hashes[:-offset]) <= max_distance
+            left.append(order[:-offset][same])
+            right.append(order[offset:][same])
+
+    link(sha_keys)
+    for band in range(BANDS):
+        band_key = (hashes >> np.uint64(band * BAND_BITS)) & np.uint64(BAND_MASK)
+        # The other 48 bits, compacted so the sub-bands are contiguous
+        low = hashes & np.uint64((1 << (band * BAND_BITS)) - 1)
+        rest = low
+        if band < BANDS - 1:  # shifting a uint64 by 64 bits is undefined
+            rest = rest | ((hashes >> np.uint64((band + 1) * BAND_BITS)) << np.uint64(band * BAND_BITS))
+        for sub_band in range(SUB_BANDS):
+            sub_key = (rest >> np.uint64(sub_band * SUB_BAND_BITS)) & np.uint64((1 << SUB_BAND_BITS) - 1)
+            link((band_key << np.uint64(SUB_BAND_BITS)) | sub_key, hashes)
+
+    return union_find(len(phashes), np.concatenate(left), np.concatenate(right))
+
+
+def backfill(batch_size=BATCH_SIZE):
+    """Index images saved before the index existed; returns how many were added."""
+    missing = (
+        Image.objects.filter(hash_index__isnull=True, perceptual_hash__isnull=False, sha256_hash__isnull=False)
+        .values_list("id", "perceptual_hash", "sha256_hash")
+    )
+    added, batch = 0, []
+    for image_id, perceptual_hash, sha256_hash in missing.iterator(chunk_size=batch_size):
+        batch.append(HashIndex(image_id=image_id, cluster_id=image_id, **hash_fields(perceptual_hash, sha256_hash)))
+        if len(batch) >= batch_size:
+            HashIndex.objects.bulk_create(batch)
+            added += len(batch)
+            batch = []
+    HashIndex.objects.bulk_create(batch)
+    return added + len(batch)
+
+
+def rebuild(log=None, batch_size=BATCH_SIZE):
+    """
+    Recompute every cluster label from the index and store the ones that
+    changed.  Returns counts of indexed images, changed labels and clusters
+    with more than one image.
+    """
+    added = backfill(batch_size)
+    if log:
+        log(f"Indexed {added} images missing from the hash index.")
+
+    rows = HashIndex.objects.order_by("image_id").values_list("image_id", "phash", "sha_key", "cluster_id")
+    count = rows.count()
+    ids = np.empty(count, dtype=np.int64)
+    phashes = np.empty(count, dtype=np.int64)
+    sha_keys = np.empty(count, dtype=np.int64)
+    current = np.empty(count, dtype=np.int64)
+    loaded = 0
+    for row in rows.iterator(chunk_size=batch_size):
+        if loaded == count:
+            break  # rows inserted while loading are picked up by the next rebuild
+        ids[loaded], phashes[loaded], sha_keys[loaded], current[loaded] = row
+        loaded += 1
+    count = loaded
+    ids, phashes, sha_keys, current = ids[:count], phashes[:count], sha_keys[:count], current[:count]
+
+    labels = ids[cluster_arrays(phashes, sha_keys, settings.CLUSTER_MAX_DISTANCE)]
+    changed = np.flatnonzero(labels != current)
+    for start in range(0, len(changed), batch_size):
+        chunk = changed[start:start + batch_size]
+        HashIndex.objects.bulk_update(
+            [HashIndex(image_id=int(ids[i]), cluster_id=int(labels[i])) for i in chunk], ["cluster_id"],
+        )
+
+    sizes = np.bincount(np.searchsorted(ids, labels), minlength=count) if count else np.zeros(0, dtype=np.int64)
+    return {"images": count, "changed": len(changed), "clusters": int((sizes > 1).sum())}
+
+
+def related_images(case, user):
+    """
+    For each image of ``case`` that belongs to a cluster of two or more,
+    the other images in that cluster with their relation: ``exact`` for
+    identical SHA-256, otherwise the pHash distance in bits.
+
+    Only images in cases ``user`` may open are listed, at most
+    ``settings.CLUSTER_RELATED_LIMIT`` per image; the rest are counted in
+    ``hidden`` (other investigators' cases) and ``more`` (over the limit).
+    """
+    limit = settings.CLUSTER_RELATED_LIMIT
+    own = list(HashIndex.objects.filter(image__case=case).select_related("image"))
+    clusters = {entry.cluster_id for entry in own}
+    in_clusters = HashIndex.objects.filter(cluster_id__in=clusters)
+    visible = in_clusters if user.is_superuser else in_clusters.filter(image__case__investigator=user)
+
+    totals = dict(in_clusters.values("cluster_id").annotate(count=Count("pk")).values_list("cluster_id", "count"))
+    shown = dict(visible.values("cluster_id").annotate(count=Count("pk")).values_list("cluster_id", "count"))
+    # One more than the limit per cluster, since the image itself is among them
+    members = {}
+    ranked = visible.annotate(
+        rank=Window(RowNumber(), partition_by=F("cluster_id"), order_by=F("image_id").asc()),
+    ).filter(rank__lte=limit + 1).select_related("image__case").order_by("image_id")
+    for entry in ranked:
+        members.setdefault(entry.cluster_id, []).append(entry)
+
+    related = []
+    for entry in sorted(own, key=lambda entry: entry.image_id):
+        others = [
+            {
+                "image": other.image,
+                "exact": other.sha_key == entry.sha_key,
+                "distance": hamming(other.phash, entry.phash),
+            }
+            for other in members.get(entry.cluster_id, []) if other.image_id != entry.image_id
+        ][:limit]
+        total = totals.get(entry.cluster_id, 1)
+        if total > 1:
+            related.append({
+                "image": entry.image,
+                "cluster_id": entry.cluster_id,
+                "related": others,
+                "more": shown.get(entry.cluster_id, 1) - 1 - len(others),
+                "hidden": total - shown.get(entry.cluster_id, 1),
+            })
+    return related
@@ -0,0 +1,158 @@
+"""
+Copy-move (cloned region) forgery detection.
+
+Overlapping square blocks are described by their low-frequency DCT
+coefficients, sorted lexicographically so that identical blocks end up next
+to each other, and paired with their sorted neighbours only.  Pairs are then
+filtered by shift-vector consensus: a cloned region produces many block pairs
+that all share the same displacement, while accidental matches do not.
+
+Run time is bounded by ``max_blocks``: larger images are box-reduced by an
+integer factor first, so clones are then found on that coarser grid.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import engines
+
+DEFAULT_BLOCK_SIZE = 8
+DEFAULT_MAX_BLOCKS = 250000
+
+# Blocks are transformed in chunks to keep the peak memory of dctn bounded.
+_CHUNK = 16384
+
+
+def _to_grayscale(image, max_blocks, block_size):
+    """
+    Convert an image to a float32 grayscale array, downscaling it so that
+    the number of overlapping blocks stays within ``max_blocks``.
+    Returns the array and the factor mapping array coordinates back to the
+    original image.
+    """
+    gray = image.convert("L")
+    width, height = gray.size
+    blocks = max(width - block_size + 1, 0) * max(height - block_size + 1, 0)
+
+    scale = 1.0
+    if max_blocks and blocks > max_blocks:
+        # Integer box reduction keeps sampling phases aligned across the image,
+        # so cloned regions still produce identical (or near-identical) blocks.
+        factor = int(np.ceil((blocks / max_blocks) ** 0.5))
+        while factor > 1 and (width // factor - block_size + 1) * (height // factor - block_size + 1) > max_blocks:
+            factor += 1
+        gray = gray.reduce(factor)
+        scale = 1.0 / factor
+
+    return np.asarray(gray, dtype=np.float32), scale
+
+
+def extract_block_features(gray, block_size=DEFAULT_BLOCK_SIZE, coefficients=4,
+                           quantization=4.0, min_std=2.0):
+    """
+    Describe every overlapping ``block_size`` block of ``gray`` by its
+    quantized top-left ``coefficients`` x ``coefficients`` DCT coefficients.
+
+    Returns ``(features, positions)`` where ``positions`` holds the (x, y)
+    of each block's top-left corner.  Near-flat blocks are dropped because
+    they match each other everywhere and carry no evidence of cloning.
+    """
+    windows = sliding_window_view(gray, (block_size, block_size))
+    rows, cols = windows.shape[:2]
+    rows_per_chunk = max(_CHUNK // cols, 1)
+
+    features, xs, ys = [], [], []
+    for top in range(0, rows, rows_per_chunk):
+        chunk = windows[top:top + rows_per_chunk].reshape(-1, block_size, block_size)
+        keep = chunk.std(axis=(1, 2)) >= min_std
+        index = np.flatnonzero(keep)
+        coeffs = engines.fft.dctn(chunk[keep], type=2, axes=(1, 2), norm="ortho")
+        coeffs = coeffs[:, :coefficients, :coefficients].reshape(len(index), -1)
+        features.append(np.round(coeffs / quantization).astype(np.int32))
+        ys.append(top + index // cols)
+        xs.append(index % cols)
+
+    features = np.concatenate(features)
+    xs, ys = np.concatenate(xs), np.concatenate(ys)
+    return features, np.stack([xs, ys], axis=1)
+
+
+def match_blocks(features, positions, neighbours=3, min_shift=None):
+    """
+    Pair blocks with identical features using a lexicographic sort.
+
+    Each block is compared with the next ``neighbours`` rows in sorted order
+    only, so matching costs O(n log n) instead of O(n^2).  Returns the
+    source positions, target positions and the canonical shift vectors.
+    """
+    empty = np.empty((0, 2), dtype=np.int64)
+    if len(features) < 2:
+        return empty, empty, empty
+
+    order = np.lexsort(features.T[::-1])
+    sorted_features = features[order]
+    sources, targets = [], []
+    for distance in range(1, neighbours + 1):
+        equal = np.all(sorted_features[:-distance] == sorted_features[distance:], axis=1)
+        sources.append(order[:-distance][equal])
+        targets.append(order[distance:][equal])
+
+    source = positions[np.concatenate(sources)].astype(np.int64)
+    target = positions[np.concatenate(targets)].astype(np.int64)
+
+    # Canonical orientation: the target always lies below (or right of) the source.
+    shift = target - source
+    flip = (shift[:, 1] < 0) | ((shift[:, 1] == 0) & (shift[:, 0] < 0))
+    source[flip], target[flip] = target[flip], source[flip].copy()
+    shift[flip] = -shift[flip]
+
+    if min_shift:
+        far = np.hypot(shift[:, 0], shift[:, 1]) >= min_shift
+        source, target, shift = source[far], target[far], shift[far]
+    return source, target, shift
+
+
+def detect_copy_move(image, block_size=DEFAULT_BLOCK_SIZE, max_blocks=DEFAULT_MAX_BLOCKS,
+                     min_matches=None, neighbours=3):
+    """
+    Detect cloned regions inside a single image.
+
+    ``image`` is a PIL image.  Returns a list of matched region pairs, each
+    a dict with ``source`` and ``target`` boxes (x0, y0, x1, y1) in original
+    image coordinates, the ``shift`` vector and the number of supporting
+    block ``matches``, largest first.
+    """
+    gray, scale = _to_grayscale(image, max_blocks, block_size)
+    if min(gray.shape) < block_size:
+        return []
+
+    features, positions = extract_block_features(gray, block_size)
+    source, target, shift = match_blocks(features, positions, neighbours, min_shift=block_size)
+    if not len(shift):
+        return []
+
+    if min_matches is None:
+        min_matches = block_size * block_size // 2
+
+    # Shift-vector consensus: keep displacements shared by enough block pairs.
+    shifts, inverse, counts = np.unique(shift, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+
+    regions = []
+    for index in np.flatnonzero(counts >= min_matches):
+        members = inverse == index
+        src, dst = source[members], target[members]
+        regions.append({
+            "source": _bounding_box(src, block_size, scale),
+            "target": _bounding_box(dst, block_size, scale),
+            "shift": (int(round(shifts[index][0] / scale)), int(round(shifts[index][1] / scale))),
+            "matches": int(counts[index]),
+        })
+
+    regions.sort(key=lambda region: region["matches"], reverse=True)
+    return regions
+
+
+def _bounding_box(points, block_size, scale):
+    x0, y0 = points.min(axis=0)
+    x1, y1 = points.max(axis=0) + block_size
+    return tuple(int(round(value / scale)) for value in (x0, y0, x1, y1))
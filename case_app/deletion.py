@@ -0,0 +1,157 @@
+"""
+Bulk deletion of cases.
+
+Deleting a case through the ORM runs the ``post_delete`` receivers of every
+image, each scanning the case log and writing a log entry, and leaves the
+files on disk.  ``delete_cases`` instead removes the rows of every table with
+one set-based ``DELETE`` each, writes a single summary ``ActivityLog`` entry
+and queues the cases' media directories as ``MediaCleanupTask`` rows.
+``run_cleanup`` removes queued paths: in a background thread after the
+deletion commits, and from the ``cleanup_media`` command for anything left.
+"""
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+
+from . import caching, progress
+from .models import (
+    ActivityLog, Case, HashIndex, Image, ImageFrame, ImageIntegrity, ImageMetadata, LogArchiveSegment, MediaCleanupTask,
+    UploadSession,
+)
+
+NAMES_IN_SUMMARY = 20
+
+
+def media_paths(case_id):
+    """Directories under ``MEDIA_ROOT`` holding a case's files and renditions."""
+    return [f"cases/{case_id}", f"renditions/{case_id}"]
+
+
+def archive_path(case_id):
+    """Absolute path of a case's activity log archive (see ``case_app.log_archive``)."""
+    return os.path.join(settings.ACTIVITY_LOG_ARCHIVE_ROOT, str(case_id))
+
+
+def _raw_delete(queryset):
+    # A single DELETE without collecting objects or sending signals; children
+    # are deleted before their parents, so no cascade is needed
+    return queryset._raw_delete(DEFAULT_DB_ALIAS)
+
+
+def delete_cases(case_ids, user):
+    """
+    Delete the cases ``case_ids`` with their images, hashes, logs, log
+    archives and upload sessions, and queue their files for removal.
+    Returns the number of cases and images deleted.
+    """
+    with transaction.atomic():
+        cases = list(Case.objects.filter(id__in=case_ids).select_for_update().values_list(
+            "id", "name", "investigator_id"))
+        if not cases:
+            return {"cases": 0, "images": 0}
+        ids = [case_id for case_id, _, _ in cases]
+        images = Image.objects.filter(case_id__in=ids)
+        image_count = images.count()
+        sessions = list(UploadSession.objects.filter(case_id__in=ids).values_list("id", flat=True))
+
+        image_tables = (ImageFrame, ImageIntegrity, ImageMetadata, HashIndex)
+        progress.stage("Deleting rows", len(image_tables) + 5)
+        for model in image_tables:
+            _raw_delete(model.objects.filter(image__case_id__in=ids))
+            progress.advance()
+        _raw_delete(UploadSession.objects.filter(case_id__in=ids))
+        progress.advance()
+        _raw_delete(ActivityLog.objects.filter(case_id__in=ids))
+        progress.advance()
+        segments = LogArchiveSegment.objects.filter(case_id__in=ids)
+        archived = set(segments.values_list("case_id", flat=True).distinct())
+        _raw_delete(segments)
+        progress.advance()
+        _raw_delete(images)
+        progress.advance()
+        _raw_delete(Case.objects.filter(id__in=ids))
+        progress.advance()
+
+        paths = [path for case_id in ids for path in media_paths(case_id)]
+        paths += [f"uploads/{session_id}.part" for session_id in sessions]
+        paths += [archive_path(case_id) for case_id in sorted(archived)]
+        tasks = MediaCleanupTask.objects.bulk_create([MediaCleanupTask(path=path) for path in paths])
+
+        names = ", ".join(f"{name} (#{case_id})" for case_id, name, _ in cases[:NAMES_IN_SUMMARY])
+        if len(cases) > NAMES_IN_SUMMARY:
+            names += f", and {len(cases) - NAMES_IN_SUMMARY} more"
+        ActivityLog.objects.create(
+            user=user,
+            action=f"Deleted {len(cases)} case(s) with {image_count} images",
+            details=f"Cases: {names}",
+        )
+
+        # The signal receivers that normally invalidate these did not run
+        for case_id in ids:
+            caching.bump_version(caching.details_namespace(case_id))
+            caching.bump_version(caching.logs_namespace(case_id))
+        caching.bump_version(caching.list_namespace("all"))
+        for investigator_id in {investigator_id for _, _, investigator_id in cases} - {None}:
+            caching.bump_version(caching.list_namespace(f"user:{investigator_id}"))
+        caching.bump_version(caching.images_namespace())
+
+        if settings.MEDIA_CLEANUP_ON_COMMIT:
+            task_ids = [task.pk for task in tasks]
+            if None in task_ids:  # backends that do not return ids from bulk inserts
+                task_ids = None
+            transaction.on_commit(lambda: start_cleanup(task_ids))
+    return {"cases": len(cases), "images": image_count}
+
+
+def _remove(path):
+    # Relative paths are under MEDIA_ROOT; absolute ones may also be in the log archive
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    full_path = os.path.realpath(os.path.join(media_root, path))
+    roots = [media_root, os.path.realpath(settings.ACTIVITY_LOG_ARCHIVE_ROOT)]
+    if not any(full_path != root and os.path.commonpath([full_path, root]) == root for root in roots):
+        raise ValueError(f"{path} is outside MEDIA_ROOT and the log archive")
+    if os.path.isdir(full_path):
+        shutil.rmtree(full_path)
+    elif os.path.lexists(full_path):
+        os.remove(full_path)
+
+
+def run_cleanup(task_ids=None, limit=None):
+    """
+    Remove queued paths, oldest first; a path that is already gone counts as
+    removed.  Failed tasks stay queued with their error.  Returns the number
+    of paths removed and failed.
+    """
+    tasks = MediaCleanupTask.objects.order_by("id")
+    if task_ids is not None:
+        tasks = tasks.filter(id__in=task_ids)
+    if limit is not None:
+        tasks = tasks[:limit]
+    removed, failed = [], 0
+    for task in tasks:
+        try:
+            _remove(task.path)
+        except (OSError, ValueError) as e:
+            failed += 1
+            task.attempts += 1
+            task.last_error = str(e)
+            task.save(update_fields=["attempts", "last_error"])
+        else:
+            removed.append(task.pk)
+    MediaCleanupTask.objects.filter(id__in=removed).delete()
+    return len(removed), failed
+
+
+def _cleanup_thread(task_ids):
+    try:
+        run_cleanup(task_ids)
+    finally:
+        connection.close()
+
+
+def start_cleanup(task_ids):
+    """Remove the paths of ``task_ids`` in a background thread."""
+    threading.Thread(target=_cleanup_thread, args=(task_ids,), daemon=True).start()
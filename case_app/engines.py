@@ -0,0 +1,53 @@
+"""
+Lazily imported heavy libraries.
+
+xhtml2pdf (which pulls in reportlab, html5lib, pyHanko and aiohttp), imagehash
+(PyWavelets), scipy's FFT and ndimage packages and PyNaCl account for most of
+the time a process spends importing this app, yet most requests and management
+commands never use them.  Modules refer to them as attributes of this module,
+e.g. ``engines.imagehash.phash(img)``; each is imported on first access.
+
+``warmup`` imports them all up front, together with the URLconf and views.  A
+prefork server that loads the application in its master process
+(``gunicorn --preload``) then pays the cost once, before forking its workers;
+see ``PRELOAD_ENGINES`` in the settings.
+"""
+import importlib
+import threading
+
+from django.conf import settings
+
+ENGINES = {
+    "pisa": "xhtml2pdf.pisa",
+    "imagehash": "imagehash",
+    "fft": "scipy.fft",
+    "ndimage": "scipy.ndimage",
+    "nacl_signing": "nacl.signing",
+    "nacl_encoding": "nacl.encoding",
+    "nacl_exceptions": "nacl.exceptions",
+}
+
+_lock = threading.Lock()
+
+
+def __getattr__(name):
+    try:
+        module_name = ENGINES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    with _lock:
+        module = importlib.import_module(module_name)
+        globals()[name] = module  # later lookups bypass __getattr__
+    return module
+
+
+def loaded():
+    """Names of the engines imported so far."""
+    return sorted(name for name in ENGINES if name in globals())
+
+
+def warmup():
+    """Import every engine, the URLconf and the views it references."""
+    for name in ENGINES:
+        __getattr__(name)
+    importlib.import_module(settings.ROOT_URLCONF)
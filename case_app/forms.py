@@ -7,12 +7,32 @@ class CaseForm(forms.ModelForm):
     """
     class Meta:
         model = Case
-        fields = ['name', 'description', 'tampering_threshold']
+        fields = ['name', 'description', 'tampering_threshold', 'storage_format', 'storage_quality', 'similarity_metric']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter case name'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Enter case description'}),
             'tampering_threshold': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Enter tampering threshold'}),
+            'storage_format': forms.Select(attrs={'class': 'form-select'}),
+            'storage_quality': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': 95}),
+            'similarity_metric': forms.Select(attrs={'class': 'form-select'}),
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The storage policy and metric are optional; missing values fall back to the model defaults
+        self.fields['storage_format'].required = False
+        self.fields['storage_quality'].required = False
+        self.fields['similarity_metric'].required = False
+
+    def clean_storage_format(self):
+        return self.cleaned_data.get('storage_format') or Case._meta.get_field('storage_format').default
+
+    def clean_similarity_metric(self):
+        return self.cleaned_data.get('similarity_metric') or Case._meta.get_field('similarity_metric').default
+
+    def clean_storage_quality(self):
+        quality = self.cleaned_data.get('storage_quality')
+        return Case._meta.get_field('storage_quality').default if quality is None else quality
         
 class ImageUploadForm(forms.ModelForm):
     """
@@ -0,0 +1,54 @@
+"""
+Frames of multi-frame images (multi-page TIFF, animated GIF and WebP).
+
+``iter_frames`` is a generator that seeks to and decodes one frame at a time,
+so however many frames a file has, only the current one is held in memory.
+Nothing here touches the database.
+"""
+import hashlib
+
+from PIL import Image as PILImage
+
+from . import engines
+
+
+def frame_count(img):
+    return getattr(img, "n_frames", 1)
+
+
+def iter_frames(img, start=0):
+    """Yield ``(index, frame)`` pairs of an open PIL image, each frame converted to RGB."""
+    for index in range(start, frame_count(img)):
+        img.seek(index)
+        yield index, img.convert("RGB")
+
+
+def frame_sha256(frame):
+    """SHA-256 of a decoded frame's size and RGB pixels."""
+    hasher = hashlib.sha256(f"{frame.width}x{frame.height}:".encode())
+    hasher.update(frame.tobytes())
+    return hasher.hexdigest()
+
+
+def frame_records(source):
+    """
+    Yield the ``ImageFrame`` field values of every frame of ``source`` (a
+    path or file object), decoding one frame at a time.
+    """
+    with PILImage.open(source) as img:
+        for index, frame in iter_frames(img):
+            yield {
+                "index": index,
+                "sha256_hash": frame_sha256(frame),
+                "perceptual_hash": str(engines.imagehash.phash(frame)),
+                "width": frame.width,
+                "height": frame.height,
+                "duration_ms": int(img.info["duration"]) if img.info.get("duration") is not None else None,
+            }
+
+
+def read_frame(source, index):
+    """Decode the single frame ``index`` of ``source`` as RGB."""
+    with PILImage.open(source) as img:
+        img.seek(index)
+        return img.convert("RGB")
@@ -0,0 +1,159 @@
+"""
+Lightweight timing instrumentation for the image hot paths.
+
+``span(name)`` is a context manager and ``timed(name)`` a decorator; both
+record the elapsed time of a stage into a per-process histogram and, while a
+request is being served, into that request's Server-Timing breakdown (see
+``case_app.middleware.ServerTimingMiddleware``).  When
+``settings.INSTRUMENTATION_ENABLED`` is false they reduce to one attribute
+lookup and a shared no-op context manager.
+"""
+import functools
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+_NOOP = nullcontext()
+_request_timings = ContextVar("imageguard_request_timings", default=None)
+
+
+def enabled():
+    return settings.INSTRUMENTATION_ENABLED
+
+
+class Histogram:
+    """Cumulative-bucket histogram, safe to update from several threads."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+
+class Registry:
+    """Named histograms for one metric family."""
+
+    def __init__(self, name, help_text, buckets, label):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key, value):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key in sorted(self.histograms):
+            counts, count, total = self.histograms[key].snapshot()
+            label = f'{self.label}="{key}"'
+            for bound, value in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {value}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+stage_seconds = Registry(
+    "imageguard_stage_seconds", "Time spent in instrumented stages.", STAGE_BUCKETS, "stage")
+request_db_queries = Registry(
+    "imageguard_request_db_queries", "Database queries per request.", QUERY_BUCKETS, "view")
+
+
+class RequestTimings:
+    """Per-request accumulation of stage durations, in insertion order."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+def record(name, seconds):
+    """Record ``seconds`` spent in stage ``name``."""
+    stage_seconds.observe(name, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name):
+    """Time the enclosed block as stage ``name``."""
+    if not settings.INSTRUMENTATION_ENABLED:
+        return _NOOP
+    return _Span(name)
+
+
+def timed(name):
+    """Decorator form of ``span``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.INSTRUMENTATION_ENABLED:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request():
+    """Begin collecting stage timings for the current request."""
+    timings = RequestTimings()
+    return timings, _request_timings.set(timings)
+
+
+def end_request(token):
+    _request_timings.reset(token)
+
+
+def render_metrics():
+    """All metric families in the Prometheus text exposition format."""
+    return "\n".join(stage_seconds.render() + request_db_queries.render()) + "\n"
@@ -0,0 +1,194 @@
+"""
+Retention and compressed archive tier of the activity log.
+
+``archive`` moves ``ActivityLog`` rows older than the retention period out of
+the database in batches.  Each batch appends one gzip member per case and
+month to ``<ACTIVITY_LOG_ARCHIVE_ROOT>/<case_id>/<YYYY-MM>.ndjson.gz`` (``none``
+for entries without a case), holding one JSON object per entry, oldest first.
+Concatenated gzip members are still a valid gzip file, so the files are only
+ever appended to and can be read with ``zcat``.
+
+Every member is indexed by a ``LogArchiveSegment`` row with its offset,
+length, SHA-256, entry count and id range.  The index is authoritative: bytes
+no segment covers (a batch whose database commit failed) are never read.
+
+``CaseLogHistory`` presents a case's rows still in the database followed by
+its archived entries as one newest-first sequence, decompressing only the
+segments a page overlaps.
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import caching
+from .deletion import _raw_delete
+from .models import ActivityLog, LogArchiveSegment
+
+BATCH_SIZE = 1000
+FIELDS = ("id", "user_id", "user__username", "case_id", "action", "details", "timestamp")
+
+
+class ArchiveError(Exception):
+    """An archive segment is missing or does not match its checksum."""
+
+
+def segment_path(case_id, month):
+    """Archive file of a case's entries for ``month``, relative to the archive root."""
+    return os.path.join(str(case_id) if case_id else "none", f"{month:%Y-%m}.ndjson.gz")
+
+
+def _record(row):
+    return {
+        "id": row["id"],
+        "user_id": row["user_id"],
+        "username": row["user__username"],  # kept in case the user is deleted later
+        "case_id": row["case_id"],
+        "action": row["action"],
+        "details": row["details"],
+        "timestamp": row["timestamp"].isoformat(),
+    }
+
+
+def append_segment(case_id, month, records):
+    """
+    Append ``records`` as one gzip member to the archive file of ``case_id``
+    and ``month``, synced to disk, and return its unsaved segment row.
+    """
+    path = segment_path(case_id, month)
+    full_path = os.path.join(settings.ACTIVITY_LOG_ARCHIVE_ROOT, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+    data = gzip.compress(lines.encode(), mtime=0)
+    with open(full_path, "ab") as handle:
+        offset = handle.seek(0, os.SEEK_END)
+        handle.write(data)
+        handle.flush()
+        os.fsync(handle.fileno())
+    return LogArchiveSegment(
+        case_id=case_id, month=month, path=path, offset=offset, length=len(data),
+        sha256=hashlib.sha256(data).hexdigest(), count=len(records),
+        first_id=records[0]["id"], last_id=records[-1]["id"],
+        first_timestamp=parse_datetime(records[0]["timestamp"]),
+        last_timestamp=parse_datetime(records[-1]["timestamp"]),
+    )
+
+
+def archive(days=None, batch_size=BATCH_SIZE, limit=None, log=None):
+    """
+    Move entries older than ``days`` (default ``ACTIVITY_LOG_RETENTION_DAYS``)
+    to the archive, oldest first, one transaction per batch.  Returns the
+    number of entries archived.
+    """
+    days = settings.ACTIVITY_LOG_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    old = ActivityLog.objects.filter(timestamp__lt=cutoff).order_by("id").values(*FIELDS)
+    archived = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        rows = list(old[:size])
+        if not rows:
+            break
+        groups = {}
+        for row in rows:
+            month = row["timestamp"].astimezone(dt_timezone.utc).date().replace(day=1)
+            groups.setdefault((row["case_id"], month), []).append(_record(row))
+        with transaction.atomic():
+            LogArchiveSegment.objects.bulk_create(
+                append_segment(case_id, month, records) for (case_id, month), records in groups.items()
+            )
+            _raw_delete(ActivityLog.objects.filter(id__in=[row["id"] for row in rows]))
+            for case_id in {case_id for case_id, _ in groups} - {None}:
+                caching.bump_version(caching.logs_namespace(case_id))
+        archived += len(rows)
+        if log:
+            log(f"Archived {archived} entries.")
+    return archived
+
+
+def read_segment(segment):
+    """The records of ``segment``, oldest first, after checking its SHA-256."""
+    full_path = os.path.join(settings.ACTIVITY_LOG_ARCHIVE_ROOT, segment.path)
+    try:
+        with open(full_path, "rb") as handle:
+            handle.seek(segment.offset)
+            data = handle.read(segment.length)
+    except OSError as e:
+        raise ArchiveError(f"{segment.path}: {e}")
+    if len(data) != segment.length or hashlib.sha256(data).hexdigest() != segment.sha256:
+        raise ArchiveError(f"{segment.path} at offset {segment.offset} does not match its checksum.")
+    return [json.loads(line) for line in gzip.decompress(data).splitlines()]
+
+
+def verify(segments=None):
+    """Check every segment (or ``segments``); returns ``(segment, error)`` pairs for failures."""
+    segments = LogArchiveSegment.objects.order_by("id") if segments is None else segments
+    failures = []
+    for segment in segments:
+        try:
+            records = read_segment(segment)
+        except (ArchiveError, OSError, ValueError) as e:
+            failures.append((segment, str(e)))
+            continue
+        if len(records) != segment.count:
+            failures.append((segment, f"holds {len(records)} entries, not {segment.count}."))
+    return failures
+
+
+def entry(record):
+    """An unsaved ``ActivityLog`` for an archived record, marked ``archived``."""
+    log = ActivityLog(
+        id=record["id"], user_id=record["user_id"], case_id=record["case_id"], action=record["action"],
+        details=record["details"], timestamp=parse_datetime(record["timestamp"]),
+    )
+    log.archived = True
+    log.username = record["username"]
+    return log
+
+
+class CaseLogHistory:
+    """
+    A case's activity log, newest first: the entries still in the database,
+    then the archived ones.  Supports ``len`` and slicing, so it can be
+    paginated; a slice only reads the archive segments it overlaps.
+    """
+
+    def __init__(self, case_id):
+        self.case_id = case_id
+        self.recent = ActivityLog.objects.filter(case_id=case_id).order_by("-timestamp", "-id")
+
+    @cached_property
+    def recent_count(self):
+        return self.recent.count()
+
+    @cached_property
+    def segments(self):
+        return list(LogArchiveSegment.objects.filter(case_id=self.case_id).order_by("-last_id"))
+
+    def __len__(self):
+        return self.recent_count + sum(segment.count for segment in self.segments)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        entries = []
+        if start < self.recent_count:
+            entries += self.recent[start:min(stop, self.recent_count)]
+        position = self.recent_count
+        for segment in self.segments:
+            if position >= stop:
+                break
+            end = position + segment.count
+            if end > start:
+                records = read_segment(segment)[::-1]
+                entries += [entry(record) for record in records[max(start - position, 0):stop - position]]
+            position = end
+        return entries
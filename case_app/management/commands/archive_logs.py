@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from case_app import log_archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move activity log entries older than the retention period into compressed per-case, "
+        "per-month archive files, or check the archive against its checksums."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int,
+                            help="Archive entries older than this many days (default ACTIVITY_LOG_RETENTION_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=log_archive.BATCH_SIZE,
+                            help="Entries moved per transaction.")
+        parser.add_argument("--limit", type=int, help="Archive at most this many entries.")
+        parser.add_argument("--verify", action="store_true",
+                            help="Check every archive segment against its checksum instead of archiving.")
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            failures = log_archive.verify()
+            for segment, error in failures:
+                self.stderr.write(f"Segment {segment.pk}: {error}")
+            if failures:
+                raise CommandError(f"{len(failures)} archive segments failed verification.")
+            self.stdout.write("Every archive segment matches its checksum.")
+            return
+
+        days = options["days"] if options["days"] is not None else settings.ACTIVITY_LOG_RETENTION_DAYS
+        if days is None:
+            raise CommandError("No retention period: pass --days or set ACTIVITY_LOG_RETENTION_DAYS.")
+        archived = log_archive.archive(
+            days, batch_size=options["batch_size"], limit=options["limit"],
+            log=self.stdout.write if options["verbosity"] > 1 else None,
+        )
+        self.stdout.write(f"Archived {archived} entries older than {days} days.")
@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from case_app.metadata import extract_path
+from case_app.models import Image, ImageMetadata
+
+
+class Command(BaseCommand):
+    help = (
+        "Extract header metadata for images stored before metadata was recorded at ingest. "
+        "Files are parsed in parallel worker processes; only headers are read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes (default: one per CPU; 1 parses in this process).")
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Images handed to the workers and inserted per batch (default 500).")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        missing = Image.objects.filter(metadata__isnull=True).order_by("id").values_list("id", "image")
+        total = missing.count()
+        self.stdout.write(f"{total} images without metadata.")
+        if not total:
+            return
+
+        workers = options["workers"] or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        added = unreadable = 0
+        try:
+            batch = []
+            for row in missing.iterator(chunk_size=options["batch_size"]):
+                batch.append(row)
+                if len(batch) >= options["batch_size"]:
+                    done, failed = self.process(batch, executor, workers)
+                    added, unreadable = added + done, unreadable + failed
+                    batch = []
+            done, failed = self.process(batch, executor, workers)
+            added, unreadable = added + done, unreadable + failed
+        finally:
+            if executor:
+                executor.shutdown()
+        self.stdout.write(f"Recorded metadata for {added} images; {unreadable} files could not be read.")
+
+    def process(self, batch, executor, workers):
+        if not batch:
+            return 0, 0
+        storage = Image._meta.get_field("image").storage
+        paths = [storage.path(name) for _, name in batch]
+        if executor:
+            results = executor.map(extract_path, paths, chunksize=max(1, len(paths) // (workers * 4)))
+        else:
+            results = map(extract_path, paths)
+        rows = [
+            ImageMetadata(image_id=image_id, **fields)
+            for (image_id, _), fields in zip(batch, results) if fields is not None
+        ]
+        # ignore_conflicts: an upload may have recorded its own metadata meanwhile
+        ImageMetadata.objects.bulk_create(rows, ignore_conflicts=True)
+        return len(rows), len(batch) - len(rows)
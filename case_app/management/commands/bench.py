@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.harness import compare
+from benchmarks.suite import BENCHMARKS, QUICK, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the benchmark suite (ingest, pHash, detect_tampering, exports, case_list, "
+        "case_logs, WSGI vs ASGI concurrent verification) against a throwaway test "
+        "database and write the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Run only these benchmarks.")
+        parser.add_argument("--images", type=int, help="Number of synthetic images (default 20).")
+        parser.add_argument("--resolution", help="Synthetic image resolution as WIDTHxHEIGHT (default 1024x768).")
+        parser.add_argument("--cases", type=int, help="Cases seeded for case_list (default 10000).")
+        parser.add_argument("--log-rows", type=int, help="Log rows seeded for case_logs (default 1000000).")
+        parser.add_argument("--page-requests", type=int, help="Page requests per list benchmark (default 50).")
+        parser.add_argument("--export-iterations", type=int, help="Requests per export benchmark (default 5).")
+        parser.add_argument("--verifiers", type=int, help="Concurrent verifiers for verify_wsgi/verify_asgi (default 50).")
+        parser.add_argument("--verifier-requests", type=int, help="Detections per concurrent verifier (default 2).")
+        parser.add_argument("--seed", type=int, help="Dataset seed (default 0).")
+        parser.add_argument("--quick", action="store_true", help="Small dataset for smoke runs.")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--baseline", help="Compare against a previous JSON report.")
+        parser.add_argument("--threshold", type=float, default=0.10,
+                            help="Allowed relative regression against --baseline (default 0.10).")
+
+    def handle(self, *args, **options):
+        params = dict(QUICK) if options["quick"] else {}
+        for key in ("images", "cases", "log_rows", "page_requests", "export_iterations",
+                    "verifiers", "verifier_requests", "seed", "only"):
+            if options[key] is not None:
+                params[key] = options[key]
+        if options["resolution"]:
+            try:
+                params["width"], params["height"] = (int(part) for part in options["resolution"].lower().split("x"))
+            except ValueError:
+                raise CommandError("--resolution must look like 1024x768")
+
+        report = run_suite(log=lambda message: self.stderr.write(message), **params)
+
+        self.stdout.write(f"{'benchmark':<18} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS MiB':>13}")
+        for name, result in report["results"].items():
+            self.stdout.write(
+                f"{name:<18} {result['throughput_per_second']:>9.2f} {result['p50_ms']:>9.2f} "
+                f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['peak_rss_kb'] / 1024:>13.1f}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                json.dump(report, handle, indent=2, default=str)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options["baseline"]:
+            with open(options["baseline"]) as handle:
+                baseline = json.load(handle)
+            regressions = compare(report["results"], baseline.get("results", {}), options["threshold"])
+            for name, metric, old, new, change in regressions:
+                self.stdout.write(self.style.ERROR(f"REGRESSION {name}.{metric}: {old} -> {new} ({change:+.1%})"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} metric(s) regressed beyond {options['threshold']:.0%}")
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
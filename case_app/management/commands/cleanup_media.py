@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from case_app.deletion import run_cleanup
+from case_app.models import MediaCleanupTask
+
+
+class Command(BaseCommand):
+    help = "Remove media files and directories queued by bulk case deletions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, help="Remove at most this many queued paths.")
+
+    def handle(self, *args, **options):
+        queued = MediaCleanupTask.objects.count()
+        removed, failed = run_cleanup(limit=options["limit"])
+        self.stdout.write(f"Removed {removed} of {queued} queued paths; {failed} failed and stay queued.")
+        for task in MediaCleanupTask.objects.filter(attempts__gt=0).order_by("id")[:20]:
+            self.stdout.write(f"  {task.path}: {task.attempts} attempts, last error: {task.last_error}")
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from case_app import media_gc
+
+
+class Command(BaseCommand):
+    help = (
+        "Find media files no database row refers to (deleted cases and images, replaced "
+        "files, detection artifacts, abandoned uploads) and report the space they use. "
+        "Nothing is removed unless --delete is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="Remove the orphans (default: dry run).")
+        parser.add_argument("--grace-hours", type=float, default=24,
+                            help="Leave files modified within this many hours alone (default 24).")
+        parser.add_argument("--workers", type=int, default=8, help="Directory scanning threads (default 8).")
+        parser.add_argument("--list", action="store_true", help="Print a sample of orphan paths.")
+
+    def handle(self, *args, **options):
+        if options["grace_hours"] < 0 or options["workers"] < 1:
+            raise CommandError("--grace-hours must not be negative and --workers must be at least 1.")
+        stats, sample = media_gc.sweep(
+            grace_seconds=options["grace_hours"] * 3600, delete=options["delete"], workers=options["workers"],
+        )
+
+        self.stdout.write(f"{'area':<12} {'files':>9} {'size':>10} {'orphans':>9} {'reclaimable':>12}")
+        for area, area_stats in stats.items():
+            self.stdout.write(
+                f"{area:<12} {area_stats['files']:>9} {filesizeformat(area_stats['bytes']):>10} "
+                f"{area_stats['orphans']:>9} {filesizeformat(area_stats['orphan_bytes']):>12}"
+            )
+        orphans = sum(area_stats["orphans"] for area_stats in stats.values())
+        reclaimable = sum(area_stats["orphan_bytes"] for area_stats in stats.values())
+        if options["delete"]:
+            removed = sum(area_stats["removed"] for area_stats in stats.values())
+            errors = sum(area_stats["errors"] for area_stats in stats.values())
+            self.stdout.write(f"Removed {removed} of {orphans} orphans ({filesizeformat(reclaimable)}); {errors} errors.")
+            self.stdout.write(f"Expired {stats['uploads']['expired_sessions']} abandoned upload sessions.")
+        else:
+            self.stdout.write(f"{orphans} orphans, {filesizeformat(reclaimable)} reclaimable. "
+                              "Run with --delete to remove them.")
+        if options["list"]:
+            for path in sample:
+                self.stdout.write(f"  {path}")
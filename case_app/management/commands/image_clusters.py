@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from case_app import clustering
+from case_app.models import Case, HashIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Report clusters of exact and near-duplicate images across all cases. "
+        "With --rebuild, first recompute every cluster from the hash index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Index missing images and recompute all clusters before reporting.")
+        parser.add_argument("--case", type=int, help="Only report clusters containing images of this case.")
+        parser.add_argument("--min-size", type=int, default=2, help="Smallest cluster to report (default 2).")
+        parser.add_argument("--limit", type=int, default=50, help="Largest clusters to list (default 50).")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            stats = clustering.rebuild(log=self.stdout.write)
+            self.stdout.write(
+                f"Rebuilt {stats['images']} images: {stats['changed']} labels changed, "
+                f"{stats['clusters']} clusters of two or more."
+            )
+
+        clusters = HashIndex.objects.values("cluster_id")
+        if options["case"] is not None:
+            if not Case.objects.filter(id=options["case"]).exists():
+                raise CommandError(f"Case {options['case']} does not exist.")
+            clusters = clusters.filter(cluster_id__in=HashIndex.objects.filter(
+                image__case_id=options["case"]).values("cluster_id"))
+        clusters = (
+            clusters.annotate(size=Count("image_id"), cases=Count("image__case", distinct=True),
+                              copies=Count("sha_key", distinct=True))
+            .filter(size__gte=options["min_size"]).order_by("-size", "cluster_id")
+        )
+
+        total = clusters.count()
+        self.stdout.write(f"{total} clusters with at least {options['min_size']} images.")
+        if not total:
+            return
+        self.stdout.write(f"{'cluster':>10} {'images':>7} {'distinct':>8} {'cases':>6}  case names")
+        for cluster in clusters[:options["limit"]]:
+            names = (
+                Case.objects.filter(images__hash_index__cluster_id=cluster["cluster_id"])
+                .distinct().order_by("name").values_list("name", flat=True)[:5]
+            )
+            more = ", ..." if cluster["cases"] > 5 else ""
+            self.stdout.write(
+                f"{cluster['cluster_id']:>10} {cluster['size']:>7} {cluster['copies']:>8} "
+                f"{cluster['cases']:>6}  {', '.join(names)}{more}"
+            )
@@ -0,0 +1,81 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import loadtest
+from benchmarks.datasets import generate_images
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate investigators against a local server: synthetic users browse cases and logs, "
+        "create cases, upload images, run detections and export, with a configurable mix and "
+        "concurrency.  Reports throughput, latency percentiles and error rates per endpoint and "
+        "the server's RSS over time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL.")
+        parser.add_argument("--serve", action="store_true",
+                            help="Start a server for the run (runserver on --url unless --server-cmd is given).")
+        parser.add_argument("--server-cmd", help="Command that starts the server, e.g. a gunicorn invocation.")
+        parser.add_argument("--server-pid", type=int,
+                            help="Pid of an already running server, to sample its memory (and its workers').")
+        parser.add_argument("--users", type=int, default=10, help="Synthetic users (default 10).")
+        parser.add_argument("--concurrency", type=int, default=10, help="Virtual users sending requests (default 10).")
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run (default 30).")
+        parser.add_argument("--requests", type=int, help="Requests per virtual user; overrides --duration.")
+        parser.add_argument("--mix", help="Action weights as name=weight,... (default: "
+                            + ",".join(f"{name}={weight}" for name, weight in loadtest.DEFAULT_MIX.items()) + ").")
+        parser.add_argument("--think-ms", type=float, default=0, help="Mean pause between a user's requests.")
+        parser.add_argument("--images-per-user", type=int, default=3, help="Images stored per synthetic user.")
+        parser.add_argument("--resolution", default="1024x768", help="Synthetic image size as WIDTHxHEIGHT.")
+        parser.add_argument("--rss-interval", type=float, default=1.0, help="Seconds between server RSS samples.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for images and request choices.")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the synthetic users and their cases afterwards.")
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options["mix"]) if options["mix"] else loadtest.DEFAULT_MIX
+        except ValueError as e:
+            raise CommandError(str(e))
+        try:
+            width, height = (int(part) for part in options["resolution"].lower().split("x"))
+        except ValueError:
+            raise CommandError("--resolution must look like 1024x768")
+        if options["users"] < 1 or options["concurrency"] < 1 or options["images_per_user"] < 1:
+            raise CommandError("--users, --concurrency and --images-per-user must be at least 1.")
+
+        self.stderr.write(f"Seeding {options['users']} users with {options['images_per_user']} images each...")
+        states = loadtest.seed_users(options["users"], options["images_per_user"], width, height, options["seed"])
+        uploads = list(generate_images(8, width, height, seed=options["seed"] + 100000))
+
+        server, server_pid = None, options["server_pid"]
+        if options["serve"]:
+            command = options["server_cmd"] or loadtest.default_server_command(options["url"])
+            try:
+                server = loadtest.start_server(command, options["url"])
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            server_pid = server.pid
+        try:
+            self.stderr.write(f"Running {options['concurrency']} virtual users against {options['url']}...")
+            report = loadtest.run(
+                options["url"], states, mix=mix, concurrency=options["concurrency"], duration=options["duration"],
+                requests_each=options["requests"], think_ms=options["think_ms"], uploads=uploads,
+                seed=options["seed"], server_pid=server_pid, rss_interval=options["rss_interval"],
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+            if options["cleanup"]:
+                self.stderr.write(f"Deleted the load test users and their {loadtest.cleanup()} cases.")
+
+        for line in loadtest.format_report(report):
+            self.stdout.write(line)
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
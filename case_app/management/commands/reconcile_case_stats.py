@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from case_app import stats
+from case_app.log_archive import ArchiveError
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized statistics of every case (image count, total bytes, last upload, "
+        "last detection, tampered detections, last activity) from the images and the activity log, "
+        "and repair the cases that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--case", type=int, action="append", dest="cases",
+                            help="Only reconcile this case id; may be repeated.")
+        parser.add_argument("--batch-size", type=int, default=stats.BATCH_SIZE, help="Cases checked per transaction.")
+        parser.add_argument("--sizes", action="store_true",
+                            help="First record the stored size of images that have none.")
+        parser.add_argument("--dry-run", action="store_true", help="Report the drift without repairing it.")
+
+    def handle(self, *args, **options):
+        if options["sizes"]:
+            self.stdout.write(f"Recorded the size of {stats.fill_file_sizes(options['batch_size'])} images.")
+        try:
+            checked, drifted = stats.reconcile(
+                options["cases"], batch_size=options["batch_size"], dry_run=options["dry_run"],
+                log=self.stdout.write if options["verbosity"] > 1 else None,
+            )
+        except ArchiveError as e:
+            raise CommandError(f"The log archive could not be read: {e}")
+        verb = "would be repaired" if options["dry_run"] else "repaired"
+        self.stdout.write(f"Checked {checked} cases; {drifted} had drifted and {verb}.")
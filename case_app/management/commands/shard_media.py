@@ -0,0 +1,89 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from case_app import caching, storage
+from case_app.models import Image
+
+
+class Command(BaseCommand):
+    help = (
+        "Move stored images into the configured media layout (settings.MEDIA_LAYOUT) in "
+        "batches while the site stays online. Each file is linked at its new path, the row "
+        "is repointed only if it still names the old path, then the old path is removed. "
+        "Safe to interrupt and rerun: images already in place are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--layout", choices=[storage.FLAT, storage.SHARDED],
+                            help="Target layout (default: settings.MEDIA_LAYOUT).")
+        parser.add_argument("--batch-size", type=int, default=500, help="Images per batch (default 500).")
+        parser.add_argument("--sleep", type=float, default=0.0,
+                            help="Seconds to pause between batches, to limit I/O load (default 0).")
+        parser.add_argument("--limit", type=int, help="Stop after moving this many files.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the files that would move.")
+
+    def handle(self, *args, **options):
+        layout = options["layout"] or settings.MEDIA_LAYOUT
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        last_id = 0
+        moved = missing = skipped = 0
+        while options["limit"] is None or moved < options["limit"]:
+            rows = list(
+                Image.objects.filter(id__gt=last_id).order_by("id")
+                .values_list("id", "case_id", "image")[:options["batch_size"]]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            moves = [
+                (image_id, case_id, name, storage.relocated_name(name, case_id, layout))
+                for image_id, case_id, name in rows
+            ]
+            moves = [move for move in moves if move[2] != move[3]]
+            if options["limit"] is not None:
+                moves = moves[:options["limit"] - moved]
+            if options["dry_run"]:
+                moved += len(moves)
+                continue
+
+            linked = []
+            for move in moves:
+                if not os.path.exists(os.path.join(settings.MEDIA_ROOT, move[2])):
+                    missing += 1
+                    continue
+                storage.link_into_place(move[2], move[3])
+                linked.append(move)
+
+            done = []
+            with transaction.atomic():
+                for image_id, case_id, name, target in linked:
+                    # The row may have been replaced or deleted since it was read
+                    if Image.objects.filter(pk=image_id, image=name).update(image=target):
+                        done.append((image_id, case_id, name, target))
+                for case_id in {move[1] for move in done}:
+                    caching.bump_version(caching.details_namespace(case_id))
+                if done:
+                    caching.bump_version(caching.images_namespace())
+            # Links of rows that changed meanwhile are left for gc_media
+            for _, _, name, _ in done:
+                storage.remove_stored(name)
+
+            moved += len(done)
+            skipped += len(linked) - len(done)
+            self.stdout.write(f"Moved {moved} files so far (up to image {last_id}).")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        if options["dry_run"]:
+            self.stdout.write(f"{moved} files would move to the {layout} layout.")
+            return
+        self.stdout.write(
+            f"Moved {moved} files to the {layout} layout; {missing} files were missing, "
+            f"{skipped} images changed while moving and were left as they were."
+        )
@@ -0,0 +1,75 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from case_app import verification
+from case_app.models import Case
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify a folder of suspect files against every image of a case: each file is hashed "
+        "once and compared pixel by pixel only with its nearest stored candidates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("case", type=int, help="Case id.")
+        parser.add_argument("paths", nargs="+", help="Suspect files or directories of them.")
+        parser.add_argument("--k", type=int, default=3, help="Nearest candidates compared per file (default 3).")
+        parser.add_argument("--max-distance", type=int, help="pHash distance limit (default VERIFY_MAX_DISTANCE).")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes (default: one per CPU; 1 runs in this process).")
+        parser.add_argument("--csv", help="Write the match matrix to this CSV file.")
+
+    def handle(self, *args, **options):
+        try:
+            case = Case.objects.get(id=options["case"])
+        except Case.DoesNotExist:
+            raise CommandError(f"Case {options['case']} does not exist.")
+        suspects = []
+        for path in options["paths"]:
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    suspects.extend(
+                        (os.path.relpath(os.path.join(root, name), path), os.path.join(root, name))
+                        for name in sorted(names) if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+                    )
+            elif os.path.isfile(path):
+                suspects.append((os.path.basename(path), path))
+            else:
+                raise CommandError(f"{path} does not exist.")
+        if not suspects:
+            raise CommandError("No suspect images found.")
+
+        workers = options["workers"] or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            report = verification.verify_batch(
+                case, suspects, k=options["k"], max_distance=options["max_distance"], executor=executor,
+            )
+        finally:
+            if executor:
+                executor.shutdown()
+
+        for row in report:
+            best = row["matches"][0] if row["matches"] else None
+            detail = f"image {best['image_id']}, SSIM {best['ssim']:.3f}, {best['distance']} bits" if best else ""
+            self.stdout.write(f"{verification.VERDICTS[row['verdict']]:<17} {row['name']}  {detail}")
+        counts = verification.summary(report)
+        self.stdout.write(", ".join(f"{label}: {counts[verdict]}" for verdict, label in verification.VERDICTS.items()))
+
+        if options["csv"]:
+            columns, rows = verification.matrix(report)
+            with open(options["csv"], "w", newline="") as handle:
+                writer = csv.writer(handle)
+                writer.writerow(["suspect", "verdict", "sha256"] + [f"image {image_id}" for image_id in columns])
+                for row in rows:
+                    writer.writerow(
+                        [row["suspect"]["name"], row["suspect"]["verdict"], row["suspect"]["sha256_hash"]]
+                        + [f"{cell['ssim']:.4f}/{cell['distance']}" if cell else "" for cell in row["cells"]]
+                    )
+            self.stdout.write(f"Match matrix written to {options['csv']}.")
@@ -0,0 +1,162 @@
+"""
+Serving stored media with validators and byte ranges.
+
+Stored files never change once written: images get random names and
+renditions are derived from them.  ``file_response`` therefore sends a strong
+``ETag`` (the image's SHA-256 when known, else one derived from the file's
+size and modification time) with ``Last-Modified``, answers conditional
+requests with 304 before opening the file, and serves a single
+``Range: bytes=...`` request as 206 Partial Content.  Full files are streamed
+with ``FileResponse`` so WSGI servers can use ``sendfile``.
+
+Behind a front proxy, ``MEDIA_SENDFILE`` hands the transfer over to it: with
+``"x-accel-redirect"`` (nginx) the response names the file under
+``MEDIA_ACCEL_PREFIX``, an ``internal`` location aliased to ``MEDIA_ROOT``;
+with ``"x-sendfile"`` (Apache mod_xsendfile, lighttpd) it carries the
+absolute path.  Permission checks and 304s still happen here.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote, unquote, urlsplit
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+X_ACCEL_REDIRECT = "x-accel-redirect"
+X_SENDFILE = "x-sendfile"
+IMMUTABLE = "private, max-age=31536000, immutable"
+REVALIDATE = "private, no-cache"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def storage_name(path):
+    """``path`` (relative to ``MEDIA_ROOT``) normalised, or ``None`` if it leaves ``MEDIA_ROOT``."""
+    name = posixpath.normpath(path.replace("\\", "/"))
+    if name in (".", "..") or name.startswith(("../", "/")) or "\x00" in name:
+        return None
+    return name
+
+
+def stat_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` (inclusive) of a single ``bytes`` range within ``size``
+    bytes; ``None`` when the header should be ignored and the whole file
+    sent, ``False`` when it cannot be satisfied.
+    """
+    match = _RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None  # absent, malformed or several ranges: RFC 9110 allows ignoring them
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1  # the last N bytes
+        if int(last) == 0:
+            return False
+    if start >= size:
+        return False
+    return start, end
+
+
+class RangeFile:
+    """
+    A file read from ``start`` for ``length`` bytes.  It has no ``fileno``,
+    so WSGI file wrappers read it rather than ``sendfile`` the whole file.
+    """
+
+    def __init__(self, handle, start, length):
+        self.handle = handle
+        self.remaining = length
+        handle.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.handle.close()
+
+
+def _sendfile_response(name, full_path, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == X_ACCEL_REDIRECT:
+        response["X-Accel-Redirect"] = quote(settings.MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + name)
+    else:
+        response["X-Sendfile"] = full_path
+    return response
+
+
+def file_response(request, name, etag=None, cache_control=IMMUTABLE, content_type=None):
+    """
+    Serve the stored file ``name`` (relative to ``MEDIA_ROOT``) for
+    ``request``, which must already have passed the permission checks.
+    ``etag`` defaults to one derived from the file's stat.  Raises
+    ``FileNotFoundError`` when the file is missing.
+    """
+    full_path = os.path.join(settings.MEDIA_ROOT, name)
+    if not os.path.isfile(full_path):
+        raise FileNotFoundError(full_path)
+    stat = os.stat(full_path)
+    etag = etag or stat_etag(stat)
+    content_type = content_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if settings.MEDIA_SENDFILE:
+            response = _sendfile_response(name, full_path, content_type)
+        else:
+            response = _stream(request, full_path, stat.st_size, etag, content_type)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = cache_control
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def _stream(request, full_path, size, etag, content_type):
+    byte_range = None
+    if "Range" in request.headers and request.method in ("GET", "HEAD"):
+        # A stale If-Range means the client's partial copy is outdated: send it all
+        if request.headers.get("If-Range", etag) == etag:
+            byte_range = parse_range(request.headers["Range"], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    handle = open(full_path, "rb")
+    if byte_range is None:
+        return FileResponse(handle, content_type=content_type)
+    start, end = byte_range
+    response = FileResponse(RangeFile(handle, start, end - start + 1), content_type=content_type, status=206)
+    response["Content-Length"] = end - start + 1
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def pdf_link_callback(uri, rel):
+    """
+    Resolve ``MEDIA_URL`` links for xhtml2pdf to files under ``MEDIA_ROOT``,
+    so PDF exports read images from disk instead of fetching them over HTTP.
+    """
+    path = unquote(urlsplit(uri).path)
+    if path.startswith(settings.MEDIA_URL):
+        name = storage_name(path[len(settings.MEDIA_URL):])
+        if name is not None:
+            return os.path.join(settings.MEDIA_ROOT, name)
+    return uri
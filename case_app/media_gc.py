@@ -0,0 +1,146 @@
+"""
+Mark-and-sweep garbage collection of orphaned media files.
+
+``references`` marks everything the database still points to: stored image
+files, the rendition directories of existing images and the partial files of
+unfinished upload sessions that received a chunk within the grace period or
+``UPLOAD_SESSION_TTL``.  Older sessions are abandoned; with ``delete`` their
+rows are expired (see ``uploads.expire_sessions``) before marking.  ``sweep`` then walks ``cases``, ``renditions``,
+``uploads`` and ``temp`` under ``MEDIA_ROOT`` with ``os.scandir`` in a thread
+pool, one task per top-level entry, and reports (or removes) every file that
+is not marked.  ``temp`` only holds per-request detection artifacts, so all of
+it is collectable.  Files modified within the grace period are never touched:
+they may belong to an upload whose row is not committed yet.
+"""
+import os
+import posixpath
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import uploads
+from .models import Image, UploadSession
+
+AREAS = ("cases", "renditions", "uploads", "temp")
+SAMPLE_SIZE = 50
+
+
+def session_max_age(grace_seconds):
+    """Seconds without a chunk after which an unfinished upload session is abandoned."""
+    return max(grace_seconds, settings.UPLOAD_SESSION_TTL)
+
+
+def references(grace_seconds=24 * 3600):
+    """The referenced names of each area, relative to the area's directory."""
+    marked = {area: set() for area in AREAS}
+    rows = Image.objects.values_list("case_id", "id", "image").iterator(chunk_size=5000)
+    for case_id, image_id, name in rows:
+        area, _, rest = posixpath.normpath(name.replace(os.sep, "/")).partition("/")
+        if area in marked:
+            marked[area].add(rest)
+        marked["renditions"].add(f"{case_id}/{image_id}")
+    cutoff = timezone.now() - timedelta(seconds=session_max_age(grace_seconds))
+    sessions = UploadSession.objects.filter(image__isnull=True, updated_at__gte=cutoff).values_list("id", flat=True)
+    marked["uploads"].update(f"{session_id}.part" for session_id in sessions.iterator())
+    return marked
+
+
+def _is_referenced(area, rel, marked):
+    if area == "renditions":
+        # Renditions are referenced as whole <case_id>/<image_id> directories
+        return "/".join(rel.split("/")[:2]) in marked
+    return rel in marked
+
+
+def _sweep(area, path, rel, marked, cutoff, delete, recurse):
+    """
+    Walk ``path`` (``rel`` relative to the area) and collect unreferenced
+    files older than ``cutoff``.  Returns the stats and a sample of orphans.
+    """
+    stats = Counter()
+    sample = []
+
+    def walk(path, rel):
+        # A directory modified within the grace period may be about to get
+        # its first file, so it is never pruned
+        settled = os.stat(path).st_mtime <= cutoff
+        empty = True
+        with os.scandir(path) as entries:
+            for entry in entries:
+                entry_rel = f"{rel}/{entry.name}" if rel else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if not recurse or not walk(entry.path, entry_rel):
+                        empty = False
+                    continue
+                info = entry.stat(follow_symlinks=False)
+                stats["files"] += 1
+                stats["bytes"] += info.st_size
+                if info.st_mtime > cutoff or _is_referenced(area, entry_rel, marked):
+                    empty = False
+                    continue
+                stats["orphans"] += 1
+                stats["orphan_bytes"] += info.st_size
+                if len(sample) < SAMPLE_SIZE:
+                    sample.append(f"{area}/{entry_rel}")
+                if not delete:
+                    empty = False
+                    continue
+                try:
+                    os.remove(entry.path)
+                    stats["removed"] += 1
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    stats["errors"] += 1
+                    empty = False
+        # Prune directories the sweep emptied (never the area directory itself)
+        if empty and delete and rel and settled:
+            try:
+                os.rmdir(path)
+            except OSError:
+                return False
+        return empty
+
+    walk(path, rel)
+    return stats, sample
+
+
+def sweep(grace_seconds=24 * 3600, delete=False, workers=8, marked=None):
+    """
+    Find (and with ``delete`` remove) unreferenced media files.  Returns
+    per-area stats (files, bytes, orphans, orphan_bytes, removed, errors,
+    and expired_sessions for ``uploads``) and a sample of orphan paths.
+    """
+    expired = uploads.expire_sessions(session_max_age(grace_seconds)) if delete else 0
+    if marked is None:
+        marked = references(grace_seconds)
+    cutoff = time.time() - grace_seconds
+    tasks = []
+    for area in AREAS:
+        area_path = os.path.join(settings.MEDIA_ROOT, area)
+        if not os.path.isdir(area_path):
+            continue
+        # Files directly in the area directory, then one task per subdirectory
+        tasks.append((area, area_path, "", False))
+        with os.scandir(area_path) as entries:
+            tasks.extend(
+                (area, entry.path, entry.name, True) for entry in entries if entry.is_dir(follow_symlinks=False)
+            )
+
+    stats = {area: Counter() for area in AREAS}
+    stats["uploads"]["expired_sessions"] = expired
+    sample = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            (area, executor.submit(_sweep, area, path, rel, marked[area], cutoff, delete, recurse))
+            for area, path, rel, recurse in tasks
+        ]
+        for area, future in futures:
+            area_stats, area_sample = future.result()
+            stats[area].update(area_stats)
+            sample.extend(area_sample[:SAMPLE_SIZE - len(sample)])
+    return stats, sample
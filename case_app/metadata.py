@@ -0,0 +1,114 @@
+"""
+Header-only metadata extraction.
+
+``extract_metadata`` reads camera make and model, capture time, editing
+software, GPS presence, dimensions, XMP presence and the ICC profile name.
+It only uses what ``PIL.Image.open`` parses from the file header and never
+calls ``load()``, so no pixels are decoded.  Nothing here touches the
+database, so it can run in worker processes.
+"""
+import io
+import re
+from datetime import datetime, timedelta, timezone
+
+from PIL import ExifTags
+from PIL import Image as PILImage
+
+FIELD_LENGTH = 255
+
+_XMP_TOOL = re.compile(rb'CreatorTool(?:="|>)([^"<]+)')
+_OFFSET = re.compile(r"^([+-])(\d{2}):(\d{2})$")
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    if not isinstance(value, str):
+        return ""
+    return " ".join(value.replace("\x00", " ").split())[:FIELD_LENGTH]
+
+
+def _capture_time(value, offset):
+    """EXIF ``YYYY:MM:DD HH:MM:SS`` as an aware datetime; UTC unless an offset is recorded."""
+    try:
+        moment = datetime.strptime(_text(value)[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    tz = timezone.utc
+    match = _OFFSET.match(_text(offset))
+    if match:
+        sign = -1 if match.group(1) == "-" else 1
+        tz = timezone(sign * timedelta(hours=int(match.group(2)), minutes=int(match.group(3))))
+    return moment.replace(tzinfo=tz)
+
+
+def _xmp(img):
+    xmp = img.info.get("xmp") or img.info.get("XML:com.adobe.xmp")
+    if xmp is None and hasattr(img, "tag_v2"):
+        xmp = img.tag_v2.get(700)  # TIFF XMP tag
+    if isinstance(xmp, str):
+        xmp = xmp.encode("utf-8", "replace")
+    return xmp or b""
+
+
+def _icc_name(icc):
+    if not icc:
+        return ""
+    try:
+        from PIL import ImageCms
+        return _text(ImageCms.ImageCmsProfile(io.BytesIO(icc)).profile.profile_description)
+    except Exception:
+        return "embedded"
+
+
+def _exif(img):
+    # PNG's getexif() decodes the image to reach an eXIf chunk stored after
+    # the pixel data; only use what the header already provided
+    if img.format == "PNG":
+        exif = PILImage.Exif()
+        if "exif" in img.info:
+            exif.load(img.info["exif"])
+        return exif
+    return img.getexif()
+
+
+def extract_metadata(source):
+    """
+    Return the ``ImageMetadata`` field values of ``source`` (a path or an
+    open file), parsing only the file header.
+    """
+    with PILImage.open(source) as img:
+        exif = _exif(img)
+        details = exif.get_ifd(ExifTags.IFD.Exif)
+        xmp = _xmp(img)
+
+        software = _text(exif.get(ExifTags.Base.Software))
+        if not software and xmp:
+            match = _XMP_TOOL.search(xmp)
+            software = _text(match.group(1)) if match else ""
+
+        captured_at = _capture_time(
+            details.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime),
+            details.get(ExifTags.Base.OffsetTimeOriginal),
+        )
+
+        return {
+            "make": _text(exif.get(ExifTags.Base.Make)),
+            "model": _text(exif.get(ExifTags.Base.Model)),
+            "software": software,
+            "captured_at": captured_at,
+            "gps_present": bool(exif.get_ifd(ExifTags.IFD.GPSInfo)),
+            "width": img.width,
+            "height": img.height,
+            "format": img.format or "",
+            "has_xmp": bool(xmp),
+            "icc_profile": _icc_name(img.info.get("icc_profile")),
+        }
+
+
+def extract_path(path):
+    """``extract_metadata`` for process pools: returns ``None`` for unreadable files."""
+    try:
+        return extract_metadata(path)
+    except (OSError, ValueError, SyntaxError):
+        return None
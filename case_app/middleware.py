@@ -0,0 +1,105 @@
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connections
+
+from . import instrumentation
+
+
+class QueryTimer:
+    """``execute_wrapper`` hook counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class RequestMeasurement:
+    """
+    Stages, database time and query count of one request, collected while
+    the measurement is entered and its connections are wrapped.
+    """
+
+    def __init__(self):
+        self.queries = QueryTimer()
+        self.wrappers = ExitStack()
+
+    def wrap_connections(self):
+        for connection in connections.all():
+            self.wrappers.enter_context(connection.execute_wrapper(self.queries))
+
+    def unwrap_connections(self):
+        self.wrappers.close()
+
+    def __enter__(self):
+        self.timings, self.token = instrumentation.start_request()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.total = time.perf_counter() - self.start
+        instrumentation.end_request(self.token)
+
+    def annotate(self, request, response):
+        """Record the measurement and add the ``Server-Timing`` header to ``response``."""
+        instrumentation.record("db", self.queries.seconds)
+        instrumentation.record("request", self.total)
+        match = request.resolver_match
+        instrumentation.request_db_queries.observe(match.view_name if match else "unresolved", self.queries.count)
+
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.timings.stages.items()]
+        entries.append(f'db;dur={self.queries.seconds * 1000:.2f};desc="{self.queries.count} queries"')
+        entries.append(f"total;dur={self.total * 1000:.2f}")
+        response["Server-Timing"] = ", ".join(entries)
+        return response
+
+
+class ServerTimingMiddleware:
+    """
+    Add a ``Server-Timing`` header with the instrumented stages of the
+    request, total database time and query count.  Does nothing unless
+    ``settings.INSTRUMENTATION_ENABLED`` is set.  Runs natively under both
+    WSGI and ASGI, so async views are not moved onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not instrumentation.enabled():
+            return self.get_response(request)
+        with RequestMeasurement() as measurement:
+            measurement.wrap_connections()
+            try:
+                response = self.get_response(request)
+            finally:
+                measurement.unwrap_connections()
+        return measurement.annotate(request, response)
+
+    async def __acall__(self, request):
+        if not instrumentation.enabled():
+            return await self.get_response(request)
+        with RequestMeasurement() as measurement:
+            # The ORM runs on the request's sync thread, whose connections are its own
+            await sync_to_async(measurement.wrap_connections)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(measurement.unwrap_connections)()
+        return measurement.annotate(request, response)
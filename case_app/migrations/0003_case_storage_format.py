@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-19 18:50
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_app', '0002_uploadsession'),
+    ]
+
+    operations = [
+        # Existing cases keep the old behaviour (JPEG quality 70); new cases
+        # default to storing the original bytes
+        migrations.AddField(
+            model_name='case',
+            name='storage_format',
+            field=models.CharField(choices=[('original', 'Original bytes'), ('png', 'Lossless PNG'), ('webp', 'Lossless WebP'), ('jpeg', 'JPEG (lossy)')], default='jpeg', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='case',
+            name='storage_format',
+            field=models.CharField(choices=[('original', 'Original bytes'), ('png', 'Lossless PNG'), ('webp', 'Lossless WebP'), ('jpeg', 'JPEG (lossy)')], default='original', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='storage_quality',
+            field=models.PositiveSmallIntegerField(default=70, help_text='JPEG quality, used when the storage format is JPEG.', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(95)]),
+        ),
+    ]
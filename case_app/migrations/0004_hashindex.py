@@ -0,0 +1,27 @@
+# Generated by Django 5.1.5 on 2026-10-19 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_app', '0003_case_storage_format'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HashIndex',
+            fields=[
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='hash_index', serialize=False, to='case_app.image')),
+                ('phash', models.BigIntegerField()),
+                ('sha_key', models.BigIntegerField(db_index=True)),
+                ('band0', models.PositiveIntegerField(db_index=True)),
+                ('band1', models.PositiveIntegerField(db_index=True)),
+                ('band2', models.PositiveIntegerField(db_index=True)),
+                ('band3', models.PositiveIntegerField(db_index=True)),
+                ('cluster_id', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+    ]
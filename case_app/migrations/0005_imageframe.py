@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-19 18:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_app', '0004_hashindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='frame_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='ImageFrame',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('sha256_hash', models.CharField(max_length=64)),
+                ('perceptual_hash', models.CharField(max_length=64)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='frames', to='case_app.image')),
+            ],
+            options={
+                'ordering': ['index'],
+                'constraints': [models.UniqueConstraint(fields=('image', 'index'), name='unique_image_frame')],
+            },
+        ),
+    ]
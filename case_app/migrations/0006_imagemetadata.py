@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-19 18:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_app', '0005_imageframe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageMetadata',
+            fields=[
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metadata', serialize=False, to='case_app.image')),
+                ('make', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('model', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('software', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('captured_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('gps_present', models.BooleanField(db_index=True, default=False)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('format', models.CharField(blank=True, max_length=16)),
+                ('has_xmp', models.BooleanField(default=False)),
+                ('icc_profile', models.CharField(blank=True, max_length=255)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_app', '0007_mediacleanuptask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='case',
+            name='similarity_metric',
+            field=models.CharField(choices=[('phash', 'Perceptual hash distance'), ('ssim', 'SSIM (structural similarity)'), ('ms_ssim', 'Multi-scale SSIM')], default='phash', help_text='How tampering detection scores similarity (see case_app.similarity).', max_length=16),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-19 19:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_app', '0008_case_similarity_metric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageIntegrity',
+            fields=[
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='integrity', serialize=False, to='case_app.image')),
+                ('digital_signature', models.TextField(blank=True, null=True)),
+                ('public_key', models.TextField(blank=True, null=True)),
+            ],
+        ),
+    ]
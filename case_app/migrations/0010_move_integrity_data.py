@@ -0,0 +1,51 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 2000
+
+
+def _batches(queryset):
+    """Rows of ``queryset`` in primary key order, one committed batch at a time."""
+    last = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            return
+        with transaction.atomic():
+            yield batch
+        last = batch[-1][0]
+
+
+def copy_to_integrity(apps, schema_editor):
+    Image = apps.get_model('case_app', 'Image')
+    ImageIntegrity = apps.get_model('case_app', 'ImageIntegrity')
+    rows = Image.objects.filter(integrity__isnull=True).values_list('pk', 'digital_signature', 'public_key')
+    for batch in _batches(rows):
+        ImageIntegrity.objects.bulk_create(
+            ImageIntegrity(image_id=pk, digital_signature=signature, public_key=public_key)
+            for pk, signature, public_key in batch
+        )
+
+
+def copy_to_image(apps, schema_editor):
+    Image = apps.get_model('case_app', 'Image')
+    ImageIntegrity = apps.get_model('case_app', 'ImageIntegrity')
+    rows = ImageIntegrity.objects.values_list('pk', 'digital_signature', 'public_key')
+    for batch in _batches(rows):
+        Image.objects.bulk_update(
+            [Image(pk=pk, digital_signature=signature, public_key=public_key) for pk, signature, public_key in batch],
+            ['digital_signature', 'public_key'],
+        )
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own, so a large table is never copied in a
+    # single long transaction and an interrupted run resumes where it stopped
+    atomic = False
+
+    dependencies = [
+        ('case_app', '0009_imageintegrity'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_integrity, copy_to_image),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_app', '0010_move_integrity_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='image',
+            name='digital_signature',
+        ),
+        migrations.RemoveField(
+            model_name='image',
+            name='public_key',
+        ),
+    ]
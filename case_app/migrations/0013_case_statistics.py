@@ -0,0 +1,75 @@
+# Generated by Django 5.1.5 on 2026-10-19 19:51
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_app', '0012_logarchivesegment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='case',
+            name='image_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='last_detection_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='last_upload_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='tampered_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='total_bytes',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['-last_activity_at', '-id'], name='case_activity'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['investigator', '-last_activity_at', '-id'], name='case_investigator_activity'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['-image_count', '-id'], name='case_image_count'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['-total_bytes', '-id'], name='case_total_bytes'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['-tampered_count', '-id'], name='case_tampered_count'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['name', 'id'], name='case_name'),
+        ),
+    ]
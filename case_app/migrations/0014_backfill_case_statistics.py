@@ -0,0 +1,78 @@
+import os
+
+from django.conf import settings
+from django.db import migrations, transaction
+from django.db.models import Count, Max, Q, Sum
+
+BATCH_SIZE = 2000
+DETECTION_ACTION = "Tampering Detection Performed"
+TAMPERED_MARKER = "Status: Tampered"
+
+
+def _batches(queryset):
+    """Rows of ``queryset`` in primary key order, one committed batch at a time."""
+    last = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            return
+        with transaction.atomic():
+            yield batch
+        last = batch[-1][0]
+
+
+def fill_file_sizes(apps, schema_editor):
+    Image = apps.get_model('case_app', 'Image')
+    for batch in _batches(Image.objects.filter(file_size__isnull=True).values_list('pk', 'image')):
+        images = []
+        for pk, name in batch:
+            try:
+                images.append(Image(pk=pk, file_size=os.path.getsize(os.path.join(settings.MEDIA_ROOT, name))))
+            except OSError:
+                continue  # missing files stay unset; Sum() skips them
+        Image.objects.bulk_update(images, ['file_size'])
+
+
+def fill_case_statistics(apps, schema_editor):
+    # Detections in archived log segments are not counted here;
+    # `manage.py reconcile_case_stats` includes them
+    Case = apps.get_model('case_app', 'Case')
+    Image = apps.get_model('case_app', 'Image')
+    ActivityLog = apps.get_model('case_app', 'ActivityLog')
+    for batch in _batches(Case.objects.values_list('pk', 'created_at')):
+        ids = [pk for pk, _ in batch]
+        images = {row['case_id']: row for row in Image.objects.filter(case_id__in=ids).values('case_id').annotate(
+            count=Count('id'), bytes=Sum('file_size'), last=Max('uploaded_at'))}
+        detections = {row['case_id']: row for row in ActivityLog.objects.filter(
+            case_id__in=ids, action=DETECTION_ACTION).values('case_id').annotate(
+            last=Max('timestamp'), tampered=Count('id', filter=Q(details__contains=TAMPERED_MARKER)))}
+        cases = []
+        for pk, created_at in batch:
+            image, detection = images.get(pk, {}), detections.get(pk, {})
+            case = Case(
+                pk=pk, image_count=image.get('count', 0), total_bytes=image.get('bytes') or 0,
+                last_upload_at=image.get('last'), last_detection_at=detection.get('last'),
+                tampered_count=detection.get('tampered', 0),
+            )
+            case.last_activity_at = max(filter(None, [created_at, case.last_upload_at, case.last_detection_at]))
+            cases.append(case)
+        Case.objects.bulk_update(cases, [
+            'image_count', 'total_bytes', 'last_upload_at', 'last_detection_at', 'tampered_count', 'last_activity_at',
+        ])
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own, so a large table is never updated in a
+    # single long transaction. An interrupted run is not recorded as applied
+    # and starts over when rerun: sizes already filled are skipped and the
+    # statistics of every case are recomputed, which is safe to repeat
+    atomic = False
+
+    dependencies = [
+        ('case_app', '0013_case_statistics'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_file_sizes, migrations.RunPython.noop),
+        migrations.RunPython(fill_case_statistics, migrations.RunPython.noop),
+    ]
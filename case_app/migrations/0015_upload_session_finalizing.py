@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_app', '0014_backfill_case_statistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='finalizing',
+            field=models.BooleanField(default=False),
+        ),
+    ]
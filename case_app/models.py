@@ -1,25 +1,30 @@
 import os
-import io
 import hashlib
+import tempfile
 import uuid
-import imagehash
-import nacl.signing
-import nacl.encoding
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.files import File
 from PIL import Image as PILImage
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.urls import reverse
 from django.utils.html import format_html
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+from . import engines
+from .instrumentation import span
+from .frames import frame_count, frame_records, iter_frames
+from .metadata import extract_metadata
+from .storage import image_name
+from .similarity import METRIC_CHOICES, PHASH
+from .transcoding import STORAGE_FORMAT_CHOICES, ORIGINAL, encode_for_storage, storage_name, rendition_path
 
 User = get_user_model()
 
 def case_image_upload_path(instance, filename):
-    """Generate a unique filename while storing the original name."""
-    ext = filename.split('.')[-1]  # Extract file extension
-    unique_filename = f"{uuid.uuid4().hex}.{ext}"  # Generate UUID-based filename
-    return os.path.join(f'cases/{instance.case.id}/', unique_filename)
+    """Generate a unique filename in the configured media layout (see case_app.storage)."""
+    return image_name(instance.case.id, filename)
 
 class Case(models.Model):
     name = models.CharField(max_length=255)
@@ -28,6 +33,48 @@ class Case(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     tampering_threshold = models.PositiveIntegerField(default=5)
+    storage_format = models.CharField(max_length=16, choices=STORAGE_FORMAT_CHOICES, default=ORIGINAL)
+    storage_quality = models.PositiveSmallIntegerField(
+        default=70, validators=[MinValueValidator(1), MaxValueValidator(95)],
+        help_text="JPEG quality, used when the storage format is JPEG.",
+    )
+    similarity_metric = models.CharField(
+        max_length=16, choices=METRIC_CHOICES, default=PHASH,
+        help_text="How tampering detection scores similarity (see case_app.similarity).",
+    )
+
+    # Denormalized statistics for the case list, kept current with F()
+    # updates and repaired by `manage.py reconcile_case_stats` (see case_app.stats).
+    # Every column the list sorts on is indexed, with the id as tie-breaker.
+    image_count = models.PositiveIntegerField(default=0, editable=False)
+    total_bytes = models.PositiveBigIntegerField(default=0, editable=False)
+    last_upload_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_detection_at = models.DateTimeField(null=True, blank=True, editable=False)
+    tampered_count = models.PositiveIntegerField(default=0, editable=False)
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-last_activity_at', '-id'], name='case_activity'),
+            models.Index(fields=['investigator', '-last_activity_at', '-id'], name='case_investigator_activity'),
+            models.Index(fields=['-image_count', '-id'], name='case_image_count'),
+            models.Index(fields=['-total_bytes', '-id'], name='case_total_bytes'),
+            models.Index(fields=['-tampered_count', '-id'], name='case_tampered_count'),
+            models.Index(fields=['name', 'id'], name='case_name'),
+        ]
+
+    STATISTICS = ('image_count', 'total_bytes', 'last_upload_at', 'last_detection_at', 'tampered_count',
+                  'last_activity_at')
+
+    def save(self, *args, **kwargs):
+        # Saving a case loaded earlier (e.g. from the edit form) must not
+        # overwrite the increments made since; only case_app.stats writes them
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STATISTICS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -38,18 +85,47 @@ class Image(models.Model):
     original_filename = models.CharField(max_length=255, blank=True, null=True)  # Store original filename
     sha256_hash = models.CharField(max_length=64, blank=True, null=True)
     perceptual_hash = models.CharField(max_length=64, blank=True, null=True)
-    digital_signature = models.TextField(blank=True, null=True)
-    public_key = models.TextField(blank=True, null=True)
+    frame_count = models.PositiveIntegerField(default=1)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)  # stored bytes, for Case.total_bytes
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
-    def thumbnail(self):
-        """Generate a small thumbnail preview for admin display."""
+    # Columns the listing pages render; the signature and public key live in
+    # ``ImageIntegrity`` so they are only read when verifying
+    LISTING_FIELDS = ('id', 'case', 'image', 'original_filename', 'frame_count', 'uploaded_at')
+
+    def _integrity_record(self):
+        """The image's ``ImageIntegrity`` row; an unsaved one until the image has been signed."""
         try:
-            if self.image:
-                return format_html('<img src="{}" style="width: 100px; height: auto;" />', self.image.url)
+            return self.integrity
+        except ImageIntegrity.DoesNotExist:
+            return ImageIntegrity(image=self)  # also caches it as self.integrity
+
+    @property
+    def digital_signature(self):
+        return self._integrity_record().digital_signature
+
+    @digital_signature.setter
+    def digital_signature(self, value):
+        self._integrity_record().digital_signature = value
+        self._integrity_changed = True
+
+    @property
+    def public_key(self):
+        return self._integrity_record().public_key
+
+    @public_key.setter
+    def public_key(self, value):
+        self._integrity_record().public_key = value
+        self._integrity_changed = True
+
+    def thumbnail(self):
+        """Small, lazily loaded thumbnail rendition for admin display."""
+        if not self.pk or not self.image:
             return "No Image"
-        except Exception:
-            return "Error loading thumbnail"
+        return format_html(
+            '<img src="{}" loading="lazy" style="width: 100px; height: auto;" />',
+            reverse('case_app:image_rendition', args=[self.pk, 'thumb']),
+        )
 
     def compute_sha256(self, file):
         """Compute SHA-256 hash of the original image."""
@@ -61,19 +137,19 @@ class Image(models.Model):
     def compute_perceptual_hash(self, file):
         """Compute Perceptual Hash (pHash) for detecting image tampering."""
         img = PILImage.open(file)
-        return str(imagehash.phash(img))
+        return str(engines.imagehash.phash(img))
 
     def generate_keys(self):
         """Generate Ed25519 key pair (Private & Public Key)."""
-        signing_key = nacl.signing.SigningKey.generate()
+        signing_key = engines.nacl_signing.SigningKey.generate()
         verify_key = signing_key.verify_key
-        self.public_key = verify_key.encode(encoder=nacl.encoding.Base64Encoder).decode()
+        self.public_key = verify_key.encode(encoder=engines.nacl_encoding.Base64Encoder).decode()
         return signing_key
 
     def sign_data(self, data):
         """Sign data using the Ed25519 private key."""
         signing_key = self.generate_keys()
-        signature = signing_key.sign(data.encode(), encoder=nacl.encoding.Base64Encoder)
+        signature = signing_key.sign(data.encode(), encoder=engines.nacl_encoding.Base64Encoder)
         return signature.signature.decode()
 
     def verify_signature(self):
@@ -81,12 +157,28 @@ class Image(models.Model):
         if not self.digital_signature or not self.public_key:
             return False
         try:
-            verify_key = nacl.signing.VerifyKey(self.public_key.encode(), encoder=nacl.encoding.Base64Encoder)
-            verify_key.verify(self.sha256_hash.encode(), nacl.encoding.Base64Encoder.decode(self.digital_signature.encode()))
+            encoder = engines.nacl_encoding.Base64Encoder
+            verify_key = engines.nacl_signing.VerifyKey(self.public_key.encode(), encoder=encoder)
+            verify_key.verify(self.sha256_hash.encode(), encoder.decode(self.digital_signature.encode()))
             return True
-        except nacl.exceptions.BadSignatureError:
+        except engines.nacl_exceptions.BadSignatureError:
             return False
 
+    def verify_file(self):
+        """
+        Check that the stored file still hashes to ``sha256_hash``.  Only files
+        stored as original bytes can match; transcoded files never do.
+        """
+        hasher = hashlib.sha256()
+        with self.image.open('rb') as handle:
+            for chunk in handle.chunks():
+                hasher.update(chunk)
+        return hasher.hexdigest() == self.sha256_hash
+
+    def rendition_path(self, name):
+        """Path of a viewing rendition (see transcoding.RENDITIONS), created on first use."""
+        return rendition_path(self.image.path, self.case_id, self.pk, name)
+
     def save(self, *args, **kwargs):
         """Override save method to store original filename and compute hashes."""
         if not self.original_filename:
@@ -94,41 +186,251 @@ class Image(models.Model):
 
         # Compute SHA-256 hash
         if not self.sha256_hash:
-            self.sha256_hash = self.compute_sha256(self.image)
+            with span("sha256"):
+                self.sha256_hash = self.compute_sha256(self.image)
 
         # Compute Perceptual Hash
         if not self.perceptual_hash:
-            self.perceptual_hash = self.compute_perceptual_hash(self.image)
+            with span("phash"):
+                self.perceptual_hash = self.compute_perceptual_hash(self.image)
+
+        # Header metadata comes from the uploaded bytes, before transcoding
+        # can strip it
+        metadata = getattr(self, '_metadata', None)
+        if metadata is None and self._state.adding and not self.image._committed:
+            with span("metadata"):
+                metadata = extract_metadata(self.image)
+
+        # Multi-frame files (TIFF pages, GIF/WebP animations) get a hash record
+        # per frame after saving; pHash above covers the first frame
+        if self._state.adding and not self.image._committed:
+            with PILImage.open(self.image) as img:
+                self.frame_count = frame_count(img)
 
         # Generate and store a digital signature
         if not self.digital_signature:
-            self.digital_signature = self.sign_data(self.sha256_hash)
+            with span("sign"):
+                self.digital_signature = self.sign_data(self.sha256_hash)
 
-        # Convert image to RGB and compress it
-        img = PILImage.open(self.image)
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
+        # Transcode new uploads according to the case's storage policy.  Cases
+        # that keep originals store the uploaded bytes untouched, so the file
+        # still matches sha256_hash.  Files already encoded (e.g. by
+        # analysis.process_upload in the worker pool) are stored as they are.
+        encoded = None
+        storage_format = self.case.storage_format
+        # Single-frame formats would drop every frame but the first, so
+        # multi-frame files are always stored as original bytes.
+        if (not self.image._committed and storage_format != ORIGINAL and self.frame_count == 1
+                and not getattr(self, '_encoded', False)):
+            with span("decode"):
+                img = PILImage.open(self.image)
+                img.load()
 
-        output_io_stream = io.BytesIO()
-        img.save(output_io_stream, format='JPEG', quality=70)
-        output_io_stream.seek(0)
+            # Encode into a temporary file rather than memory so large
+            # images are streamed to storage
+            with span("encode"):
+                encoded = tempfile.TemporaryFile()
+                encode_for_storage(img, storage_format, self.case.storage_quality, encoded)
+                encoded.seek(0)
 
-        self.image = ContentFile(output_io_stream.read(), name=self.image.name)
-        super().save(*args, **kwargs)
+            self.image = File(encoded, name=storage_name(self.image.name, storage_format))
+        if self.file_size is None and self.image:
+            try:
+                self.file_size = self.image.size
+            except OSError:
+                pass
+        adding = self._state.adding
+        try:
+            with span("db_write"):
+                super().save(*args, **kwargs)
+        finally:
+            if encoded is not None:
+                encoded.close()
+
+        if getattr(self, '_integrity_changed', False):
+            record = self.integrity
+            record.image = self
+            record.save()
+            self._integrity_changed = False
+
+        if adding and metadata is not None:
+            ImageMetadata.objects.create(image=self, **metadata)
+
+        if adding and self.frame_count > 1:
+            with span("frames"):
+                records = getattr(self, '_frames', None) or frame_records(self.image.path)
+                ImageFrame.objects.bulk_create(
+                    (ImageFrame(image=self, **record) for record in records), batch_size=500,
+                )
+
+    def iter_frames(self):
+        """Lazily decode the stored frames as ``(index, RGB frame)`` pairs."""
+        with PILImage.open(self.image.path) as img:
+            yield from iter_frames(img)
 
     def __str__(self):
         return f"{self.case.name} - {self.original_filename or 'Unnamed Image'}"
 
+class ImageIntegrity(models.Model):
+    """
+    The Ed25519 signature of an ``Image``'s SHA-256 and the public key to
+    verify it with.  Kept off the ``Image`` row, which every listing reads;
+    ``Image.digital_signature`` and ``Image.public_key`` read and write it.
+    """
+    image = models.OneToOneField(Image, on_delete=models.CASCADE, primary_key=True, related_name="integrity")
+    digital_signature = models.TextField(blank=True, null=True)
+    public_key = models.TextField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Integrity of image {self.image_id}"
+
+class ImageMetadata(models.Model):
+    """
+    Normalized header metadata of an ``Image``, extracted at ingest without
+    decoding pixels (see ``case_app.metadata``).  Empty strings mean the
+    field was absent; ``captured_at`` is UTC unless the file recorded an offset.
+    """
+    image = models.OneToOneField(Image, on_delete=models.CASCADE, primary_key=True, related_name="metadata")
+    make = models.CharField(max_length=255, blank=True, db_index=True)
+    model = models.CharField(max_length=255, blank=True, db_index=True)
+    software = models.CharField(max_length=255, blank=True, db_index=True)
+    captured_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    gps_present = models.BooleanField(default=False, db_index=True)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=16, blank=True)
+    has_xmp = models.BooleanField(default=False)
+    icc_profile = models.CharField(max_length=255, blank=True)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Metadata of image {self.image_id}"
+
+class ImageFrame(models.Model):
+    """
+    Hashes of one frame of a multi-frame ``Image``; ``sha256_hash`` covers
+    the decoded RGB pixels of the frame (see ``case_app.frames``).
+    """
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name="frames")
+    index = models.PositiveIntegerField()
+    sha256_hash = models.CharField(max_length=64)
+    perceptual_hash = models.CharField(max_length=64)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    duration_ms = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['index']
+        constraints = [models.UniqueConstraint(fields=['image', 'index'], name='unique_image_frame')]
+
+    def __str__(self):
+        return f"Frame {self.index} of image {self.image_id}"
+
+class HashIndex(models.Model):
+    """
+    Hashes of an ``Image`` in the form the near-duplicate clustering needs
+    (see ``case_app.clustering``): the pHash and its four 16-bit bands, the
+    first 64 bits of the SHA-256 and the image's cluster label.
+    """
+    image = models.OneToOneField(Image, on_delete=models.CASCADE, primary_key=True, related_name="hash_index")
+    phash = models.BigIntegerField()
+    sha_key = models.BigIntegerField(db_index=True)
+    band0 = models.PositiveIntegerField(db_index=True)
+    band1 = models.PositiveIntegerField(db_index=True)
+    band2 = models.PositiveIntegerField(db_index=True)
+    band3 = models.PositiveIntegerField(db_index=True)
+    cluster_id = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"Image {self.image_id} in cluster {self.cluster_id}"
+
+class UploadSession(models.Model):
+    """
+    A chunked, resumable upload in progress.  Chunks are written straight
+    into ``part_path`` at their offsets; ``received`` lists the chunk indexes
+    stored so far and ``image`` is set once the session is finalized.
+    ``finalizing`` marks a session claimed by a request that is ingesting it.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name="upload_sessions")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    received = models.JSONField(default=list, blank=True)
+    image = models.ForeignKey('Image', on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    finalizing = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def chunk_range(self, index):
+        """Byte offset and length of chunk ``index``."""
+        start = index * self.chunk_size
+        return start, min(self.chunk_size, self.total_size - start)
+
+    def missing(self):
+        received = set(self.received)
+        return [index for index in range(self.chunk_count) if index not in received]
+
+    def __str__(self):
+        return f"{self.filename} ({len(self.received)}/{self.chunk_count} chunks)"
+
+class MediaCleanupTask(models.Model):
+    """
+    A file or directory under ``MEDIA_ROOT``, or an absolute path in the log
+    archive, left behind by a bulk deletion and waiting for
+    ``case_app.deletion.run_cleanup`` to remove it.
+    """
+    path = models.CharField(max_length=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.path
+
 class ActivityLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     case = models.ForeignKey(Case, on_delete=models.CASCADE, null=True, blank=True, related_name="logs")
     action = models.CharField(max_length=255)
     details = models.TextField(blank=True, null=True)  # Additional details for tampering detection
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['case', '-timestamp'], name='activitylog_case_time')]
 
     def __str__(self):
         return f"{self.user.username if self.user else 'Unknown User'} - {self.action} at {self.timestamp}"
 
+class LogArchiveSegment(models.Model):
+    """
+    One gzip member of an activity log archive file (see
+    ``case_app.log_archive``): where it lies in the file, its SHA-256 and
+    the range of archived entries it holds.
+    """
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, null=True, blank=True, related_name="log_segments")
+    month = models.DateField()
+    path = models.CharField(max_length=255)  # relative to ACTIVITY_LOG_ARCHIVE_ROOT
+    offset = models.BigIntegerField()
+    length = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    count = models.PositiveIntegerField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['case', '-last_id'], name='logsegment_case_last')]
+
+    def __str__(self):
+        return f"{self.path} @{self.offset} ({self.count} entries)"
+
 @receiver(post_save, sender=Case)
 def log_case_creation(sender, instance, created, **kwargs):
     if created:
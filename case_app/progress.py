@@ -0,0 +1,172 @@
+"""
+Progress of long-running operations, streamed to the browser.
+
+A page that starts a slow operation (an export, a bulk delete, a comparison)
+sends a random ``progress`` token with the request and opens the server-sent
+events stream of ``case_app.views.progress_stream`` for the same token.  The
+view wraps the operation in ``track(request, name)``; code underneath calls
+the module-level ``stage`` and ``advance``, which publish to the reporter of
+the current request and do nothing when there is none (no token, or a worker
+process).
+
+Each state is stored whole in the case cache under the token, with an
+increasing ``id``.  The stream only ever sends the latest state, so a client
+that reconnects (``EventSource`` resends ``Last-Event-ID``) simply resumes
+from it.  With several server processes the cache must be shared between
+them (``IMAGEGUARD_CACHE=file`` or a memcached/redis backend).
+"""
+import json
+import re
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from . import caching
+
+RUNNING, DONE, FAILED = "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+TOKEN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 2000
+
+_NOOP = nullcontext()
+_current = ContextVar("imageguard_progress", default=None)
+
+
+def _key(token):
+    return f"{caching.PREFIX}:progress:{token}"
+
+
+def get_state(token, user_id):
+    """The latest state published under ``token``, if it belongs to ``user_id``."""
+    state = caching.get_cache().get(_key(token))
+    if state is None or state["user_id"] != user_id:
+        return None
+    return state
+
+
+class ProgressReporter:
+    """
+    Publishes the stage, items done out of the stage's total and an ETA of
+    one operation.  Used as a context manager it becomes the current
+    reporter, and finishes (or fails, on an exception) when the block exits.
+    """
+
+    def __init__(self, token, user_id, operation):
+        self.token = token
+        self.user_id = user_id
+        self.operation = operation
+        self.state = {"id": 0, "user_id": user_id, "operation": operation, "state": RUNNING,
+                      "stage": "", "done": 0, "total": None, "eta_seconds": None, "message": ""}
+        self.stage_started = time.monotonic()
+        self.published_at = 0.0
+
+    def publish(self, force=True):
+        now = time.monotonic()
+        if not force and now - self.published_at < settings.PROGRESS_PUBLISH_INTERVAL:
+            return
+        self.published_at = now
+        # Ids come from the clock so a reused token never goes backwards
+        self.state["id"] = max(self.state["id"] + 1, time.time_ns() // 1000)
+        caching.get_cache().set(_key(self.token), dict(self.state), settings.PROGRESS_TIMEOUT)
+
+    def stage(self, name, total=None):
+        """Start stage ``name`` of ``total`` items (``None`` when unknown)."""
+        self.stage_started = time.monotonic()
+        self.state.update(stage=name, done=0, total=total, eta_seconds=None)
+        self.publish()
+
+    def advance(self, count=1):
+        """Count ``count`` more items done in the current stage."""
+        state = self.state
+        state["done"] += count
+        if state["total"]:
+            elapsed = time.monotonic() - self.stage_started
+            state["eta_seconds"] = round(elapsed / state["done"] * max(state["total"] - state["done"], 0), 1)
+        self.publish(force=False)
+
+    def finish(self, message=""):
+        self.state.update(state=DONE, eta_seconds=0, message=message)
+        self.publish()
+
+    def fail(self, message):
+        self.state.update(state=FAILED, eta_seconds=None, message=message)
+        self.publish()
+
+    def __enter__(self):
+        self._reset = _current.set(self)
+        self.publish()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._reset)
+        if self.state["state"] == RUNNING:
+            if exc_type is None:
+                self.finish()
+            else:
+                self.fail(str(exc) or exc_type.__name__)
+        return False
+
+
+def track(request, operation):
+    """
+    A ``ProgressReporter`` for ``operation`` when the request carries a valid
+    ``progress`` token, otherwise a no-op context manager.
+    """
+    token = request.GET.get("progress") or request.POST.get("progress") or ""
+    if not TOKEN.match(token) or not request.user.is_authenticated:
+        return _NOOP
+    return ProgressReporter(token, request.user.pk, operation)
+
+
+def active():
+    """Whether the current request reports progress, e.g. before counting a stage's total."""
+    return _current.get() is not None
+
+
+def stage(name, total=None):
+    """``ProgressReporter.stage`` on the current reporter, if any."""
+    reporter = _current.get()
+    if reporter is not None:
+        reporter.stage(name, total)
+
+
+def advance(count=1):
+    """``ProgressReporter.advance`` on the current reporter, if any."""
+    reporter = _current.get()
+    if reporter is not None:
+        reporter.advance(count)
+
+
+def event(state):
+    """``state`` as one server-sent event, without the owner."""
+    data = {key: value for key, value in state.items() if key != "user_id"}
+    return f"id: {state['id']}\nevent: progress\ndata: {json.dumps(data)}\n\n"
+
+
+def stream(token, user_id, last_id=0, seconds=None):
+    """
+    Server-sent events for ``token``: every newer state until the operation
+    finishes or ``seconds`` (default ``PROGRESS_STREAM_SECONDS``) pass,
+    with keep-alive comments in between.  The client reconnects after that.
+    """
+    seconds = settings.PROGRESS_STREAM_SECONDS if seconds is None else seconds
+    yield f"retry: {RETRY_MS}\n\n"
+    started = beat = time.monotonic()
+    while True:
+        state = get_state(token, user_id)
+        if state is not None and state["id"] > last_id:
+            last_id = state["id"]
+            beat = time.monotonic()
+            yield event(state)
+        if state is not None and state["state"] in FINISHED:
+            return
+        now = time.monotonic()
+        if now - started >= seconds:
+            return
+        if now - beat >= HEARTBEAT_SECONDS:
+            beat = now
+            yield ": keep-alive\n\n"
+        time.sleep(settings.PROGRESS_POLL_INTERVAL)
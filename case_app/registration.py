@@ -0,0 +1,222 @@
+"""
+Image registration by FFT phase correlation.
+
+A suspect copy that was cropped or re-framed is aligned to the stored image
+before the pixel diff.  Translation is estimated on downscaled grayscale by
+phase correlation against the stored image's spectrum, which is computed once
+per ``Image`` and kept in a bounded cache of its own (``REGISTRATION_CACHE_ALIAS``),
+so a comparison costs one forward and one inverse FFT of the upload (plus a
+small full-resolution refinement).  Scale
+can optionally be estimated first with a log-polar (Fourier-Mellin) step.
+"""
+import numpy as np
+from PIL import Image as PILImage
+from django.conf import settings
+from django.core.cache import caches
+
+from . import engines
+
+WORKING_SIZE = 256
+REFINE_SIZE = 128
+MIN_CONFIDENCE = 0.08
+
+_EPS = 1e-9
+
+
+def _gray(image, scale):
+    gray = image.convert("L")
+    if scale != 1.0:
+        size = (max(int(round(gray.size[0] * scale)), 1), max(int(round(gray.size[1] * scale)), 1))
+        gray = gray.resize(size, PILImage.BILINEAR)
+    array = np.asarray(gray, dtype=np.float32)
+    return array - array.mean()
+
+
+def _pad_to(array, shape):
+    padded = np.zeros(shape, dtype=np.float32)
+    rows, cols = min(array.shape[0], shape[0]), min(array.shape[1], shape[1])
+    padded[:rows, :cols] = array[:rows, :cols]
+    return padded
+
+
+def _correlate(reference_spectrum, moving_spectrum):
+    """
+    Phase-correlate two spectra and return the (dy, dx) shift with
+    sub-pixel refinement plus the normalized peak height as confidence.
+    """
+    cross = reference_spectrum * np.conj(moving_spectrum)
+    cross /= np.abs(cross) + _EPS
+    surface = engines.fft.ifft2(cross).real
+    peak = np.unravel_index(np.argmax(surface), surface.shape)
+
+    shift = []
+    for axis, position in enumerate(peak):
+        size = surface.shape[axis]
+        before = list(peak)
+        after = list(peak)
+        before[axis] = (position - 1) % size
+        after[axis] = (position + 1) % size
+        left, centre, right = surface[tuple(before)], surface[peak], surface[tuple(after)]
+        denominator = left - 2 * centre + right
+        offset = 0.5 * (left - right) / denominator if denominator else 0.0
+        value = position + offset
+        if value > size / 2:
+            value -= size
+        shift.append(value)
+
+    return shift[0], shift[1], float(surface[peak])
+
+
+def _log_polar(spectrum, shape):
+    """Log-polar resampling of a high-passed, centred magnitude spectrum."""
+    magnitude = engines.fft.fftshift(np.abs(spectrum))
+    rows, cols = magnitude.shape
+    y = np.cos(np.pi * (np.arange(rows) / rows - 0.5))
+    x = np.cos(np.pi * (np.arange(cols) / cols - 0.5))
+    magnitude *= 1.0 - np.outer(y, x)  # suppress the low frequencies
+
+    angles, radii = shape
+    centre = np.array([rows // 2, cols // 2], dtype=np.float32)
+    max_radius = min(rows, cols) / 2
+    log_base = np.exp(np.log(max_radius) / radii)
+    theta = np.linspace(0, np.pi, angles, endpoint=False)
+    radius = log_base ** np.arange(radii)
+    coords = np.stack([
+        centre[0] + np.outer(np.sin(theta), radius),
+        centre[1] + np.outer(np.cos(theta), radius),
+    ])
+    return engines.ndimage.map_coordinates(magnitude, coords, order=1).astype(np.float32), log_base
+
+
+def build_reference(image, working_size=WORKING_SIZE):
+    """
+    Precompute what registration needs from the stored image: the working
+    scale and the FFT of its downscaled grayscale.
+    """
+    scale = min(1.0, working_size / max(image.size))
+    gray = _gray(image, scale)
+    return {
+        "size": image.size,
+        "scale": scale,
+        "spectrum": engines.fft.fft2(gray).astype(np.complex64),
+    }
+
+
+def get_reference_cache():
+    return caches[settings.REGISTRATION_CACHE_ALIAS]
+
+
+def reference_key(stored_image, working_size=WORKING_SIZE):
+    """Cache key of a stored ``Image``'s reference, specific to its file."""
+    return f"registration:{stored_image.pk}:{stored_image.image.name}:{working_size}"
+
+
+def reference_for(stored_image, pil_image=None, working_size=WORKING_SIZE):
+    """
+    Return the registration reference for a stored ``Image``, computing it
+    on first use and caching it per image and file.
+    """
+    key = reference_key(stored_image, working_size)
+    reference_cache = get_reference_cache()
+    reference = reference_cache.get(key)
+    if reference is None:
+        if pil_image is None:
+            pil_image = PILImage.open(stored_image.image.path)
+        reference = build_reference(pil_image, working_size)
+        reference_cache.set(key, reference)
+    return reference
+
+
+def estimate_scale(reference, moving):
+    """
+    Estimate the scale of ``moving`` relative to the stored image from the
+    log-polar magnitude spectra.  Costs two extra forward FFTs and one inverse.
+    """
+    spectrum = reference["spectrum"]
+    moving_gray = _pad_to(_gray(moving, reference["scale"]), spectrum.shape)
+    shape = (spectrum.shape[0], spectrum.shape[1])
+
+    reference_polar, log_base = _log_polar(spectrum, shape)
+    moving_polar, _ = _log_polar(engines.fft.fft2(moving_gray), shape)
+    _, radial_shift, _ = _correlate(engines.fft.fft2(reference_polar), engines.fft.fft2(moving_polar))
+    return float(log_base ** radial_shift)
+
+
+def estimate_alignment(reference, moving, with_scale=False):
+    """
+    Estimate how ``moving`` (a PIL image) sits on the stored image.
+
+    Returns a dict with ``dx``/``dy`` (position of the moving image's origin
+    in stored-image pixels), ``scale`` (moving / stored) and ``confidence``,
+    or ``None`` when no reliable alignment was found.
+    """
+    scale = 1.0
+    if with_scale:
+        scale = estimate_scale(reference, moving)
+        if not 0.25 <= scale <= 4.0:
+            return None
+        if abs(scale - 1.0) > 0.01:
+            size = (max(int(round(moving.size[0] / scale)), 1), max(int(round(moving.size[1] / scale)), 1))
+            moving = moving.resize(size, PILImage.BILINEAR)
+
+    spectrum = reference["spectrum"]
+    moving_gray = _pad_to(_gray(moving, reference["scale"]), spectrum.shape)
+    dy, dx, confidence = _correlate(spectrum, engines.fft.fft2(moving_gray))
+    if confidence < MIN_CONFIDENCE:
+        return None
+
+    return {
+        "dx": float(dx / reference["scale"]),
+        "dy": float(dy / reference["scale"]),
+        "scale": scale,
+        "confidence": confidence,
+    }
+
+
+def _refine(stored, moving, dx, dy):
+    """
+    Correct the residual error of the coarse estimate with a phase
+    correlation of a small full-resolution patch from the overlap.
+    """
+    x0, y0 = max(0, dx), max(0, dy)
+    x1 = min(stored.size[0], moving.size[0] + dx)
+    y1 = min(stored.size[1], moving.size[1] + dy)
+    if x1 - x0 < REFINE_SIZE or y1 - y0 < REFINE_SIZE:
+        return dx, dy
+
+    cx, cy = (x0 + x1 - REFINE_SIZE) // 2, (y0 + y1 - REFINE_SIZE) // 2
+    box = (cx, cy, cx + REFINE_SIZE, cy + REFINE_SIZE)
+    stored_patch = _gray(stored.crop(box), 1.0)
+    moving_patch = _gray(moving.crop((box[0] - dx, box[1] - dy, box[2] - dx, box[3] - dy)), 1.0)
+    window = np.outer(np.hanning(REFINE_SIZE), np.hanning(REFINE_SIZE)).astype(np.float32)
+    ry, rx, _ = _correlate(engines.fft.fft2(stored_patch * window), engines.fft.fft2(moving_patch * window))
+    return dx + int(round(rx)), dy + int(round(ry))
+
+
+def align_images(stored, moving, alignment):
+    """
+    Crop both PIL images to their overlapping region according to
+    ``alignment`` so they can be diffed pixel for pixel, storing the refined
+    offset back into ``alignment``.  Without an alignment the moving image
+    is resized to the stored image's size.
+    """
+    if alignment is None:
+        return stored, moving.resize(stored.size)
+
+    if abs(alignment["scale"] - 1.0) > 0.01:
+        size = (max(int(round(moving.size[0] / alignment["scale"])), 1),
+                max(int(round(moving.size[1] / alignment["scale"])), 1))
+        moving = moving.resize(size, PILImage.BILINEAR)
+
+    dx, dy = _refine(stored, moving, int(round(alignment["dx"])), int(round(alignment["dy"])))
+    alignment["dx"], alignment["dy"] = dx, dy
+
+    x0, y0 = max(0, dx), max(0, dy)
+    x1 = min(stored.size[0], moving.size[0] + dx)
+    y1 = min(stored.size[1], moving.size[1] + dy)
+    if x1 <= x0 or y1 <= y0:
+        return stored, moving.resize(stored.size)
+
+    stored_box = (x0, y0, x1, y1)
+    moving_box = (x0 - dx, y0 - dy, x1 - dx, y1 - dy)
+    return stored.crop(stored_box), moving.crop(moving_box)
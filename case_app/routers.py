@@ -0,0 +1,110 @@
+"""
+Read replica routing.
+
+Views decorated with ``replica_reads`` (case lists and details, logs, exports
+and similarity lookups) read from ``settings.REPLICA_DATABASE`` when one is
+configured.  Writes, reads anywhere else and reads later in a request that
+has already written all go to the primary.  Because replicas lag,
+``PrimaryPinMiddleware`` answers a request that wrote with a short-lived
+cookie, and a client presenting it reads from the primary for
+``REPLICA_PIN_SECONDS``, so people see their own changes.
+"""
+import contextvars
+import functools
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "imageguard_primary"
+
+_replica_allowed = contextvars.ContextVar("replica_allowed", default=False)
+_request_state = contextvars.ContextVar("db_request_state", default=None)
+
+
+class _RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_reads(view):
+    """Let ``view`` read from the replica."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _replica_allowed.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_allowed.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Route reads of ``replica_reads`` views to the replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if not settings.REPLICA_DATABASE or not _replica_allowed.get():
+            return None
+        state = _request_state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return None
+        return settings.REPLICA_DATABASE
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        if db == settings.REPLICA_DATABASE:
+            return False
+        return None
+
+
+class PrimaryPinMiddleware:
+    """
+    Pin clients to the primary for ``REPLICA_PIN_SECONDS`` after a request of
+    theirs writes.  Must come before ``SessionMiddleware`` so that session
+    saves count as writes.  Runs natively under both WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = _RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        # ORM calls made through sync_to_async copy this context, so they see the state
+        state = _RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.pin(state, response)
+
+    def pin(self, state, response):
+        if state.wrote and settings.REPLICA_DATABASE:
+            response.set_cookie(PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax")
+        return response
@@ -1,6 +1,8 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, post_init
 from django.dispatch import receiver
-from .models import Case, Image, ActivityLog
+from .models import Case, Image, ActivityLog, ImageMetadata
+from django.db import transaction
+from . import caching, clustering, stats, transcoding
 
 # Log case creation
 @receiver(post_save, sender=Case)
@@ -30,3 +32,57 @@ def log_image_deletion(sender, instance, **kwargs):
         action=f"Deleted image from case: {instance.case.name}",
         case=instance.case,
     )
+
+# Cache invalidation: bump the versions of every cached page that shows the
+# changed object (see case_app.caching)
+@receiver(post_init, sender=Case)
+def remember_case_investigator(sender, instance, **kwargs):
+    # Read from __dict__ so deferred loads never trigger a query here
+    instance._cached_investigator_id = instance.__dict__.get('investigator_id')
+
+@receiver(post_save, sender=Case)
+@receiver(post_delete, sender=Case)
+def invalidate_case_cache(sender, instance, **kwargs):
+    caching.bump_version(caching.details_namespace(instance.pk))
+    caching.bump_version(caching.list_namespace('all'))
+    investigators = {instance.investigator_id, getattr(instance, '_cached_investigator_id', None)}
+    for investigator_id in investigators - {None}:
+        caching.bump_version(caching.list_namespace(f'user:{investigator_id}'))
+    instance._cached_investigator_id = instance.investigator_id
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def invalidate_image_cache(sender, instance, **kwargs):
+    caching.bump_version(caching.details_namespace(instance.case_id))
+    caching.bump_version(caching.images_namespace())
+
+# Denormalized case statistics (see case_app.stats)
+@receiver(post_save, sender=Image)
+def count_image(sender, instance, created, **kwargs):
+    if created:
+        stats.image_added(instance)
+
+@receiver(post_delete, sender=Image)
+def uncount_image(sender, instance, **kwargs):
+    stats.image_removed(instance)
+
+@receiver(post_save, sender=ImageMetadata)
+@receiver(post_delete, sender=ImageMetadata)
+def invalidate_metadata_cache(sender, instance, **kwargs):
+    caching.bump_version(caching.images_namespace())
+
+@receiver(post_save, sender=Image)
+def index_image_hashes(sender, instance, created, **kwargs):
+    if created:
+        clustering.index_image(instance)
+
+@receiver(post_delete, sender=Image)
+def delete_image_renditions(sender, instance, **kwargs):
+    case_id, image_id = instance.case_id, instance.pk  # pk is cleared after deletion
+    transaction.on_commit(lambda: transcoding.delete_renditions(case_id, image_id))
+
+@receiver(post_save, sender=ActivityLog)
+@receiver(post_delete, sender=ActivityLog)
+def invalidate_log_cache(sender, instance, **kwargs):
+    if instance.case_id:
+        caching.bump_version(caching.logs_namespace(instance.case_id))
@@ -0,0 +1,134 @@
+"""
+Structural similarity (SSIM and multi-scale SSIM) of aligned images.
+
+Local means, variances and the covariance are computed with separable
+``scipy.ndimage`` filters in float32.  The default box window uses
+``uniform_filter``, whose running sums cost the same per pixel whatever the
+window size, so SSIM is O(pixels).  The Gaussian window of the original paper
+is also available, at a cost that grows with ``sigma``.  Nothing here touches
+the database.
+"""
+import math
+
+import numpy as np
+from PIL import Image as PILImage
+
+from . import engines
+
+PHASH = "phash"
+SSIM = "ssim"
+MS_SSIM = "ms_ssim"
+
+METRIC_CHOICES = [
+    (PHASH, "Perceptual hash distance"),
+    (SSIM, "SSIM (structural similarity)"),
+    (MS_SSIM, "Multi-scale SSIM"),
+]
+
+WINDOW = 7
+SIGMA = 1.5
+DATA_RANGE = 255.0
+MAP_SIZE = 256
+# Scale weights from Wang, Simoncelli and Bovik, "Multi-scale structural similarity"
+MS_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+
+def to_gray(img):
+    """A PIL image as a float32 luminance array."""
+    return np.asarray(img.convert("L"), dtype=np.float32)
+
+
+def _filter(window, gaussian):
+    if gaussian:
+        return lambda values: engines.ndimage.gaussian_filter(values, SIGMA, truncate=3.5, mode="reflect")
+    return lambda values: engines.ndimage.uniform_filter(values, window, mode="reflect")
+
+
+def _components(x, y, window, gaussian):
+    """Luminance and contrast-structure maps of two float32 arrays."""
+    blur = _filter(window, gaussian)
+    c1 = (0.01 * DATA_RANGE) ** 2
+    c2 = (0.03 * DATA_RANGE) ** 2
+    mu_x, mu_y = blur(x), blur(y)
+    mu_xx, mu_yy, mu_xy = mu_x * mu_x, mu_y * mu_y, mu_x * mu_y
+    var_x = blur(x * x) - mu_xx
+    var_y = blur(y * y) - mu_yy
+    cov = blur(x * y) - mu_xy
+    luminance = (2 * mu_xy + c1) / (mu_xx + mu_yy + c1)
+    contrast_structure = (2 * cov + c2) / (var_x + var_y + c2)
+    return luminance, contrast_structure
+
+
+def _valid(values, window):
+    # Window positions that overlap the reflected border are left out of means
+    pad = window // 2
+    if min(values.shape) <= 2 * pad:
+        return values
+    return values[pad:-pad, pad:-pad]
+
+
+def ssim(x, y, window=WINDOW, gaussian=False):
+    """Mean SSIM of two equally sized float32 arrays and the per-pixel SSIM map."""
+    luminance, contrast_structure = _components(x, y, window, gaussian)
+    ssim_map = luminance * contrast_structure
+    return float(_valid(ssim_map, window).mean()), ssim_map
+
+
+def _halve(values):
+    height, width = values.shape[0] // 2 * 2, values.shape[1] // 2 * 2
+    return values[:height, :width].reshape(height // 2, 2, width // 2, 2).mean(axis=(1, 3))
+
+
+def ms_ssim(x, y, window=WINDOW, gaussian=False):
+    """
+    Multi-scale SSIM of two equally sized float32 arrays and the SSIM map at
+    full resolution.  Images too small for five scales use fewer, with the
+    weights renormalized.
+    """
+    levels = max(1, min(len(MS_WEIGHTS), int(math.log2(min(x.shape) / window)) + 1))
+    weights = np.array(MS_WEIGHTS[:levels], dtype=np.float64)
+    weights /= weights.sum()
+
+    score, ssim_map = 1.0, None
+    for level in range(levels):
+        luminance, contrast_structure = _components(x, y, window, gaussian)
+        if ssim_map is None:
+            ssim_map = luminance * contrast_structure
+        if level == levels - 1:
+            value = _valid(luminance * contrast_structure, window).mean()
+        else:
+            value = _valid(contrast_structure, window).mean()
+            x, y = _halve(x), _halve(y)
+        score *= max(float(value), 0.0) ** weights[level]
+    return score, ssim_map
+
+
+def local_map(ssim_map, size=MAP_SIZE):
+    """The SSIM map averaged over blocks so its longer side is at most ``size``."""
+    block = max(1, math.ceil(max(ssim_map.shape) / size))
+    height, width = ssim_map.shape[0] // block * block, ssim_map.shape[1] // block * block
+    if not height or not width:
+        return ssim_map
+    return ssim_map[:height, :width].reshape(height // block, block, width // block, block).mean(axis=(1, 3))
+
+
+def map_image(values):
+    """Render a local SSIM map: white where the images agree, red where they differ."""
+    level = (np.clip(values, 0.0, 1.0) * 255).astype(np.uint8)
+    rgb = np.stack([np.full_like(level, 255), level, level], axis=-1)
+    return PILImage.fromarray(rgb, "RGB")
+
+
+def compare(stored, uploaded, metric, window=WINDOW, gaussian=False):
+    """
+    Score two aligned PIL images with ``metric`` (``SSIM`` or ``MS_SSIM``).
+    Returns the score and the downsampled local SSIM map.
+    """
+    x, y = to_gray(stored), to_gray(uploaded)
+    if metric == MS_SSIM:
+        score, ssim_map = ms_ssim(x, y, window, gaussian)
+    elif metric == SSIM:
+        score, ssim_map = ssim(x, y, window, gaussian)
+    else:
+        raise ValueError(f"Not a structural similarity metric: {metric}")
+    return score, local_map(ssim_map)
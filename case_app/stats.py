@@ -0,0 +1,167 @@
+"""
+Denormalized per-case statistics.
+
+``Case`` stores its image count, total stored bytes, last upload, last
+tampering detection, number of detections that found tampering and the time
+of its last activity, so the case list can show and sort by them without
+aggregating ``Image`` and ``ActivityLog`` for every row.
+
+The counters only ever move through single ``UPDATE`` statements built from
+``F()`` expressions, from the ``Image`` signal receivers and
+``record_detection``, so concurrent uploads never lose an increment.
+``reconcile`` recomputes them from the source rows (and the log archive) and
+repairs the cases that drifted; ``manage.py reconcile_case_stats`` runs it.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import caching
+from .log_archive import entry, read_segment
+from .models import ActivityLog, Case, Image, LogArchiveSegment
+
+BATCH_SIZE = 1000
+DETECTION_ACTION = "Tampering Detection Performed"
+TAMPERED_MARKER = "Status: Tampered"
+
+
+def _latest(field, moment):
+    # Greatest() is NULL when an argument is, so start from the moment itself
+    return Greatest(Coalesce(F(field), Value(moment)), Value(moment))
+
+
+def _update(case, **changes):
+    Case.objects.filter(pk=case.pk).update(**changes)
+    # The list shows the counters; its entries are cached per permission scope
+    caching.bump_version(caching.list_namespace("all"))
+    if case.investigator_id:
+        caching.bump_version(caching.list_namespace(f"user:{case.investigator_id}"))
+
+
+def image_added(image):
+    """Count a newly saved ``image`` in its case."""
+    now = timezone.now()
+    _update(
+        image.case, image_count=F("image_count") + 1, total_bytes=F("total_bytes") + (image.file_size or 0),
+        last_upload_at=_latest("last_upload_at", now), last_activity_at=_latest("last_activity_at", now),
+    )
+
+
+def image_removed(image):
+    """Remove a deleted ``image`` from its case's counts."""
+    # Deferred sizes cannot be loaded once the row is gone; reconcile repairs them
+    size = image.__dict__.get("file_size") or 0
+    _update(
+        image.case, image_count=Greatest(F("image_count") - 1, Value(0)),
+        total_bytes=Greatest(F("total_bytes") - size, Value(0)),
+    )
+
+
+def record_detection(case, tampered):
+    """Count a tampering detection run against an image of ``case``."""
+    now = timezone.now()
+    changes = {
+        "last_detection_at": _latest("last_detection_at", now),
+        "last_activity_at": _latest("last_activity_at", now),
+    }
+    if tampered:
+        changes["tampered_count"] = F("tampered_count") + 1
+    _update(case, **changes)
+
+
+def _archived_detections(case_ids):
+    """``case_id -> (last timestamp, tampered count)`` of detections in the log archive."""
+    found = {}
+    for segment in LogArchiveSegment.objects.filter(case_id__in=case_ids).order_by("id"):
+        for record in read_segment(segment):
+            if record["action"] != DETECTION_ACTION:
+                continue
+            log = entry(record)
+            last, tampered = found.get(segment.case_id, (None, 0))
+            found[segment.case_id] = (
+                max(filter(None, [last, log.timestamp])), tampered + (TAMPERED_MARKER in log.details),
+            )
+    return found
+
+
+def expected(cases):
+    """Statistics of ``cases`` recomputed from images, the activity log and its archive, by case id."""
+    ids = [case.pk for case in cases]
+    images = {row["case_id"]: row for row in Image.objects.filter(case_id__in=ids).values("case_id").annotate(
+        count=Count("id"), bytes=Sum("file_size"), last=Max("uploaded_at"))}
+    detections = {row["case_id"]: row for row in ActivityLog.objects.filter(
+        case_id__in=ids, action=DETECTION_ACTION).values("case_id").annotate(
+        last=Max("timestamp"), tampered=Count("id", filter=Q(details__contains=TAMPERED_MARKER)))}
+    archived = _archived_detections(ids)
+
+    result = {}
+    for case in cases:
+        image, detection = images.get(case.pk, {}), detections.get(case.pk, {})
+        archived_last, archived_tampered = archived.get(case.pk, (None, 0))
+        last_detection = max(filter(None, [detection.get("last"), archived_last]), default=None)
+        stats = {
+            "image_count": image.get("count", 0),
+            "total_bytes": image.get("bytes") or 0,
+            "last_upload_at": image.get("last"),
+            "last_detection_at": last_detection,
+            "tampered_count": detection.get("tampered", 0) + archived_tampered,
+        }
+        stats["last_activity_at"] = max(filter(None, [case.created_at, stats["last_upload_at"], last_detection]))
+        result[case.pk] = stats
+    return result
+
+
+def fill_file_sizes(batch_size=BATCH_SIZE):
+    """Record the stored size of images saved before sizes were tracked; returns how many were filled."""
+    filled, last = 0, 0
+    while True:
+        missing = Image.objects.filter(file_size__isnull=True, pk__gt=last).order_by("pk").only("pk", "image")
+        batch = list(missing[:batch_size])
+        if not batch:
+            return filled
+        for image in batch:
+            try:
+                image.file_size = image.image.size
+            except OSError:
+                image.file_size = 0  # missing files; gc_media reports those
+        Image.objects.bulk_update(batch, ["file_size"])
+        filled += len(batch)
+        last = batch[-1].pk
+
+
+def reconcile(case_ids=None, batch_size=BATCH_SIZE, dry_run=False, log=None):
+    """
+    Recompute the statistics of every case (or ``case_ids``) in batches and
+    write the ones that drifted.  Returns ``(cases checked, cases repaired)``.
+    """
+    cases = Case.objects.order_by("pk").only("pk", "created_at", "investigator_id", *Case.STATISTICS)
+    if case_ids is not None:
+        cases = cases.filter(pk__in=case_ids)
+    checked = repaired = 0
+    last = 0
+    while True:
+        with transaction.atomic():
+            # Locked, so no F() update lands between reading and writing a case
+            batch = list(cases.filter(pk__gt=last).select_for_update()[:batch_size])
+            if not batch:
+                break
+            drifted = []
+            fresh = expected(batch)
+            for case in batch:
+                stats = fresh[case.pk]
+                if any(getattr(case, field) != value for field, value in stats.items()):
+                    for field, value in stats.items():
+                        setattr(case, field, value)
+                    drifted.append(case)
+            if drifted and not dry_run:
+                Case.objects.bulk_update(drifted, Case.STATISTICS)
+                caching.bump_version(caching.list_namespace("all"))
+                for investigator_id in {case.investigator_id for case in drifted} - {None}:
+                    caching.bump_version(caching.list_namespace(f"user:{investigator_id}"))
+        checked += len(batch)
+        repaired += len(drifted)
+        last = batch[-1].pk
+        if log:
+            log(f"Checked {checked} cases, {repaired} drifted.")
+    return checked, repaired
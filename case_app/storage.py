@@ -0,0 +1,86 @@
+"""
+Layout of stored image files under ``MEDIA_ROOT``.
+
+Images live under ``cases/<case_id>/``.  With ``MEDIA_LAYOUT = "flat"`` every
+file of a case sits directly in that directory; with ``"sharded"`` (the
+default) files fan out over ``MEDIA_SHARD_LEVELS`` levels of
+``MEDIA_SHARD_WIDTH`` hex characters taken from the random file name, e.g.
+``cases/12/3f/a9/3fa9....png``, so no directory grows past a few hundred
+entries.  Keeping the case prefix lets case deletion and ``gc_media`` treat a
+case's files as one tree.  The ``shard_media`` command moves files stored
+under another layout.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import uuid
+
+from django.conf import settings
+
+FLAT = "flat"
+SHARDED = "sharded"
+
+_HEX_NAME = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _shards(basename):
+    stem = os.path.splitext(basename)[0]
+    # Generated names are random hex; hash anything else so it spreads evenly
+    key = stem if _HEX_NAME.match(stem) else hashlib.sha256(basename.encode()).hexdigest()
+    width = settings.MEDIA_SHARD_WIDTH
+    return [key[level * width:(level + 1) * width] for level in range(settings.MEDIA_SHARD_LEVELS)]
+
+
+def layout_name(case_id, basename, layout=None):
+    """Storage name of the file ``basename`` of case ``case_id`` in ``layout``."""
+    layout = layout or settings.MEDIA_LAYOUT
+    if layout == FLAT:
+        return posixpath.join("cases", str(case_id), basename)
+    if layout == SHARDED:
+        return posixpath.join("cases", str(case_id), *_shards(basename), basename)
+    raise ValueError(f"Unknown media layout: {layout}")
+
+
+def image_name(case_id, filename):
+    """A new, unique storage name for an upload called ``filename``."""
+    ext = filename.split('.')[-1]
+    return layout_name(case_id, f"{uuid.uuid4().hex}.{ext}")
+
+
+def relocated_name(name, case_id, layout=None):
+    """Where the stored file ``name`` belongs in ``layout``; equal to ``name`` when it is in place."""
+    return layout_name(case_id, posixpath.basename(name), layout)
+
+
+def link_into_place(name, target):
+    """
+    Make the stored file ``name`` also available as ``target`` without
+    changing the original's contents: a hard link when possible, else a copy
+    renamed into place.  A ``target`` left by an interrupted run is reused.
+    Its modification time is set to now (a hard link shares it with
+    ``name``), so ``gc_media``'s grace period covers the new name until the
+    row is repointed to it.
+    """
+    source = os.path.join(settings.MEDIA_ROOT, name)
+    destination = os.path.join(settings.MEDIA_ROOT, target)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        if not os.path.samefile(source, destination):
+            raise
+    except OSError:
+        # Different filesystems or no hard link support
+        partial = f"{destination}.partial"
+        shutil.copy2(source, partial)
+        os.replace(partial, destination)
+    os.utime(destination)
+
+
+def remove_stored(name):
+    try:
+        os.remove(os.path.join(settings.MEDIA_ROOT, name))
+    except FileNotFoundError:
+        pass
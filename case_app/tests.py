@@ -1,7 +1,43 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
+import numpy as np
+from PIL import Image as PILImage
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.test import LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import Case, Image, ActivityLog
+from django.http import HttpResponse
+from django.core.management import call_command
+from django.utils import timezone
+from .models import (
+    Case, Image, ActivityLog, HashIndex, ImageFrame, ImageIntegrity, ImageMetadata, LogArchiveSegment, MediaCleanupTask,
+    UploadSession,
+)
+from benchmarks import loadtest
+from .copy_move import detect_copy_move
+from .registration import build_reference, estimate_alignment, align_images, get_reference_cache, reference_key
+from . import admin as admin_module
+from . import (
+    analysis, clustering, deletion, engines, instrumentation, log_archive, media, media_gc, metadata, progress, routers,
+    similarity, stats, storage, transcoding, uploads, verification, workers,
+)
 
 User = get_user_model()
 
@@ -79,3 +115,1547 @@ class CaseAppTests(TestCase):
         })
         self.assertEqual(response.status_code, 302)  # Should redirect to login
         self.assertFalse(Case.objects.filter(name="Unauthenticated Test Case").exists())
+
+
+class CopyMoveTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 256, (256, 256, 3), dtype=np.uint8)
+
+    def test_detects_cloned_region(self):
+        """
+        Test that a region copied elsewhere in the image is reported with its shift.
+        """
+        pixels = self.pixels.copy()
+        pixels[150:182, 160:192] = pixels[20:52, 30:62]
+        regions = detect_copy_move(PILImage.fromarray(pixels))
+        self.assertEqual(len(regions), 1)
+        self.assertEqual(regions[0]["source"], (30, 20, 62, 52))
+        self.assertEqual(regions[0]["target"], (160, 150, 192, 182))
+        self.assertEqual(regions[0]["shift"], (130, 130))
+
+    def test_untouched_image_has_no_regions(self):
+        """
+        Test that an image without cloned regions produces no matches.
+        """
+        self.assertEqual(detect_copy_move(PILImage.fromarray(self.pixels)), [])
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        base = rng.integers(0, 256, (150, 200, 3), dtype=np.uint8)
+        self.stored = PILImage.fromarray(base).resize((800, 600), PILImage.BICUBIC)
+        self.reference = build_reference(self.stored)
+
+    def test_cropped_copy_is_aligned(self):
+        """
+        Test that a re-framed copy is registered and diffs as identical.
+        """
+        cropped = self.stored.crop((13, 7, 780, 590))
+        alignment = estimate_alignment(self.reference, cropped)
+        stored, uploaded = align_images(self.stored, cropped, alignment)
+        self.assertEqual((alignment["dx"], alignment["dy"]), (13, 7))
+        self.assertEqual(stored.size, uploaded.size)
+        self.assertEqual(list(stored.getdata()), list(uploaded.getdata()))
+
+    def test_unrelated_image_is_not_aligned(self):
+        """
+        Test that an unrelated image yields no alignment.
+        """
+        rng = np.random.default_rng(2)
+        other = PILImage.fromarray(rng.integers(0, 256, (600, 800, 3), dtype=np.uint8))
+        self.assertIsNone(estimate_alignment(self.reference, other))
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        instrumentation.stage_seconds.reset()
+        cache.clear()
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    def test_server_timing_header_and_metrics(self):
+        """
+        Test that enabled instrumentation emits Server-Timing and stage histograms.
+        """
+        response = self.client.get("/cases/")
+        self.assertIn("render;dur=", response["Server-Timing"])
+        self.assertRegex(response["Server-Timing"], r'db;dur=[0-9.]+;desc="\d+ queries"')
+
+        metrics = self.client.get("/metrics/")
+        self.assertEqual(metrics.status_code, 200)
+        self.assertIn('imageguard_stage_seconds_count{stage="render"} 1', metrics.content.decode())
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    async def test_asgi_middleware_chain_stays_async(self):
+        """
+        Test that under ASGI the middleware chain is not moved onto a thread and still times queries.
+        """
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain, SyncToAsync)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get("/cases/")
+        self.assertRegex(response["Server-Timing"], r'db;dur=[0-9.]+;desc="[1-9]\d* queries"')
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled_instrumentation_is_silent(self):
+        """
+        Test that nothing is recorded or exposed while instrumentation is off.
+        """
+        response = self.client.get("/cases/")
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(self.client.get("/metrics/").status_code, 404)
+        self.assertEqual(instrumentation.stage_seconds.histograms, {})
+
+
+class TemporaryMediaMixin:
+    """Store the class's media under its own temporary MEDIA_ROOT, removed once the class has run."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp(prefix="imageguard-tests-")
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+        super().setUpClass()
+
+
+def make_png(pixels, name="evidence.png"):
+    """A PNG upload of ``pixels``."""
+    buffer = io.BytesIO()
+    PILImage.fromarray(pixels).save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+def make_image_file(name="evidence.png", seed=0, size=(64, 48)):
+    """A small, valid PNG upload with seeded random content."""
+    rng = np.random.default_rng(seed)
+    return make_png(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8), name)
+
+
+class CachingTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Cached Case", investigator=self.user)
+
+    def test_case_details_served_from_cache(self):
+        """
+        Test that a repeated case details request does not query cases or images.
+        """
+        self.client.get(f"/cases/{self.case.id}/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/cases/{self.case.id}/")
+        self.assertContains(response, "Cached Case")
+        tables = " ".join(query["sql"] for query in queries.captured_queries)
+        self.assertNotIn("case_app_image", tables)
+        self.assertNotIn("case_app_case", tables)
+
+    def test_image_upload_invalidates_case_details(self):
+        """
+        Test that saving an image bumps the case version and refreshes the page.
+        """
+        response = self.client.get(f"/cases/{self.case.id}/")
+        self.assertContains(response, "No images uploaded")
+        Image.objects.create(case=self.case, image=make_image_file())
+        response = self.client.get(f"/cases/{self.case.id}/")
+        self.assertNotContains(response, "No images uploaded")
+
+    def test_case_list_scoped_per_user(self):
+        """
+        Test that cached case lists are not shared between permission scopes.
+        """
+        other = User.objects.create_user(username="otheruser", password="otherpassword")
+        Case.objects.create(name="Other Case", investigator=other)
+        self.assertNotContains(self.client.get("/cases/"), "Other Case")
+        self.client.login(username="otheruser", password="otherpassword")
+        self.assertContains(self.client.get("/cases/"), "Other Case")
+
+
+@override_settings(IMAGE_POOL_WORKERS=1)
+class AsyncViewTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Async Case", investigator=self.user, tampering_threshold=5)
+
+    def tearDown(self):
+        workers.shutdown()
+
+    def test_async_upload_creates_image(self):
+        """
+        Test that the async upload view stores the image processed in the pool.
+        """
+        response = self.client.post(f"/cases/{self.case.id}/upload/async/", {"image": make_image_file()})
+        self.assertEqual(response.status_code, 302)
+        image = Image.objects.get(case=self.case)
+        self.assertEqual(len(image.sha256_hash), 64)
+        self.assertTrue(image.perceptual_hash)
+
+    def test_async_detection_reports_results(self):
+        """
+        Test that the async detection view renders the comparison results.
+        """
+        image = Image.objects.create(case=self.case, image=make_image_file())
+        response = self.client.post(f"/cases/image/{image.id}/detect/async/",
+                                    {"uploaded_image": make_image_file("suspect.png", seed=1)})
+        self.assertContains(response, "Analysis Results")
+        self.assertEqual(ActivityLog.objects.filter(case=self.case, action="Tampering Detection Performed").count(), 1)
+
+    def test_registration_reference_cached_separately(self):
+        """
+        Test that detection keeps the stored image's spectrum in the bounded registration cache, not the page cache.
+        """
+        image = Image.objects.create(case=self.case, image=make_image_file())
+        self.client.post(f"/cases/image/{image.id}/detect/", {"uploaded_image": make_image_file("suspect.png", seed=1)})
+        key = reference_key(image, settings.REGISTRATION_WORKING_SIZE)
+        self.assertIsNotNone(get_reference_cache().get(key))
+        self.assertIsNone(cache.get(key))
+
+    def test_copy_move_runs_in_pool_for_investigator(self):
+        """
+        Test that copy-move analysis renders its overlay for the investigator and refuses other users.
+        """
+        image = Image.objects.create(case=self.case, image=make_image_file())
+        response = self.client.get(f"/cases/image/{image.id}/copy-move/")
+        self.assertContains(response, "Analysis Results")
+        self.assertEqual(self.client.get(response.context["overlay_url"]).status_code, 200)
+        self.assertTrue(ActivityLog.objects.filter(case=self.case, action="Copy-Move Detection Performed").exists())
+
+        User.objects.create_user(username="otheruser", password="otherpassword")
+        self.client.login(username="otheruser", password="otherpassword")
+        self.assertEqual(self.client.get(f"/cases/image/{image.id}/copy-move/").status_code, 403)
+
+    def test_saturated_pool_answers_429(self):
+        """
+        Test that a full pool queue is answered with 429 and Retry-After.
+        """
+        workers.get_executor()
+        slots = workers._slots
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        try:
+            response = self.client.post(f"/cases/{self.case.id}/upload/async/", {"image": make_image_file()})
+        finally:
+            for _ in range(taken):
+                slots.release()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertFalse(Image.objects.filter(case=self.case).exists())
+
+
+class ChunkedUploadTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Chunked Case", investigator=self.user)
+        self.data = make_image_file(size=(256, 192)).read()
+        response = self.client.post(f"/cases/{self.case.id}/uploads/", {
+            "filename": "large.png", "size": len(self.data), "chunk_size": 4096,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.session = response.json()
+
+    def put_chunk(self, index, data=None):
+        if data is None:
+            start = index * 4096
+            data = self.data[start:start + 4096]
+        return self.client.put(f"{self.session['status_url']}chunks/{index}/", data,
+                               content_type="application/octet-stream")
+
+    def test_out_of_order_chunks_produce_image(self):
+        """
+        Test that chunks sent in any order are assembled, hashed and ingested.
+        """
+        for index in reversed(range(self.session["chunk_count"])):
+            self.assertEqual(self.put_chunk(index).status_code, 200)
+        response = self.client.post(self.session["complete_url"])
+        self.assertEqual(response.status_code, 200)
+        image = Image.objects.get(id=response.json()["image_id"])
+        self.assertEqual(image.case, self.case)
+        self.assertEqual(image.sha256_hash, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(image.original_filename, "large.png")
+        self.assertFalse(os.path.exists(uploads.part_path(UploadSession.objects.get(id=self.session["id"]))))
+
+    def test_finalize_processes_outside_transaction(self):
+        """
+        Test that the file is processed after the claim commits, and a claimed session is not finalized twice.
+        """
+        for index in range(self.session["chunk_count"]):
+            self.put_chunk(index)
+        UploadSession.objects.filter(id=self.session["id"]).update(finalizing=True)
+        self.assertEqual(self.client.post(self.session["complete_url"]).status_code, 409)
+        UploadSession.objects.filter(id=self.session["id"]).update(finalizing=False)
+
+        depth = len(connection.savepoint_ids)
+        seen = []
+
+        def process(*args):
+            seen.append((len(connection.savepoint_ids), UploadSession.objects.get(id=self.session["id"]).finalizing))
+            return analysis.process_upload(*args)
+
+        with mock.patch("case_app.views.process_upload", side_effect=process):
+            response = self.client.post(self.session["complete_url"])
+        self.assertEqual(seen, [(depth, True)])
+        self.assertFalse(response.json()["finalizing"])
+        self.assertIsNotNone(response.json()["image_id"])
+
+    def test_status_lists_missing_chunks_for_resume(self):
+        """
+        Test that an interrupted upload reports its missing chunks and cannot be finalized.
+        """
+        self.put_chunk(0)
+        self.put_chunk(0)  # retrying a chunk is harmless
+        status = self.client.get(self.session["status_url"]).json()
+        self.assertEqual(status["received"], [0])
+        self.assertEqual(status["missing"], list(range(1, self.session["chunk_count"])))
+        self.assertEqual(self.client.post(self.session["complete_url"]).status_code, 409)
+
+    def test_chunk_with_wrong_length_rejected(self):
+        """
+        Test that a truncated chunk is refused and not marked as received.
+        """
+        response = self.put_chunk(0, self.data[:100])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.session["status_url"]).json()["received"], [])
+
+    def test_other_users_cannot_use_session(self):
+        """
+        Test that upload sessions are private to the user who started them.
+        """
+        User.objects.create_user(username="otheruser", password="otherpassword")
+        self.client.login(username="otheruser", password="otherpassword")
+        self.assertEqual(self.put_chunk(0).status_code, 404)
+        response = self.client.post(f"/cases/{self.case.id}/uploads/", {"filename": "x.png", "size": 10})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(UPLOAD_MAX_OPEN_SESSIONS=2)
+    def test_open_sessions_capped_and_expired(self):
+        """
+        Test that a user's open sessions are capped and idle ones expire with their partial files.
+        """
+        start = {"filename": "more.png", "size": 100}
+        self.assertEqual(self.client.post(f"/cases/{self.case.id}/uploads/", start).status_code, 201)
+        self.assertEqual(self.client.post(f"/cases/{self.case.id}/uploads/", start).status_code, 429)
+
+        session = UploadSession.objects.get(id=self.session["id"])
+        self.put_chunk(0)
+        self.assertIn(session.pk, uploads._states)
+        UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(uploads.expire_sessions(), 1)
+        self.assertFalse(UploadSession.objects.filter(pk=session.pk).exists())
+        self.assertFalse(os.path.exists(uploads.part_path(session)))
+        self.assertNotIn(session.pk, uploads._states)
+        self.assertEqual(self.put_chunk(1).status_code, 404)
+        self.assertEqual(self.client.post(f"/cases/{self.case.id}/uploads/", start).status_code, 201)
+
+
+class StorageFormatTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+
+    def store(self, storage_format, **case_fields):
+        case = Case.objects.create(name=f"{storage_format} case", investigator=self.user,
+                                   storage_format=storage_format, **case_fields)
+        upload = make_image_file()
+        data = upload.read()
+        upload.seek(0)
+        return Image.objects.create(case=case, image=upload), data
+
+    def test_original_bytes_kept_verbatim(self):
+        """
+        Test that keep-original cases store the uploaded bytes unchanged.
+        """
+        image, data = self.store("original")
+        with image.image.open("rb") as handle:
+            self.assertEqual(handle.read(), data)
+        self.assertTrue(image.verify_file())
+
+    def test_lossless_png_preserves_pixels(self):
+        """
+        Test that PNG storage changes the container but not the pixels.
+        """
+        image, data = self.store("png")
+        self.assertTrue(image.image.name.endswith(".png"))
+        stored = np.asarray(PILImage.open(image.image.path))
+        self.assertTrue(np.array_equal(stored, np.asarray(PILImage.open(io.BytesIO(data)))))
+
+    def test_jpeg_storage_uses_case_quality(self):
+        """
+        Test that JPEG storage re-encodes the upload, so the file no longer matches its hash.
+        """
+        image, _ = self.store("jpeg", storage_quality=40)
+        self.assertTrue(image.image.name.endswith(".jpg"))
+        self.assertEqual(PILImage.open(image.image.path).format, "JPEG")
+        self.assertFalse(image.verify_file())
+
+    def test_rendition_generated_on_first_access(self):
+        """
+        Test that a thumbnail is transcoded on first request and only served to the case investigator.
+        """
+        image, _ = self.store("original")
+        path = os.path.join(transcoding.rendition_dir(image.case_id, image.id), "thumb.jpg")
+        self.assertFalse(os.path.exists(path))
+        response = self.client.get(f"/cases/image/{image.id}/rendition/thumb/")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.client.get(f"/cases/image/{image.id}/rendition/huge/").status_code, 404)
+
+        User.objects.create_user(username="otheruser", password="otherpassword")
+        self.client.login(username="otheruser", password="otherpassword")
+        self.assertEqual(self.client.get(f"/cases/image/{image.id}/rendition/thumb/").status_code, 403)
+
+
+class ClusteringTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Cluster Case", investigator=self.user)
+        self.other_case = Case.objects.create(name="Other Case", investigator=self.user)
+
+    def add_image(self, case, phash, sha_digit):
+        return Image.objects.create(case=case, image=make_image_file(), perceptual_hash=phash,
+                                    sha256_hash=sha_digit * 64)
+
+    def cluster_of(self, image):
+        return HashIndex.objects.get(image=image).cluster_id
+
+    def test_saves_merge_clusters_incrementally(self):
+        """
+        Test that a new image joins, and bridges, the clusters of its near duplicates.
+        """
+        first = self.add_image(self.case, "ff00ff00ff00ff00", "a")
+        second = self.add_image(self.other_case, "00ff00ff00ff00ff", "b")
+        self.assertNotEqual(self.cluster_of(first), self.cluster_of(second))
+
+        near_first = self.add_image(self.case, "ff00ff00ff00ff03", "c")  # 2 bits from first
+        self.assertEqual(self.cluster_of(near_first), first.id)
+        exact_second = self.add_image(self.case, "1234567812345678", "b")  # same SHA-256 as second
+        self.assertEqual(self.cluster_of(exact_second), second.id)
+
+    def test_rebuild_matches_incremental_and_splits_after_delete(self):
+        """
+        Test that a full rebuild reproduces the incremental clusters and splits orphaned ones.
+        """
+        first = self.add_image(self.case, "ff00ff00ff00ff00", "a")
+        bridge = self.add_image(self.case, "ff00ff00ff00ff07", "b")  # 3 bits from both neighbours
+        last = self.add_image(self.case, "ff00ff00ff00ff3f", "c")
+        self.assertEqual({self.cluster_of(first), self.cluster_of(bridge), self.cluster_of(last)}, {first.id})
+
+        self.assertEqual(clustering.rebuild()["changed"], 0)
+        bridge.delete()
+        clustering.rebuild()
+        self.assertEqual(self.cluster_of(first), first.id)
+        self.assertEqual(self.cluster_of(last), last.id)
+
+    def test_cluster_arrays_finds_planted_duplicates(self):
+        """
+        Test that the vectorized rebuild links every pair within three bits and no others.
+        """
+        rng = np.random.default_rng(0)
+        phashes = rng.integers(np.iinfo(np.int64).min, np.iinfo(np.int64).max, 5000, dtype=np.int64)
+        sha_keys = np.arange(5000, dtype=np.int64)
+        phashes[1] = phashes[0] ^ np.int64(0b1001 << 40)
+        sha_keys[3] = sha_keys[2]
+        labels = clustering.cluster_arrays(phashes, sha_keys)
+        self.assertEqual(labels[1], 0)
+        self.assertEqual(labels[3], 2)
+        self.assertEqual(len(np.unique(labels)), 4998)
+
+    def test_related_images_panel(self):
+        """
+        Test that the related images page lists copies held by other cases.
+        """
+        self.add_image(self.case, "ff00ff00ff00ff00", "a")
+        self.add_image(self.other_case, "0f0f0f0f0f0f0f0f", "a")
+        response = self.client.get(f"/cases/{self.case.id}/related/")
+        self.assertContains(response, "Exact copy")
+        self.assertContains(response, "Other Case")
+
+    @override_settings(CLUSTER_RELATED_LIMIT=1)
+    def test_related_images_hide_inaccessible_cases(self):
+        """
+        Test that copies in other investigators' cases are only counted, and the listing is capped.
+        """
+        other_user = User.objects.create_user(username="otheruser", password="otherpassword")
+        private_case = Case.objects.create(name="Private Case", investigator=other_user)
+        self.add_image(self.case, "ff00ff00ff00ff00", "a")
+        self.add_image(self.other_case, "ff00ff00ff00ff01", "b")
+        self.add_image(self.other_case, "ff00ff00ff00ff03", "c")
+        self.add_image(private_case, "ff00ff00ff00ff00", "a")
+
+        response = self.client.get(f"/cases/{self.case.id}/related/")
+        self.assertNotContains(response, "Private Case")
+        self.assertContains(response, "1 in cases you cannot access")
+        self.assertContains(response, "and 1 more")
+        self.assertEqual(self.client.get(f"/cases/{private_case.id}/related/").status_code, 403)
+
+
+def make_animation(name="evidence.gif", frames=3, size=(48, 32), change=None):
+    """An animated GIF upload with distinct solid frames; ``change`` marks one frame."""
+    images = [PILImage.new("RGB", size, (40 * index, 90, 200 - 40 * index)) for index in range(frames)]
+    if change is not None:
+        images[change].putpixel((5, 5), (255, 255, 255))
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="GIF", save_all=True, append_images=images[1:], duration=100, loop=0)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/gif")
+
+
+class MultiFrameTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Frames Case", investigator=self.user, storage_format="jpeg")
+        self.image = Image.objects.create(case=self.case, image=make_animation())
+
+    def detect(self, upload):
+        return self.client.post(f"/cases/image/{self.image.id}/detect/", {"uploaded_image": upload})
+
+    def test_frames_recorded_and_original_kept(self):
+        """
+        Test that every frame gets a hash record and the animation is not flattened to JPEG.
+        """
+        self.assertEqual(self.image.frame_count, 3)
+        self.assertEqual(list(self.image.frames.values_list("index", flat=True)), [0, 1, 2])
+        self.assertEqual(len(set(self.image.frames.values_list("sha256_hash", flat=True))), 3)
+        self.assertTrue(self.image.verify_file())
+        self.assertEqual(len(list(self.image.iter_frames())), 3)
+
+    def test_identical_animation_matches_every_frame(self):
+        """
+        Test that re-uploading the same animation compares all frames and reports no divergence.
+        """
+        response = self.detect(make_animation())
+        self.assertEqual(response.context["frames"]["compared"], 3)
+        self.assertIsNone(response.context["frames"]["divergent"])
+        self.assertFalse(response.context["tampered"])
+
+    def test_detection_stops_at_first_divergent_frame(self):
+        """
+        Test that frame-by-frame detection stops at the first changed frame.
+        """
+        response = self.detect(make_animation(change=1))
+        self.assertEqual(response.context["frames"]["divergent"], 1)
+        self.assertEqual(response.context["frames"]["compared"], 2)
+        self.assertTrue(response.context["tampered"])
+
+    def test_missing_frames_are_divergent(self):
+        """
+        Test that an upload with fewer frames is reported as tampered.
+        """
+        response = self.detect(make_animation(frames=2))
+        self.assertEqual(response.context["frames"]["divergent"], 2)
+        self.assertTrue(response.context["tampered"])
+
+
+def make_photo(name="photo.jpg", software="Adobe Photoshop 25.0", gps=True, seed=0):
+    """A small JPEG upload with camera EXIF, as a phone or camera would write it."""
+    rng = np.random.default_rng(seed)
+    img = PILImage.fromarray(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8))
+    exif = PILImage.Exif()
+    exif[0x010F] = "Canon"  # Make
+    exif[0x0110] = "EOS R5"  # Model
+    exif[0x0131] = software  # Software
+    exif.get_ifd(0x8769)[0x9003] = "2024:03:05 14:30:00"  # DateTimeOriginal
+    if gps:
+        exif.get_ifd(0x8825)[1] = "N"  # GPSLatitudeRef
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+class MetadataTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.edited_case = Case.objects.create(name="Edited Case", investigator=self.user)
+        self.plain_case = Case.objects.create(name="Plain Case", investigator=self.user)
+        self.edited = Image.objects.create(case=self.edited_case, image=make_photo())
+        self.plain = Image.objects.create(case=self.plain_case, image=make_photo(software="", gps=False, seed=1))
+
+    def test_metadata_extracted_at_ingest(self):
+        """
+        Test that camera, software, capture time and GPS presence are recorded when an image is stored.
+        """
+        record = self.edited.metadata
+        self.assertEqual((record.make, record.model), ("Canon", "EOS R5"))
+        self.assertEqual(record.software, "Adobe Photoshop 25.0")
+        self.assertEqual(record.captured_at.isoformat(), "2024-03-05T14:30:00+00:00")
+        self.assertTrue(record.gps_present)
+        self.assertEqual((record.width, record.height, record.format), (64, 48, "JPEG"))
+        self.assertFalse(self.plain.metadata.gps_present)
+
+    def test_extraction_does_not_decode_pixels(self):
+        """
+        Test that extraction reads a truncated file, which would fail if pixels were decoded.
+        """
+        data = make_photo().read()
+        fields = metadata.extract_metadata(io.BytesIO(data[:len(data) // 2]))
+        self.assertEqual(fields["software"], "Adobe Photoshop 25.0")
+
+    def test_case_list_filters_by_image_metadata(self):
+        """
+        Test that the case list only shows cases with an image matching the metadata filters.
+        """
+        response = self.client.get("/cases/", {"software": "photoshop"})
+        self.assertEqual([case.name for case in response.context["cases"]], ["Edited Case"])
+        response = self.client.get("/cases/", {"gps": "no"})
+        self.assertEqual([case.name for case in response.context["cases"]], ["Plain Case"])
+
+    def test_image_search(self):
+        """
+        Test that image search filters by capture date and keeps filters in the pagination query.
+        """
+        response = self.client.get("/cases/images/search/", {"captured_from": "2024-03-05", "make": "canon"})
+        self.assertEqual(len(response.context["images"]), 2)
+        self.assertIn("make=canon", response.context["query"])
+        response = self.client.get("/cases/images/search/", {"captured_from": "2024-03-06"})
+        self.assertEqual(len(response.context["images"]), 0)
+
+    def test_backfill_command(self):
+        """
+        Test that the backfill command records metadata for images stored without it.
+        """
+        ImageMetadata.objects.all().delete()
+        call_command("backfill_metadata", "--workers", "1", stdout=io.StringIO())
+        self.assertEqual(ImageMetadata.objects.count(), 2)
+        self.assertEqual(ImageMetadata.objects.get(image=self.edited).software, "Adobe Photoshop 25.0")
+
+
+class BulkDeletionTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(username="adminuser", password="adminpassword")
+        self.client.login(username="adminuser", password="adminpassword")
+
+    def make_case(self, name, images):
+        case = Case.objects.create(name=name, investigator=self.admin_user)
+        for seed in range(images):
+            Image.objects.create(case=case, image=make_image_file(seed=seed))
+        Image.objects.create(case=case, image=make_animation())
+        return case
+
+    def test_delete_case_removes_rows_and_queues_files(self):
+        """
+        Test that deleting a case removes every related row, logs once and queues its directory.
+        """
+        case = self.make_case("Doomed", 2)
+        keep = self.make_case("Kept", 1)
+        case_dir = os.path.dirname(case.images.first().image.path)
+        response = self.client.post(f"/cases/{case.id}/delete/")
+        self.assertRedirects(response, "/cases/")
+
+        self.assertFalse(Case.objects.filter(id=case.id).exists())
+        self.assertEqual(Image.objects.count(), keep.images.count())
+        for model in (ImageFrame, ImageMetadata, HashIndex):
+            self.assertFalse(model.objects.exclude(image__case=keep).exists())
+        self.assertEqual(ActivityLog.objects.filter(case__isnull=True).count(), 1)
+        self.assertIn(f"cases/{case.id}", MediaCleanupTask.objects.values_list("path", flat=True))
+
+        self.assertTrue(os.path.isdir(case_dir))
+        self.assertEqual(deletion.run_cleanup()[1], 0)
+        self.assertFalse(os.path.exists(case_dir))
+        self.assertFalse(MediaCleanupTask.objects.exists())
+
+    def test_query_count_does_not_grow_with_images(self):
+        """
+        Test that bulk deletion runs the same number of queries for small and large cases.
+        """
+        small, large = self.make_case("Small", 1), self.make_case("Large", 6)
+        with CaptureQueriesContext(connection) as small_queries:
+            deletion.delete_cases([small.id], self.admin_user)
+        with CaptureQueriesContext(connection) as large_queries:
+            deletion.delete_cases([large.id], self.admin_user)
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_admin_bulk_action(self):
+        """
+        Test that the admin action confirms, then deletes all selected cases at once.
+        """
+        cases = [self.make_case(f"Case {n}", 1) for n in range(3)]
+        data = {"action": "delete_cases_in_bulk", "_selected_action": [case.id for case in cases[:2]]}
+        response = self.client.post("/admin/case_app/case/", data)
+        self.assertContains(response, "Delete 2 cases with 4 images")
+        self.client.post("/admin/case_app/case/", {**data, "post": "yes"})
+        self.assertEqual(list(Case.objects.values_list("name", flat=True)), ["Case 2"])
+
+    def test_cleanup_refuses_paths_outside_media_root(self):
+        """
+        Test that a queued path escaping MEDIA_ROOT is kept with an error instead of being removed.
+        """
+        MediaCleanupTask.objects.create(path="../outside")
+        self.assertEqual(deletion.run_cleanup(), (0, 1))
+        self.assertIn("outside MEDIA_ROOT", MediaCleanupTask.objects.get().last_error)
+
+
+class MediaGCTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix="imageguard-tests-")
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="GC Case", investigator=self.user)
+        self.image = Image.objects.create(case=self.case, image=make_image_file())
+        self.image.rendition_path("thumb")
+
+        self.orphans = [
+            self.write(f"cases/{self.case.id}/replaced.png"),
+            self.write(f"renditions/{self.case.id}/999999/thumb.jpg"),
+            self.write("uploads/abandoned.part"),
+            self.write("temp/diff_evidence.png"),
+        ]
+        self.recent = self.write("temp/in_flight.png", age=0)
+        referenced = [self.image.image.path, self.image.rendition_path("thumb")]
+        for path in referenced:
+            os.utime(path, (0, 0))
+        self.referenced = referenced
+
+    def write(self, rel, age=7 * 24 * 3600):
+        path = os.path.join(self.media_root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as handle:
+            handle.write(b"x" * 100)
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+        os.utime(os.path.dirname(path), (stamp, stamp))
+        return path
+
+    def test_dry_run_reports_without_removing(self):
+        """
+        Test that a dry run counts orphans and reclaimable bytes but leaves every file in place.
+        """
+        stats, sample = media_gc.sweep()
+        self.assertEqual(sum(area["orphans"] for area in stats.values()), 4)
+        self.assertEqual(sum(area["orphan_bytes"] for area in stats.values()), 400)
+        self.assertEqual(len(sample), 4)
+        self.assertTrue(all(os.path.exists(path) for path in self.orphans))
+
+    def test_delete_removes_only_old_orphans(self):
+        """
+        Test that deletion removes old orphans and keeps referenced and recently written files.
+        """
+        call_command("gc_media", "--delete", "--workers", "2", stdout=io.StringIO())
+        self.assertFalse(any(os.path.exists(path) for path in self.orphans))
+        self.assertFalse(os.path.exists(os.path.dirname(self.orphans[1])))
+        self.assertTrue(all(os.path.exists(path) for path in self.referenced + [self.recent]))
+
+    def test_abandoned_upload_sessions_are_collected(self):
+        """
+        Test that only recently active upload sessions keep their partial files, and --delete expires the rest.
+        """
+        active, stale = [
+            UploadSession.objects.create(user=self.user, case=self.case, filename="big.png", total_size=100,
+                                         chunk_size=100)
+            for _ in range(2)
+        ]
+        UploadSession.objects.filter(pk=stale.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL + 3600),
+        )
+        active_part, stale_part = self.write(f"uploads/{active.pk}.part"), self.write(f"uploads/{stale.pk}.part")
+        self.assertEqual(media_gc.references()["uploads"], {f"{active.pk}.part"})
+
+        stats, _ = media_gc.sweep(delete=True)
+        self.assertEqual(stats["uploads"]["expired_sessions"], 1)
+        self.assertFalse(UploadSession.objects.filter(pk=stale.pk).exists())
+        self.assertFalse(os.path.exists(stale_part))
+        self.assertTrue(os.path.exists(active_part))
+
+
+class MediaLayoutTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Layout Case", investigator=self.user)
+
+    def test_new_uploads_are_sharded(self):
+        """
+        Test that uploads are stored under two levels of directories named after their file name.
+        """
+        image = Image.objects.create(case=self.case, image=make_image_file())
+        parts = image.image.name.split("/")
+        self.assertEqual(parts[:2], ["cases", str(self.case.id)])
+        self.assertEqual(len(parts), 5)
+        self.assertTrue(parts[4].startswith(parts[2] + parts[3]))
+
+    @override_settings(MEDIA_LAYOUT="flat")
+    def test_flat_layout(self):
+        """
+        Test that the flat layout keeps every file directly in the case directory.
+        """
+        image = Image.objects.create(case=self.case, image=make_image_file())
+        self.assertEqual(image.image.name.count("/"), 2)
+
+    def test_shard_media_moves_existing_files(self):
+        """
+        Test that shard_media moves flat files into the sharded layout with fresh mtimes, and a rerun moves nothing.
+        """
+        with self.settings(MEDIA_LAYOUT="flat"):
+            images = [Image.objects.create(case=self.case, image=make_image_file(seed=seed)) for seed in range(3)]
+        old_paths = [image.image.path for image in images]
+        for path in old_paths:
+            os.utime(path, (0, 0))
+
+        output = io.StringIO()
+        call_command("shard_media", "--dry-run", stdout=output)
+        self.assertIn("3 files would move", output.getvalue())
+        self.assertTrue(all(os.path.exists(path) for path in old_paths))
+
+        call_command("shard_media", "--batch-size", "2", stdout=io.StringIO())
+        for image, old_path in zip(images, old_paths):
+            image.refresh_from_db()
+            self.assertEqual(image.image.name, storage.relocated_name(old_path, self.case.id))
+            self.assertTrue(image.verify_file())
+            self.assertFalse(os.path.exists(old_path))
+            # A fresh mtime keeps the new link inside gc_media's grace period
+            self.assertGreater(os.stat(image.image.path).st_mtime, time.time() - 3600)
+
+        output = io.StringIO()
+        call_command("shard_media", stdout=output)
+        self.assertIn("Moved 0 files", output.getvalue())
+
+
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def route(self, cookies=None, write=False):
+        """Run a replica_reads view behind the middleware; returns its read alias and the response."""
+        seen = {}
+
+        @routers.replica_reads
+        def view(request):
+            if write:
+                self.router.db_for_write(Case)
+            seen["read"] = self.router.db_for_read(Case)
+            return HttpResponse()
+
+        request = RequestFactory().get("/")
+        request.COOKIES.update(cookies or {})
+        response = routers.PrimaryPinMiddleware(view)(request)
+        return seen["read"], response
+
+    def test_reads_use_replica_only_in_marked_views(self):
+        """
+        Test that reads go to the replica inside replica_reads views and to the primary elsewhere.
+        """
+        self.assertEqual(self.route()[0], "replica")
+        self.assertIsNone(self.router.db_for_read(Case))
+        self.assertEqual(self.router.db_for_write(Case), "default")
+        self.assertFalse(self.router.allow_migrate("replica", "case_app"))
+
+    def test_write_pins_client_to_primary(self):
+        """
+        Test that reads after a write use the primary, and the response pins the client to it.
+        """
+        read, response = self.route(write=True)
+        self.assertIsNone(read)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertIsNone(self.route(cookies={routers.PIN_COOKIE: "1"})[0])
+        self.assertNotIn(routers.PIN_COOKIE, self.route()[1].cookies)
+
+    async def test_async_write_pins_client_to_primary(self):
+        """
+        Test that the middleware's async path sees writes made through sync_to_async.
+        """
+        async def view(request):
+            await sync_to_async(self.router.db_for_write)(Case)
+            return HttpResponse()
+
+        response = await routers.PrimaryPinMiddleware(view)(RequestFactory().get("/"))
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_no_replica_configured(self):
+        """
+        Test that without a replica every read uses the primary and no cookie is set.
+        """
+        read, response = self.route(write=True)
+        self.assertIsNone(read)
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+
+@skipUnless("replica" in connections, "no replica database configured")
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaIntegrationTests(TransactionTestCase):
+    # The replica is a separate connection, so test data must be committed
+    databases = "__all__"
+
+    def test_case_list_reads_from_replica(self):
+        """
+        Test that with a replica alias configured the case list queries it.
+        """
+        user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_login(user)
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            self.assertEqual(self.client.get("/cases/").status_code, 200)
+        self.assertTrue(queries)
+
+
+class AdminPanelTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(username="adminuser", password="adminpassword")
+        self.client.login(username="adminuser", password="adminpassword")
+        self.case = Case.objects.create(name="Big Case", investigator=self.admin_user)
+
+    def add_images(self, count):
+        Image.objects.bulk_create([
+            Image(case=self.case, image=f"cases/{self.case.id}/{n}.png", original_filename=f"{n}.png")
+            for n in range(count)
+        ])
+
+    def test_change_form_does_not_load_related_rows(self):
+        """
+        Test that opening a case runs the same queries however many images it has.
+        """
+        url = f"/admin/case_app/case/{self.case.id}/change/"
+        self.add_images(2)
+        self.client.get(url)  # warm per-process caches (content types, permissions)
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(url)
+        self.assertContains(response, f"/admin/case_app/case/{self.case.id}/panel/images/")
+        self.add_images(100)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(few), len(many))
+
+    def test_panels_page_newest_first(self):
+        """
+        Test that panels return a page of rows and a cursor for the next page.
+        """
+        for n in range(30):
+            ActivityLog.objects.create(user=self.admin_user, case=self.case, action=f"Action {n}")
+        url = f"/admin/case_app/case/{self.case.id}/panel/logs/"
+        first = self.client.get(url)
+        self.assertEqual(len(first.context["rows"]), 25)
+        self.assertEqual(first.context["rows"][0]["action"], "Action 29")
+        second = self.client.get(url, {"before": first.context["next_before"]})
+        self.assertIsNone(second.context["next_before"])
+        self.assertEqual(len(first.context["rows"]) + len(second.context["rows"]),
+                         ActivityLog.objects.filter(case=self.case).count())
+
+        self.add_images(3)
+        response = self.client.get(f"/admin/case_app/case/{self.case.id}/panel/images/")
+        self.assertContains(response, "/rendition/thumb/", count=3)
+
+    def test_changelists(self):
+        """
+        Test that the image and log changelists render with their related objects joined.
+        """
+        self.add_images(3)
+        for model in ("image", "activitylog"):
+            response = self.client.get(f"/admin/case_app/{model}/")
+            self.assertEqual(response.status_code, 200)
+        self.assertIsNone(admin_module.estimated_count(Image, "default"))  # SQLite keeps no estimate
+
+
+class SimilarityTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 256, (96, 128, 3), dtype=np.uint8)
+
+    def test_ssim_scores_and_map(self):
+        """
+        Test that identical images score 1, edited ones less, and the map is downsampled.
+        """
+        gray = self.pixels[..., 0].astype(np.float32)
+        edited = gray.copy()
+        edited[20:50, 30:70] = 0
+        for func in (similarity.ssim, similarity.ms_ssim):
+            self.assertAlmostEqual(func(gray, gray)[0], 1.0, places=5)
+            self.assertLess(func(gray, edited)[0], 0.95)
+        _, ssim_map = similarity.ssim(gray, edited)
+        self.assertEqual(ssim_map.dtype, np.float32)
+        self.assertLessEqual(max(similarity.local_map(ssim_map, size=32).shape), 32)
+
+    def test_detection_uses_case_metric(self):
+        """
+        Test that SSIM cases report a structural similarity and a local map, and pHash cases do not.
+        """
+        edited = self.pixels.copy()
+        edited[20:50, 30:70] = 0
+        for metric in ("ssim", "ms_ssim", "phash"):
+            case = Case.objects.create(name=f"{metric} case", investigator=self.user, similarity_metric=metric)
+            image = Image.objects.create(case=case, image=make_png(self.pixels))
+            response = self.client.post(f"/cases/image/{image.id}/detect/", {"uploaded_image": make_png(edited)})
+            if metric == "phash":
+                self.assertIsNone(response.context["ssim"])
+                self.assertIsNone(response.context["ssim_map_url"])
+            else:
+                self.assertLess(response.context["ssim"], 1.0)
+                self.assertEqual(response.context["similarity"], round(response.context["ssim"] * 100, 2))
+                self.assertContains(response, response.context["ssim_map_url"])
+
+
+class VerifyCaseTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Verify case", investigator=self.user)
+        rng = np.random.default_rng(0)
+        # Smooth images, so that pHash distances are stable under small edits
+        def smooth():
+            noise = PILImage.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8))
+            return np.asarray(noise.resize((128, 96), PILImage.BICUBIC))
+
+        self.pixels = [smooth() for _ in range(3)]
+        self.images = [
+            Image.objects.create(case=self.case, image=make_png(pixels, f"stored{index}.png"))
+            for index, pixels in enumerate(self.pixels)
+        ]
+        self.edited = self.pixels[1].copy()
+        self.edited[30:40, 40:56] = 255
+        self.unrelated = smooth()
+
+    def suspects(self, directory):
+        paths = []
+        for name, content in [
+            ("copy.png", self.images[0].image.read()),
+            ("edited.png", make_png(self.edited, "edited.png").read()),
+            ("unrelated.png", make_png(self.unrelated, "unrelated.png").read()),
+            ("broken.png", b"not an image"),
+        ]:
+            path = os.path.join(directory, name)
+            with open(path, "wb") as handle:
+                handle.write(content)
+            paths.append((name, path))
+        return paths
+
+    def test_verdicts(self):
+        """
+        Test that exact copies, modified copies, unrelated and unreadable files each get the right verdict.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            report = verification.verify_batch(self.case, self.suspects(directory))
+        by_name = {row["name"]: row for row in report}
+        self.assertEqual(by_name["copy.png"]["verdict"], verification.EXACT)
+        self.assertEqual(by_name["copy.png"]["matches"][0]["image_id"], self.images[0].id)
+        self.assertEqual(by_name["edited.png"]["verdict"], verification.MODIFIED)
+        self.assertEqual(by_name["edited.png"]["matches"][0]["image_id"], self.images[1].id)
+        self.assertLess(by_name["edited.png"]["matches"][0]["ssim"], 1.0)
+        self.assertEqual(by_name["unrelated.png"]["verdict"], verification.NO_MATCH)
+        self.assertEqual(by_name["broken.png"]["verdict"], verification.NO_MATCH)
+        self.assertTrue(by_name["broken.png"]["error"])
+
+    def test_candidates_limit_comparisons(self):
+        """
+        Test that each suspect is compared only with its k nearest stored hashes within the distance limit.
+        """
+        stored = [(index, f"{index:064x}", f"{1 << index:016x}") for index in range(20)]
+        suspects = [{"sha256_hash": "f" * 64, "perceptual_hash": f"{1 << 5:016x}"}]
+        chosen = verification.candidates(suspects, stored, k=3, max_distance=2)[0]
+        self.assertEqual(len(chosen), 3)
+        self.assertEqual(chosen[0], (5, 0, False))
+        self.assertEqual(verification.candidates(suspects, stored, k=3, max_distance=1)[0], [(5, 0, False)])
+        exact = [{"sha256_hash": f"{7:064x}", "perceptual_hash": f"{1 << 7:016x}"}]
+        self.assertEqual(verification.candidates(exact, stored, k=1, max_distance=0)[0], [(7, 0, True)])
+
+    def test_verify_view_and_command(self):
+        """
+        Test that the view accepts several files at once and the command writes the match matrix.
+        """
+        response = self.client.post(f"/cases/{self.case.id}/verify/", {
+            "suspects": [make_png(self.edited, "edited.png"), make_png(self.unrelated, "unrelated.png")],
+            "k": 2,
+        })
+        self.assertEqual(len(response.context["report"]), 2)
+        self.assertEqual(response.context["columns"], [self.images[1].id])
+        self.assertContains(response, "Modified copy")
+        self.assertTrue(ActivityLog.objects.filter(case=self.case, action="Batch Verification Performed").exists())
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.suspects(directory)
+            csv_path = os.path.join(directory, "matrix.csv")
+            out = io.StringIO()
+            call_command("verify_case", str(self.case.id), directory, "--workers", "1", "--csv", csv_path, stdout=out)
+            with open(csv_path) as handle:
+                lines = handle.read().splitlines()
+        self.assertIn("Exact copy: 1", out.getvalue())
+        self.assertEqual(len(lines), 1 + 4)
+
+    def test_verify_view_bounded_by_pool(self):
+        """
+        Test that the view answers 429 when the shared pool has no free slot and 403 to other users.
+        """
+        workers.get_executor()
+        slots = workers._slots
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        try:
+            response = self.client.post(f"/cases/{self.case.id}/verify/",
+                                        {"suspects": [make_png(self.edited, "edited.png")]})
+        finally:
+            for _ in range(taken):
+                slots.release()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+        with workers.reserve(2) as pool:
+            self.assertEqual(list(pool.map(abs, [-1, -2, -3])), [1, 2, 3])
+            self.assertLessEqual(pool.slots, 2)
+
+        User.objects.create_user(username="otheruser", password="otherpassword")
+        self.client.login(username="otheruser", password="otherpassword")
+        self.assertEqual(self.client.post(f"/cases/{self.case.id}/verify/").status_code, 403)
+
+
+class ImageIntegrityTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Integrity Case", investigator=self.user)
+        self.image = Image.objects.create(case=self.case, image=make_image_file())
+
+    def test_signature_stored_in_side_table(self):
+        """
+        Test that the signature and public key are written to ImageIntegrity and still verify.
+        """
+        record = ImageIntegrity.objects.get(image=self.image)
+        self.assertTrue(record.digital_signature and record.public_key)
+        self.assertNotIn("digital_signature", [field.name for field in Image._meta.concrete_fields])
+        reloaded = Image.objects.get(pk=self.image.pk)
+        self.assertEqual(reloaded.public_key, record.public_key)
+        self.assertTrue(reloaded.verify_signature())
+
+    def test_listings_load_only_rendered_columns(self):
+        """
+        Test that the case page and exports read neither the integrity table nor the hash columns.
+        """
+        for url in (f"/cases/{self.case.id}/", f"/cases/{self.case.id}/export/csv/"):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            sql = " ".join(query["sql"] for query in queries.captured_queries)
+            self.assertNotIn("imageintegrity", sql)
+            self.assertNotIn("sha256_hash", sql)
+
+
+class IntegrityMigrationTests(TransactionTestCase):
+    def test_data_migration_moves_signatures(self):
+        """
+        Test that migrating copies every signature into ImageIntegrity and migrating back restores it.
+        """
+        executor = MigrationExecutor(connection)
+        executor.migrate([("case_app", "0009_imageintegrity")])
+        apps = executor.loader.project_state([("case_app", "0009_imageintegrity")]).apps
+        OldCase, OldImage = apps.get_model("case_app", "Case"), apps.get_model("case_app", "Image")
+        case = OldCase.objects.create(name="Old Case")
+        for index in range(5):
+            OldImage.objects.create(case=case, image=f"cases/{case.id}/{index}.png",
+                                    digital_signature=f"sig{index}", public_key=f"key{index}")
+
+        migration = importlib.import_module("case_app.migrations.0010_move_integrity_data")
+        with mock.patch.object(migration, "BATCH_SIZE", 2):
+            executor = MigrationExecutor(connection)
+            executor.migrate([("case_app", "0011_remove_image_integrity_fields")])
+        self.assertEqual(
+            sorted(ImageIntegrity.objects.values_list("digital_signature", "public_key")),
+            [(f"sig{index}", f"key{index}") for index in range(5)],
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([("case_app", "0009_imageintegrity")])
+        apps = executor.loader.project_state([("case_app", "0009_imageintegrity")]).apps
+        self.assertEqual(
+            sorted(apps.get_model("case_app", "Image").objects.values_list("digital_signature", flat=True)),
+            [f"sig{index}" for index in range(5)],
+        )
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes("case_app"))
+
+
+# Case deletion here runs the real media cleanup, inside the temporary MEDIA_ROOT
+class LogArchiveTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username="adminuser", password="adminpassword")
+        self.client.login(username="adminuser", password="adminpassword")
+        self.archive_root = tempfile.mkdtemp()
+        self.settings = override_settings(ACTIVITY_LOG_ARCHIVE_ROOT=self.archive_root)
+        self.settings.enable()
+        self.case = Case.objects.create(name="Archived Case", investigator=self.user)
+        ActivityLog.objects.filter(case=self.case).delete()
+        # 8 entries from January 2020 and 7 from February, then 3 recent ones
+        for index in range(15):
+            log = ActivityLog.objects.create(user=self.user, case=self.case, action=f"Old action {index}")
+            timestamp = datetime(2020, 1 if index < 8 else 2, 1 + index, tzinfo=dt_timezone.utc)
+            ActivityLog.objects.filter(pk=log.pk).update(timestamp=timestamp)
+        for index in range(3):
+            ActivityLog.objects.create(user=self.user, case=self.case, action=f"Recent action {index}")
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.archive_root, ignore_errors=True)
+
+    def test_archive_moves_old_entries(self):
+        """
+        Test that old entries move in batches into per-month gzip files that decompress as a whole.
+        """
+        out = io.StringIO()
+        call_command("archive_logs", "--days", "30", "--batch-size", "4", stdout=out)
+        self.assertIn("Archived 15 entries", out.getvalue())
+        self.assertEqual(ActivityLog.objects.filter(case=self.case).count(), 3)
+        segments = LogArchiveSegment.objects.filter(case=self.case)
+        self.assertEqual(sum(segment.count for segment in segments), 15)
+        self.assertEqual(sorted({segment.path for segment in segments}),
+                         [f"{self.case.id}/2020-01.ndjson.gz", f"{self.case.id}/2020-02.ndjson.gz"])
+        with gzip.open(os.path.join(self.archive_root, f"{self.case.id}", "2020-01.ndjson.gz"), "rt") as handle:
+            actions = [json.loads(line)["action"] for line in handle]
+        self.assertEqual(actions, [f"Old action {index}" for index in range(8)])
+        call_command("archive_logs", "--verify", stdout=out)
+
+    def test_case_logs_reads_archive(self):
+        """
+        Test that the log page lists recent entries first, then archived ones, reading only the segments it needs.
+        """
+        log_archive.archive(days=30, batch_size=4)
+        first = self.client.get(f"/cases/{self.case.id}/logs/")
+        self.assertEqual(first.context["logs"].paginator.count, 18)
+        actions = [log.action for log in first.context["logs"]]
+        self.assertEqual(actions[:3], [f"Recent action {index}" for index in (2, 1, 0)])
+        self.assertEqual(actions[3:], [f"Old action {index}" for index in range(14, 7, -1)])
+        second = self.client.get(f"/cases/{self.case.id}/logs/?page=2")
+        self.assertEqual([log.action for log in second.context["logs"]],
+                         [f"Old action {index}" for index in range(7, -1, -1)])
+        self.assertContains(second, "Archived")
+
+        history = log_archive.CaseLogHistory(self.case.id)
+        with mock.patch.object(log_archive, "read_segment", wraps=log_archive.read_segment) as read:
+            history[3:5]
+        self.assertEqual(read.call_count, 1)
+
+    def test_verify_and_case_deletion(self):
+        """
+        Test that a corrupted segment fails verification and deleting the case removes its archive.
+        """
+        log_archive.archive(days=30)
+        path = os.path.join(self.archive_root, f"{self.case.id}", "2020-02.ndjson.gz")
+        with open(path, "r+b") as handle:
+            handle.seek(20)
+            handle.write(b"\x00\x00\x00")
+        self.assertEqual(len(log_archive.verify()), 1)
+        with self.assertRaises(log_archive.ArchiveError):
+            list(log_archive.CaseLogHistory(self.case.id))
+
+        deletion.delete_cases([self.case.id], self.user)
+        self.assertFalse(LogArchiveSegment.objects.exists())
+        self.assertEqual(deletion.run_cleanup()[1], 0)
+        self.assertFalse(os.path.exists(os.path.join(self.archive_root, f"{self.case.id}")))
+
+
+class EngineTests(TestCase):
+    def test_startup_skips_heavy_imports(self):
+        """
+        Test that setting up Django and loading the URLconf imports none of the heavy engines.
+        """
+        code = (
+            "import sys, django; django.setup(); import ImageGuard.urls; "
+            "print(','.join(m for m in ('xhtml2pdf', 'imagehash', 'scipy', 'nacl', 'pywt') if m in sys.modules))"
+        )
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_engines_load_on_access(self):
+        """
+        Test that engines are imported on first access or by warmup, and unknown names raise AttributeError.
+        """
+        self.assertEqual(engines.imagehash.__name__, "imagehash")
+        with self.assertRaises(AttributeError):
+            engines.missing
+        engines.warmup()
+        self.assertEqual(engines.loaded(), sorted(engines.ENGINES))
+
+
+# No cleanup thread outliving the live server; queued paths stay under the temporary MEDIA_ROOT
+@override_settings(MEDIA_CLEANUP_ON_COMMIT=False)
+class LoadTestTests(TemporaryMediaMixin, LiveServerTestCase):
+    def test_load_test_against_live_server(self):
+        """
+        Test that the load test drives every action over HTTP and reports per-endpoint latency and server RSS.
+        """
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            report_path = os.path.join(directory, "report.json")
+            call_command(
+                "loadtest", "--url", self.live_server_url, "--server-pid", str(os.getpid()), "--users", "2",
+                "--concurrency", "2", "--requests", "16", "--images-per-user", "1", "--resolution", "96x64",
+                "--rss-interval", "0.05", "--output", report_path, "--cleanup", stdout=out, stderr=io.StringIO(),
+            )
+            with open(report_path) as handle:
+                report = json.load(handle)
+        self.assertEqual(report["overall"]["requests"], 32)
+        self.assertEqual(report["overall"]["errors"], 0, report["endpoints"])
+        for result in report["endpoints"].values():
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertTrue(report["server_rss_kb"])
+        self.assertIn("overall", out.getvalue())
+        self.assertFalse(Case.objects.filter(investigator__username__startswith="loadtest_").exists())
+        self.assertFalse(User.objects.filter(username__startswith="loadtest_").exists())
+        self.assertEqual(loadtest.parse_mix("detect=2,case_list"), {"detect": 2.0, "case_list": 1.0})
+
+
+@override_settings(PROGRESS_POLL_INTERVAL=0.01)
+class ProgressTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Progress Case", investigator=self.user)
+        self.token = "token-0123456789"
+
+    def events(self, response):
+        content = b"".join(response.streaming_content).decode()
+        return [json.loads(line[len("data: "):]) for line in content.splitlines() if line.startswith("data: ")]
+
+    def test_reporter_publishes_stages_and_eta(self):
+        """
+        Test that a tracked request publishes its stage, items done, ETA and outcome for its owner only.
+        """
+        request = RequestFactory().get("/", {"progress": self.token})
+        request.user = self.user
+        with progress.track(request, "Export") as reporter:
+            progress.stage("Writing rows", 4)
+            progress.advance(2)
+            reporter.publish()
+            state = progress.get_state(self.token, self.user.pk)
+            self.assertEqual((state["stage"], state["done"], state["total"]), ("Writing rows", 2, 4))
+            self.assertIsNotNone(state["eta_seconds"])
+        self.assertEqual(progress.get_state(self.token, self.user.pk)["state"], progress.DONE)
+        self.assertIsNone(progress.get_state(self.token, self.user.pk + 1))
+
+        with self.assertRaises(ValueError):
+            with progress.track(request, "Export"):
+                raise ValueError("broken")
+        self.assertEqual(progress.get_state(self.token, self.user.pk)["message"], "broken")
+
+        request = RequestFactory().get("/", {"progress": "../bad"})
+        request.user = self.user
+        with progress.track(request, "Export"):
+            progress.stage("Ignored")  # no reporter: a no-op
+        self.assertFalse(progress.active())
+
+    def test_csv_export_streams_progress(self):
+        """
+        Test that a CSV export reports its rows and the event stream resumes from the latest state.
+        """
+        for seed in range(3):
+            Image.objects.create(case=self.case, image=make_image_file(seed=seed))
+        response = self.client.get(f"/cases/{self.case.id}/export/csv/", {"progress": self.token})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(f"/cases/progress/{self.token}/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        (state,) = self.events(response)
+        self.assertEqual((state["state"], state["stage"], state["done"], state["total"]),
+                         (progress.DONE, "Writing rows", 3, 3))
+        self.assertNotIn("user_id", state)
+
+        # A client that already saw the last event gets nothing new
+        response = self.client.get(f"/cases/progress/{self.token}/", HTTP_LAST_EVENT_ID=str(state["id"]))
+        self.assertEqual(self.events(response), [])
+
+        other = User.objects.create_user(username="otheruser", password="otherpassword")
+        self.client.force_login(other)
+        with self.settings(PROGRESS_STREAM_SECONDS=0):
+            self.assertEqual(self.events(self.client.get(f"/cases/progress/{self.token}/")), [])
+
+    def test_bulk_delete_reports_progress(self):
+        """
+        Test that deleting a case publishes its deletion stages under the posted token.
+        """
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.post(f"/cases/{self.case.id}/delete/", {"progress": self.token})
+        state = progress.get_state(self.token, self.user.pk)
+        self.assertEqual(state["state"], progress.DONE)
+        self.assertEqual(state["stage"], "Deleting rows")
+        self.assertEqual(state["done"], state["total"])
+
+
+class MediaServingTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Media Case", investigator=self.user)
+        self.image = Image.objects.create(case=self.case, image=make_image_file())
+        with open(self.image.image.path, "rb") as handle:
+            self.data = handle.read()
+
+    def test_etag_and_not_modified(self):
+        """
+        Test that stored images carry a strong SHA-256 ETag and a repeat view transfers nothing.
+        """
+        response = self.client.get(self.image.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], f'"{self.image.sha256_hash}"')
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+
+        response = self.client.get(self.image.image.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_range_requests(self):
+        """
+        Test that single byte ranges get 206, stale If-Range the whole file and unsatisfiable ranges 416.
+        """
+        url, size = self.image.image.url, len(self.data)
+        response = self.client.get(url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{size}")
+        self.assertEqual(b"".join(response.streaming_content), self.data[10:20])
+
+        response = self.client.get(url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.data[-5:])
+
+        response = self.client.get(url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+
+        response = self.client.get(url, HTTP_RANGE=f"bytes={size}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{size}")
+
+    def test_permission_checks(self):
+        """
+        Test that other users, anonymous clients, partial uploads and paths outside MEDIA_ROOT are refused.
+        """
+        uploads_dir = os.path.join(self.image.image.storage.location, "uploads")
+        os.makedirs(uploads_dir, exist_ok=True)
+        with open(os.path.join(uploads_dir, "partial.part"), "wb") as handle:
+            handle.write(b"partial")
+        self.assertEqual(self.client.get("/media/uploads/partial.part").status_code, 404)
+        self.assertEqual(self.client.get("/media/cases/../../manage.py").status_code, 404)
+        self.assertEqual(self.client.get(f"/media/cases/{self.case.id}/missing.png").status_code, 404)
+
+        User.objects.create_user(username="otheruser", password="otherpassword")
+        self.client.login(username="otheruser", password="otherpassword")
+        self.assertEqual(self.client.get(self.image.image.url).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.image.image.url).status_code, 302)
+
+    def test_detection_artifacts_private(self):
+        """
+        Test that detection results get unguessable names under the user's own directory and nobody else sees them.
+        """
+        response = self.client.post(f"/cases/image/{self.image.id}/detect/",
+                                    {"uploaded_image": make_image_file("suspect.png", seed=1)})
+        url = response.context["uploaded_image_url"]
+        self.assertTrue(url.startswith(f"/media/temp/{self.user.pk}/temp_"))
+        self.assertNotIn("suspect", url)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(response.context["diff_image_url"]).status_code, 200)
+
+        User.objects.create_user(username="otheruser", password="otherpassword")
+        self.client.login(username="otheruser", password="otherpassword")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(f"/cases/image/{self.image.id}/rendition/thumb/").status_code, 403)
+
+    def test_front_proxy_delegation(self):
+        """
+        Test that X-Accel-Redirect and X-Sendfile hand the transfer to the proxy after the checks.
+        """
+        with self.settings(MEDIA_SENDFILE=media.X_ACCEL_REDIRECT):
+            response = self.client.get(self.image.image.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.image.image.name}")
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], f'"{self.image.sha256_hash}"')
+        with self.settings(MEDIA_SENDFILE=media.X_SENDFILE):
+            response = self.client.get(self.image.image.url)
+        self.assertEqual(response["X-Sendfile"], self.image.image.path)
+        self.assertEqual(media.pdf_link_callback(self.image.image.url, None), self.image.image.path)
+
+
+
+class CaseStatisticsTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.login(username="testuser", password="testpassword")
+        self.case = Case.objects.create(name="Counted Case", investigator=self.user)
+
+    def test_uploads_and_deletes_update_counters(self):
+        """
+        Test that saving and deleting images keeps the image count, total bytes and last upload current.
+        """
+        first = Image.objects.create(case=self.case, image=make_image_file(seed=1))
+        second = Image.objects.create(case=self.case, image=make_image_file(seed=2))
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.image_count, 2)
+        self.assertEqual(self.case.total_bytes, first.image.size + second.image.size)
+        self.assertIsNotNone(self.case.last_upload_at)
+        self.assertGreaterEqual(self.case.last_activity_at, self.case.last_upload_at)
+
+        first.delete()
+        self.case.refresh_from_db()
+        self.assertEqual((self.case.image_count, self.case.total_bytes), (1, second.file_size))
+
+    def test_detections_and_stale_saves(self):
+        """
+        Test that detections are counted and saving a stale case instance does not overwrite the counters.
+        """
+        stale = Case.objects.get(pk=self.case.pk)
+        Image.objects.create(case=self.case, image=make_image_file())
+        stats.record_detection(self.case, tampered=True)
+        stats.record_detection(self.case, tampered=False)
+        stale.name = "Renamed Case"
+        stale.save()
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.name, "Renamed Case")
+        self.assertEqual((self.case.image_count, self.case.tampered_count), (1, 1))
+        self.assertIsNotNone(self.case.last_detection_at)
+
+    def test_reconcile_repairs_drift(self):
+        """
+        Test that reconcile_case_stats reports drift with --dry-run and repairs it otherwise.
+        """
+        image = Image.objects.create(case=self.case, image=make_image_file())
+        ActivityLog.objects.create(user=self.user, case=self.case, action=stats.DETECTION_ACTION,
+                                   details="Status: Tampered")
+        Case.objects.filter(pk=self.case.pk).update(image_count=7, total_bytes=0, tampered_count=0)
+
+        out = io.StringIO()
+        call_command("reconcile_case_stats", "--dry-run", stdout=out)
+        self.assertIn("1 had drifted and would be repaired", out.getvalue())
+        self.assertEqual(Case.objects.get(pk=self.case.pk).image_count, 7)
+
+        call_command("reconcile_case_stats", "--case", str(self.case.pk), stdout=out)
+        self.case.refresh_from_db()
+        self.assertEqual((self.case.image_count, self.case.total_bytes, self.case.tampered_count),
+                         (1, image.file_size, 1))
+        self.assertEqual(stats.reconcile(), (1, 0))
+
+    def test_case_list_sorts_by_statistics(self):
+        """
+        Test that the case list sorts by the counters, flips direction and caches each sort separately.
+        """
+        small = Case.objects.create(name="Small Case", investigator=self.user)
+        Image.objects.create(case=small, image=make_image_file(seed=1))
+        for seed in (2, 3):
+            Image.objects.create(case=self.case, image=make_image_file(seed=seed))
+
+        response = self.client.get("/cases/?sort=-images")
+        self.assertEqual([case.name for case in response.context["cases"]], ["Counted Case", "Small Case"])
+        self.assertEqual(response.context["sort_links"]["images"]["url"], "?sort=images")
+        response = self.client.get("/cases/?sort=images")
+        self.assertEqual([case.name for case in response.context["cases"]], ["Small Case", "Counted Case"])
+        response = self.client.get("/cases/?sort=bogus")
+        self.assertEqual(response.context["sort"], "-activity")
@@ -0,0 +1,96 @@
+"""
+Storage formats and lazily generated viewing renditions.
+
+Each ``Case`` chooses how uploads are stored: the original bytes untouched,
+lossless PNG or WebP, or JPEG at a chosen quality.  Whatever is stored, pages
+show renditions (a thumbnail and a web preview) that are transcoded on first
+access and kept under ``MEDIA_ROOT/renditions/<case_id>/<image_id>/``.  Nothing
+here touches the database, so it can run in the worker pool as well.
+"""
+import os
+import shutil
+import tempfile
+
+from PIL import Image as PILImage
+from django.conf import settings
+
+ORIGINAL = "original"
+PNG = "png"
+WEBP = "webp"
+JPEG = "jpeg"
+
+STORAGE_FORMAT_CHOICES = [
+    (ORIGINAL, "Original bytes"),
+    (PNG, "Lossless PNG"),
+    (WEBP, "Lossless WebP"),
+    (JPEG, "JPEG (lossy)"),
+]
+
+EXTENSIONS = {PNG: ".png", WEBP: ".webp", JPEG: ".jpg"}
+
+# name -> (longest side in pixels, JPEG quality)
+RENDITIONS = {
+    "thumb": (320, 75),
+    "preview": (1600, 85),
+}
+
+
+def storage_name(filename, storage_format):
+    """File name to store an upload under, with the extension of its stored format."""
+    if storage_format == ORIGINAL:
+        return filename
+    return os.path.splitext(filename)[0] + EXTENSIONS[storage_format]
+
+
+def encode_for_storage(img, storage_format, quality, output):
+    """
+    Write the PIL image ``img`` to the file object ``output`` in a
+    transcoding storage format (anything but ``ORIGINAL``).
+    """
+    if storage_format == JPEG:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(output, format="JPEG", quality=quality)
+    elif storage_format == WEBP:
+        img.save(output, format="WEBP", lossless=True)
+    elif storage_format == PNG:
+        img.save(output, format="PNG")
+    else:
+        raise ValueError(f"Unknown storage format: {storage_format}")
+
+
+def rendition_dir(case_id, image_id):
+    return os.path.join(settings.MEDIA_ROOT, "renditions", str(case_id), str(image_id))
+
+
+def rendition_path(source_path, case_id, image_id, name):
+    """
+    Return the path of rendition ``name`` of a stored image, transcoding it
+    from ``source_path`` on first access.
+    """
+    size, quality = RENDITIONS[name]
+    path = os.path.join(rendition_dir(case_id, image_id), f"{name}.jpg")
+    if os.path.exists(path):
+        return path
+
+    img = PILImage.open(source_path)
+    img.draft("RGB", (size, size))  # let the JPEG decoder downscale while decoding
+    img = img.convert("RGB")
+    img.thumbnail((size, size))
+
+    # Write to a temporary name and rename, so concurrent first requests
+    # never serve a partially written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            img.save(output, format="JPEG", quality=quality)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+
+def delete_renditions(case_id, image_id):
+    shutil.rmtree(rendition_dir(case_id, image_id), ignore_errors=True)
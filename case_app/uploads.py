@@ -0,0 +1,202 @@
+"""
+Chunked, resumable uploads.
+
+An ``UploadSession`` owns a preallocated ``.part`` file under
+``MEDIA_ROOT/uploads``.  Each chunk is streamed from the request body straight
+to its offset with ``os.pwrite``, so memory use does not depend on the file
+size, and chunks may arrive in any order or be retried.
+
+SHA-256 is computed while the upload is in progress: whenever the contiguous
+prefix of received chunks grows, the new chunks are fed to the session's
+hasher.  Hashers live in process memory; a process that has none for a session
+(a restart, or chunks spread over several workers) starts from the beginning of
+the file, so finalizing is always correct and usually has nothing left to read.
+
+Each user may have ``UPLOAD_MAX_OPEN_SESSIONS`` unfinished sessions.  A
+session that receives nothing for ``UPLOAD_SESSION_TTL`` seconds expires:
+``expire_sessions`` removes its row, partial file and hasher.
+"""
+import hashlib
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+
+READ_SIZE = 64 * 1024
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """A request the upload session cannot accept, with the HTTP status to answer."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _HashState:
+    """SHA-256 of the first ``offset`` bytes of a session's file."""
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+        self.offset = 0
+        self.lock = threading.Lock()
+
+
+def part_path(session):
+    return os.path.join(settings.MEDIA_ROOT, "uploads", f"{session.pk}.part")
+
+
+def create_session(case, user, filename, total_size, chunk_size=None):
+    """Start an upload of ``total_size`` bytes and preallocate its file."""
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    if not 0 < total_size <= settings.UPLOAD_MAX_SIZE:
+        raise UploadError("Invalid file size.")
+    if not 0 < chunk_size <= settings.UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError("Invalid chunk size.")
+    filename = os.path.basename(filename or "")
+    if not filename:
+        raise UploadError("A file name is required.")
+    expire_sessions()
+    if UploadSession.objects.filter(user=user, image__isnull=True).count() >= settings.UPLOAD_MAX_OPEN_SESSIONS:
+        raise UploadError("Too many uploads in progress; finish or abandon one first.", status=429)
+
+    session = UploadSession.objects.create(
+        case=case, user=user, filename=filename[-255:], total_size=total_size, chunk_size=chunk_size,
+    )
+    path = part_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as handle:
+        handle.truncate(total_size)  # sparse on most filesystems; chunks are written in place
+    return session
+
+
+def _pwrite_all(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def write_chunk(session, index, stream, length):
+    """
+    Copy chunk ``index`` of ``length`` bytes from ``stream`` into the
+    session's file.  Chunks that were already received are acknowledged
+    without being rewritten, so retrying a chunk is always safe.
+    """
+    if session.image_id:
+        raise UploadError("This upload has already been finalized.", status=409)
+    if not 0 <= index < session.chunk_count:
+        raise UploadError("Chunk index out of range.")
+    if index in session.received:
+        return session
+
+    start, expected = session.chunk_range(index)
+    if length != expected:
+        raise UploadError(f"Chunk {index} must be {expected} bytes.")
+
+    try:
+        fd = os.open(part_path(session), os.O_WRONLY)
+    except FileNotFoundError:
+        raise UploadError("This upload has expired.", status=410)
+    written = 0
+    try:
+        while written < expected:
+            data = stream.read(min(READ_SIZE, expected - written))
+            if not data:
+                break
+            _pwrite_all(fd, data, start + written)
+            written += len(data)
+    finally:
+        os.close(fd)
+    if written != expected:
+        raise UploadError(f"Chunk {index} body ended after {written} of {expected} bytes.")
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+        if session is None:
+            raise UploadError("This upload has expired.", status=410)
+        if index not in session.received:
+            session.received = sorted(session.received + [index])
+            session.save(update_fields=["received", "updated_at"])
+    advance_hash(session)
+    return session
+
+
+def _state_for(session):
+    with _states_lock:
+        return _states.setdefault(session.pk, _HashState())
+
+
+def advance_hash(session):
+    """
+    Feed the chunks that extend the hashed prefix to the session's hasher and
+    return the state.  Each byte is read back at most once, from the page cache.
+    """
+    state = _state_for(session)
+    received = set(session.received)
+    with state.lock:
+        if state.offset >= session.total_size or state.offset // session.chunk_size not in received:
+            return state
+        with open(part_path(session), "rb") as handle:
+            handle.seek(state.offset)
+            while state.offset < session.total_size and state.offset // session.chunk_size in received:
+                start, length = session.chunk_range(state.offset // session.chunk_size)
+                remaining = length
+                while remaining:
+                    data = handle.read(min(READ_SIZE, remaining))
+                    state.hasher.update(data)
+                    remaining -= len(data)
+                state.offset = start + length
+    return state
+
+
+def finish_hash(session):
+    """SHA-256 of the complete file; every chunk must have been received."""
+    state = advance_hash(session)
+    if state.offset != session.total_size:
+        raise UploadError("The upload is incomplete.", status=409)
+    return state.hasher.hexdigest()
+
+
+def discard(session):
+    """Remove the session's partial file and hasher."""
+    with _states_lock:
+        _states.pop(session.pk, None)
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def expire_sessions(max_age=None):
+    """
+    Remove unfinished sessions that received nothing for ``max_age`` seconds
+    (``UPLOAD_SESSION_TTL`` by default) with their partial files, and drop
+    the hashers of sessions that no longer exist.  Returns how many expired.
+    """
+    max_age = settings.UPLOAD_SESSION_TTL if max_age is None else max_age
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    expired = 0
+    for session in UploadSession.objects.filter(image__isnull=True, updated_at__lt=cutoff).only("pk"):
+        # Deleted only if no chunk arrived since it was read
+        if UploadSession.objects.filter(pk=session.pk, image__isnull=True, updated_at__lt=cutoff).delete()[0]:
+            discard(session)
+            expired += 1
+
+    with _states_lock:
+        hashed = list(_states)
+    if hashed:
+        live = set(UploadSession.objects.filter(pk__in=hashed, image__isnull=True).values_list("pk", flat=True))
+        with _states_lock:
+            for pk in set(hashed) - live:
+                _states.pop(pk, None)
+    return expired
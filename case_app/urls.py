@@ -2,6 +2,9 @@ from django.urls import path
 from .views import (
     create_case, upload_image, case_details, case_list, edit_case, delete_case,
     delete_image, export_case_pdf, export_case_csv, case_logs, detect_tampering,
+    copy_move_analysis, upload_image_async, detect_tampering_async,
+    upload_session_create, upload_session_status, upload_chunk, upload_session_complete,
+    image_rendition, related_images, image_search, verify_case, progress_stream,
 )
 
 app_name = 'case_app'
@@ -13,14 +16,28 @@ urlpatterns = [
     path('<int:case_id>/edit/', edit_case, name='edit_case'),
     path('<int:case_id>/delete/', delete_case, name='delete_case'),
     path('<int:case_id>/logs/', case_logs, name='case_logs'),
+    path('<int:case_id>/related/', related_images, name='related_images'),
+    path('<int:case_id>/verify/', verify_case, name='verify_case'),
     path('', case_list, name='case_list'),
 
     # Image Management
+    path('images/search/', image_search, name='image_search'),
     path('<int:case_id>/upload/', upload_image, name='upload_image'),
+    path('<int:case_id>/upload/async/', upload_image_async, name='upload_image_async'),
+    path('<int:case_id>/uploads/', upload_session_create, name='upload_session_create'),
+    path('uploads/<uuid:session_id>/', upload_session_status, name='upload_session_status'),
+    path('uploads/<uuid:session_id>/chunks/<int:index>/', upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:session_id>/complete/', upload_session_complete, name='upload_session_complete'),
     path('image/<int:image_id>/delete/', delete_image, name='delete_image'),
     path('image/<int:image_id>/detect/', detect_tampering, name='detect_tampering'),
+    path('image/<int:image_id>/detect/async/', detect_tampering_async, name='detect_tampering_async'),
+    path('image/<int:image_id>/rendition/<str:name>/', image_rendition, name='image_rendition'),
+    path('image/<int:image_id>/copy-move/', copy_move_analysis, name='copy_move_analysis'),
   
     # Exporting Case Data
     path('<int:case_id>/export/pdf/', export_case_pdf, name='export_case_pdf'),
     path('<int:case_id>/export/csv/', export_case_csv, name='export_case_csv'),
+
+    # Progress of long operations (server-sent events)
+    path('progress/<slug:token>/', progress_stream, name='progress_stream'),
 ]
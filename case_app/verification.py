@@ -0,0 +1,169 @@
+"""
+Batch verification of suspect files against a whole case.
+
+Each suspect is hashed once.  Its candidates are the stored images of the
+case with the same SHA-256 (exact copies, which need no further work) and the
+``k`` stored images nearest by pHash distance within ``max_distance`` bits.
+Distances to every stored image are found with one vectorized XOR and
+popcount per block of suspects, which is cheap next to decoding an image.
+Only the candidate pairs get the expensive aligned pixel comparison
+(``analysis.match_images``), run in a process pool, so that work scales with
+the candidates rather than with suspects times case size.
+"""
+import numpy as np
+from django.conf import settings
+
+from .analysis import hash_suspect, match_images
+from . import progress
+
+EXACT = "exact"
+IDENTICAL = "identical"
+MODIFIED = "modified"
+NO_MATCH = "no_match"
+
+VERDICTS = {
+    EXACT: "Exact copy",
+    IDENTICAL: "Identical pixels",
+    MODIFIED: "Modified copy",
+    NO_MATCH: "No match",
+}
+
+SUSPECT_BLOCK = 256
+
+
+def _phash_int(perceptual_hash):
+    return np.uint64(int(perceptual_hash, 16)) if perceptual_hash else None
+
+
+def candidates(suspect_hashes, stored, k, max_distance):
+    """
+    For each suspect's hashes, the stored rows to compare it with:
+    ``(row index, distance, exact)`` tuples, exact SHA-256 matches first,
+    then the ``k`` nearest pHashes within ``max_distance`` bits.
+    ``stored`` is a list of ``(image_id, sha256_hash, perceptual_hash)``.
+    """
+    by_sha = {}
+    for row, (_, sha256_hash, _) in enumerate(stored):
+        by_sha.setdefault(sha256_hash, []).append(row)
+    hashed = [row for row, (_, _, phash) in enumerate(stored) if phash]
+    stored_phashes = np.array([_phash_int(stored[row][2]) for row in hashed], dtype=np.uint64)
+    hashed = np.array(hashed, dtype=np.int64)
+
+    result = []
+    for start in range(0, len(suspect_hashes), SUSPECT_BLOCK):
+        block = suspect_hashes[start:start + SUSPECT_BLOCK]
+        suspects = np.array([_phash_int(hashes["perceptual_hash"]) or 0 for hashes in block], dtype=np.uint64)
+        # suspects x stored distance matrix, one block of suspects at a time
+        distances = np.bitwise_count(suspects[:, None] ^ stored_phashes[None, :]) if len(hashed) else None
+        for index, hashes in enumerate(block):
+            if not hashes["sha256_hash"]:
+                result.append([])  # unreadable suspect
+                continue
+            exact = by_sha.get(hashes["sha256_hash"], [])
+            chosen = [(row, 0, True) for row in exact]
+            if distances is not None:
+                row_distances = distances[index]
+                nearest = np.argpartition(row_distances, min(k, len(hashed)) - 1)[:k] if k else []
+                nearest = sorted(nearest, key=lambda column: (row_distances[column], column))
+                chosen += [
+                    (int(hashed[column]), int(row_distances[column]), False) for column in nearest
+                    if row_distances[column] <= max_distance and int(hashed[column]) not in exact
+                ]
+            result.append(chosen)
+    return result
+
+
+def verify_batch(case, suspects, k=3, max_distance=None, executor=None):
+    """
+    Verify ``suspects`` (``(name, path)`` pairs) against every image of
+    ``case``.  ``executor`` runs the hashing and pixel comparisons in
+    parallel; without one they run in this process.  Returns one row per
+    suspect with its candidate matches, best first, and a verdict.
+    """
+    max_distance = settings.VERIFY_MAX_DISTANCE if max_distance is None else max_distance
+    run = executor.map if executor is not None else map
+
+    paths = [path for _, path in suspects]
+    hashes = []
+    progress.stage("Hashing suspect files", len(paths))
+    for path, result in zip(paths, run(_hash_or_none, paths)):
+        hashes.append(result or {"sha256_hash": None, "perceptual_hash": None, "error": True})
+        progress.advance()
+
+    stored = list(case.images.order_by("id").values_list("id", "sha256_hash", "perceptual_hash", "image"))
+    chosen = candidates(hashes, [(image_id, sha, phash) for image_id, sha, phash, _ in stored], k, max_distance)
+    storage = case.images.model._meta.get_field("image").storage
+
+    # One pixel comparison per non-exact candidate pair
+    pairs = [(suspect, row) for suspect, rows in enumerate(chosen) for row, _, exact in rows if not exact]
+    compared = run(
+        _match_or_none,
+        [storage.path(stored[row][3]) for _, row in pairs],
+        [paths[suspect] for suspect, _ in pairs],
+        [settings.REGISTRATION_ESTIMATE_SCALE] * len(pairs),
+        [settings.REGISTRATION_WORKING_SIZE] * len(pairs),
+    )
+    progress.stage("Comparing candidates", len(pairs))
+    scores = {}
+    for pair, score in zip(pairs, compared):
+        scores[pair] = score
+        progress.advance()
+
+    report = []
+    for suspect, (name, _) in enumerate(suspects):
+        if hashes[suspect].get("error"):
+            report.append({"name": name, "sha256_hash": None, "perceptual_hash": None, "matches": [],
+                           "verdict": NO_MATCH, "error": "Not a readable image."})
+            continue
+        matches = []
+        for row, distance, exact in chosen[suspect]:
+            score = {"identical": True, "changed": 0.0, "ssim": 1.0} if exact else scores.get((suspect, row))
+            if score is None:
+                continue  # the stored file could not be read
+            matches.append({"image_id": stored[row][0], "distance": distance, "exact": exact, **score})
+        matches.sort(key=lambda match: (not match["exact"], not match["identical"], -match["ssim"]))
+        if not matches:
+            verdict = NO_MATCH
+        elif matches[0]["exact"]:
+            verdict = EXACT
+        elif matches[0]["identical"]:
+            verdict = IDENTICAL
+        else:
+            verdict = MODIFIED
+        report.append({"name": name, **hashes[suspect], "matches": matches, "verdict": verdict, "error": None})
+    return report
+
+
+def _hash_or_none(path):
+    try:
+        return hash_suspect(path)
+    except (OSError, ValueError, SyntaxError):
+        return None
+
+
+def _match_or_none(stored_path, suspect_path, with_scale, working_size):
+    try:
+        return match_images(stored_path, suspect_path, with_scale, working_size)
+    except (OSError, ValueError, SyntaxError):
+        return None
+
+
+def matrix(report):
+    """
+    The report as a match matrix: the stored image ids that matched any
+    suspect (columns) and, per suspect, the match for each column or ``None``.
+    """
+    columns = sorted({match["image_id"] for row in report for match in row["matches"]})
+    cells = []
+    for row in report:
+        by_image = {match["image_id"]: match for match in row["matches"]}
+        cells.append({"suspect": row, "cells": [by_image.get(image_id) for image_id in columns]})
+    return columns, cells
+
+
+def summary(report):
+    """Suspect counts per verdict."""
+    counts = {verdict: 0 for verdict in VERDICTS}
+    for row in report:
+        counts[row["verdict"]] += 1
+    return counts
@@ -1,23 +1,50 @@
 import os
-import hashlib
-import imagehash
-from PIL import ImageChops, ImageDraw
+import tempfile
 from PIL import Image as PILImage
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.core.files import File
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.views.decorators.http import require_http_methods
+from django.urls import reverse
 from django.template.loader import get_template
+from datetime import datetime, time, timedelta
+from django.utils import timezone
 from django.utils.dateparse import parse_date
 from django.core.paginator import Paginator
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, Http404, HttpResponseForbidden, StreamingHttpResponse
 from django.contrib import messages
-from .models import Case, Image, ActivityLog
+from .models import Case, Image, ActivityLog, ImageMetadata, UploadSession
 from .forms import CaseForm, ImageUploadForm
-from xhtml2pdf import pisa
+from .registration import get_reference_cache, reference_key
+from .analysis import compare_images, compare_frames, copy_move_overlay, process_upload
+from .transcoding import storage_name, RENDITIONS
+from .deletion import delete_cases
+from .routers import replica_reads
+from .similarity import PHASH
+from .workers import PoolSaturated
+from . import workers
+from .instrumentation import span, timed, render_metrics
+from . import caching
+from . import clustering
+from . import engines
+from . import log_archive
+from . import media
+from . import progress
+from . import stats
+from . import uploads
+from . import verification
+from .uploads import UploadError
 import csv
 from django.conf import settings
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
 
 # Helper functions
+timed_render = timed("render")(render)  # template rendering shows up as its own stage
+
+
 def has_case_permission(user, case):
     """
     Check if the user has permission to manage the given case.
@@ -36,6 +63,73 @@ def safe_parse_date(date_str):
         return None
 
 
+def metadata_conditions(params):
+    """
+    ``ImageMetadata`` lookups for the image metadata filters in ``params``:
+    make, model and software (substring), gps (yes/no) and a capture date range.
+    """
+    conditions = {}
+    for field in ('make', 'model', 'software'):
+        value = params.get(field, '').strip()
+        if value:
+            conditions[f'{field}__icontains'] = value
+    if params.get('gps') in ('yes', 'no'):
+        conditions['gps_present'] = params['gps'] == 'yes'
+    # Whole days as aware datetimes, so the captured_at index can be used
+    captured_from = safe_parse_date(params.get('captured_from') or '')
+    captured_to = safe_parse_date(params.get('captured_to') or '')
+    if captured_from:
+        conditions['captured_at__gte'] = timezone.make_aware(datetime.combine(captured_from, time.min))
+    if captured_to:
+        conditions['captured_at__lt'] = timezone.make_aware(datetime.combine(captured_to + timedelta(days=1), time.min))
+    return conditions
+
+
+# Case list sort keys: column, and whether the first click sorts descending
+CASE_SORTS = {
+    'name': ('name', False),
+    'images': ('image_count', True),
+    'size': ('total_bytes', True),
+    'tampered': ('tampered_count', True),
+    'activity': ('last_activity_at', True),
+}
+DEFAULT_CASE_SORT = '-activity'
+
+
+def case_ordering(sort):
+    """
+    The valid sort key for ``sort`` (e.g. ``-activity``) and its ORDER BY,
+    tie-broken by id so pages are stable; each matches an index on Case.
+    """
+    if (sort or '').lstrip('-') not in CASE_SORTS:
+        sort = DEFAULT_CASE_SORT
+    prefix = '-' if sort.startswith('-') else ''
+    return sort, [prefix + CASE_SORTS[sort.lstrip('-')][0], prefix + 'id']
+
+
+def sort_links(request, sort):
+    """Header link and current direction of each sortable case list column."""
+    params = request.GET.copy()
+    params.pop('page', None)
+    links = {}
+    for key, (_, descending_first) in CASE_SORTS.items():
+        if sort.lstrip('-') == key:
+            params['sort'] = key if sort.startswith('-') else '-' + key  # flip the direction
+            direction = 'desc' if sort.startswith('-') else 'asc'
+        else:
+            params['sort'] = '-' + key if descending_first else key
+            direction = ''
+        links[key] = {'url': '?' + params.urlencode(), 'direction': direction}
+    return links
+
+
+def query_without_page(request):
+    """The current query string minus ``page``, for pagination links."""
+    params = request.GET.copy()
+    params.pop('page', None)
+    return params.urlencode()
+
+
 # Case Management Views
 @login_required
 def create_case(request):
@@ -68,15 +162,17 @@ def create_case(request):
     else:
         form = CaseForm()
 
-    return render(request, 'case_app/create_case.html', {'form': form})
+    return timed_render(request, 'case_app/create_case.html', {'form': form})
 
 @login_required
+@replica_reads
 def case_list(request):
     """
     Display a list of cases with search and filtering.
     """
     user = request.user
     cases = Case.objects.all() if user.is_superuser else Case.objects.filter(investigator=user)
+    cases = cases.select_related('investigator')
 
     # Get search query and date filters safely
     search_query = request.GET.get('search', '')
@@ -103,32 +199,57 @@ def case_list(request):
     if end_date:
         cases = cases.filter(created_at__lte=end_date)
 
-    # Pagination
-    paginator = Paginator(cases, 5)
-    page_number = request.GET.get('page')
-    cases_page = paginator.get_page(page_number)
+    # Cases with at least one image matching the metadata filters
+    scope = caching.scope_for(user)
+    namespaces = [caching.list_namespace(scope)]
+    conditions = metadata_conditions(request.GET)
+    if conditions:
+        cases = cases.filter(Exists(ImageMetadata.objects.filter(image__case=OuterRef('pk'), **conditions)))
+        namespaces.append(caching.images_namespace())
+
+    # Sorted on the denormalized statistics (see case_app.stats)
+    sort, ordering = case_ordering(request.GET.get('sort'))
+    cases = cases.order_by(*ordering)
 
-    return render(request, 'case_app/case_list.html', {
+    # Pagination (cached per permission scope, sort and query string)
+    key = caching.make_key('case_list', namespaces, scope, params={**request.GET.dict(), 'sort': sort})
+    cases_page = caching.cached_page(key, cases, 5, request.GET.get('page'))
+
+    return timed_render(request, 'case_app/case_list.html', {
         'cases': cases_page,
         'search_query': search_query,
         'start_date': request.GET.get('start_date', ''),  # Keep raw input for form
         'end_date': request.GET.get('end_date', ''),
+        'metadata_filtered': bool(conditions),
+        'query': query_without_page(request),
+        'sort': sort,
+        'sort_links': sort_links(request, sort),
     })
 
 @login_required
+@replica_reads
 def case_details(request, case_id):
     """
     Display details of a specific case, including its images.
     """
-    case = get_object_or_404(Case, id=case_id)
-    images = case.images.all()
+    namespaces = [caching.details_namespace(case_id)]
+    case = caching.cached(
+        caching.make_key('case', namespaces, case_id),
+        lambda: get_object_or_404(Case.objects.select_related('investigator'), id=case_id),
+    )
+    images = case.images.only(*Image.LISTING_FIELDS)
 
     # Pagination
-    paginator = Paginator(images, 5)  # Show 5 images per page
     page_number = request.GET.get('page')
-    images_page = paginator.get_page(page_number)
-
-    return render(request, 'case_app/case_details.html', {'case': case, 'images': images_page})
+    key = caching.make_key('case_images', namespaces, case_id, params={'page': page_number or ''})
+    images_page = caching.cached_page(key, images, 5, page_number)  # Show 5 images per page
+
+    return timed_render(request, 'case_app/case_details.html', {
+        'case': case,
+        'images': images_page,
+        'details_version': caching.get_version(namespaces[0]),
+        'cache_timeout': settings.CASE_CACHE_TIMEOUT,
+    })
 
 
 @login_required
@@ -151,14 +272,14 @@ def edit_case(request, case_id):
     else:
         form = CaseForm(instance=case)
 
-    return render(request, 'case_app/edit_case.html', {'form': form, 'case': case})
+    return timed_render(request, 'case_app/edit_case.html', {'form': form, 'case': case})
 
 
 @login_required
 def delete_case(request, case_id):
     """
-    Safely delete a case by first deleting all related logs and images, 
-    with proper error handling to prevent IntegrityErrors.
+    Delete a case with all its images and logs in bulk; its files are
+    removed in the background (see ``case_app.deletion``).
     """
     case = get_object_or_404(Case, id=case_id)
 
@@ -168,13 +289,9 @@ def delete_case(request, case_id):
 
     if request.method == 'POST':
         try:
-            # Delete related logs and images before deleting the case
-            ActivityLog.objects.filter(case=case).delete()
-            Image.objects.filter(case=case).delete()
-
-            # Now delete the case
-            case.delete()
-            messages.success(request, "Case deleted successfully.")
+            with progress.track(request, f"Deleting {case.name}"):
+                deleted = delete_cases([case.id], request.user)
+            messages.success(request, f"Case deleted successfully with {deleted['images']} images.")
             return redirect('case_app:case_list')
 
         except IntegrityError as e:
@@ -185,7 +302,7 @@ def delete_case(request, case_id):
             messages.error(request, f"Unexpected error occurred: {str(e)}")
             return redirect('case_app:case_details', case_id=case.id)
 
-    return render(request, 'case_app/delete_case.html', {'case': case})
+    return timed_render(request, 'case_app/delete_case.html', {'case': case})
 
 
 # Image Management Views
@@ -211,7 +328,11 @@ def upload_image(request, case_id):
             return redirect('case_app:case_details', case_id=case.id)
     else:
         form = ImageUploadForm()
-    return render(request, 'case_app/upload_image.html', {'form': form, 'case': case})
+    return timed_render(request, 'case_app/upload_image.html', {
+        'form': form,
+        'case': case,
+        'chunk_size': settings.UPLOAD_CHUNK_SIZE,
+    })
 
 @login_required
 def delete_image(request, image_id):
@@ -243,34 +364,43 @@ def delete_image(request, image_id):
 
         return redirect('case_app:case_details', case_id=case_id)
 
-    return render(request, 'case_app/delete_image.html', {'image': image})
+    return timed_render(request, 'case_app/delete_image.html', {'image': image})
 
 # Export and Tampering Detection Views
+@replica_reads
 def export_case_pdf(request, case_id):
     """
     Export case details to a PDF.
     """
     case = get_object_or_404(Case, id=case_id)
-    images = case.images.all()
-
-    template = get_template('case_app/export_case_pdf.html')
-    html = template.render({'case': case, 'images': images})
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="case_{case_id}.pdf"'
-
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse('Error generating PDF', status=500)
+    images = case.images.only(*Image.LISTING_FIELDS)
+
+    with progress.track(request, f"PDF export of {case.name}") as reporter:
+        template = get_template('case_app/export_case_pdf.html')
+        progress.stage("Rendering")
+        with span("render"):
+            html = template.render({'case': case, 'images': images})
+
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="case_{case_id}.pdf"'
+
+        progress.stage("Writing PDF")
+        with span("pdf"):
+            pisa_status = engines.pisa.CreatePDF(html, dest=response, link_callback=media.pdf_link_callback)
+        if pisa_status.err:
+            if reporter:
+                reporter.fail("Error generating PDF")
+            return HttpResponse('Error generating PDF', status=500)
     return response
 
 
+@replica_reads
 def export_case_csv(request, case_id):
     """
     Export case details to a CSV file.
     """
     case = get_object_or_404(Case, id=case_id)
-    images = case.images.all()
+    images = case.images.only(*Image.LISTING_FIELDS)
 
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="case_{case_id}.csv"'
@@ -285,100 +415,620 @@ def export_case_csv(request, case_id):
     writer.writerow([])
     writer.writerow(['Uploaded Images'])
     writer.writerow(['Image Name', 'Image URL'])
-    for image in images:
-        writer.writerow([image.image.name, request.build_absolute_uri(image.image.url)])
+    with progress.track(request, f"CSV export of {case.name}"):
+        if progress.active():
+            progress.stage("Writing rows", images.count())
+        for image in images:
+            writer.writerow([image.image.name, request.build_absolute_uri(image.image.url)])
+            progress.advance()
 
     return response
 
+def user_temp_dir(user):
+    """Directory for ``user``'s detection artifacts; serve_media shows them to nobody else."""
+    return os.path.join(settings.MEDIA_ROOT, "temp", str(user.pk))
+
+
+def user_temp_url(user, name):
+    return f"{settings.MEDIA_URL}temp/{user.pk}/{name}"
+
+
+def compare_with_stored(stored_image, uploaded, uploaded_name, temp_dir):
+    """
+    Run ``compare_images`` for a stored ``Image`` in this process, reusing
+    and filling the cached registration reference.  Multi-frame images are
+    compared frame by frame with ``compare_frames`` instead.
+    """
+    if stored_image.frame_count > 1:
+        return compare_frames(
+            stored_image.image.path, uploaded, list(stored_image.frames.values_list('sha256_hash', 'perceptual_hash')),
+            stored_image.case.tampering_threshold, temp_dir,
+        )
+
+    key = reference_key(stored_image, settings.REGISTRATION_WORKING_SIZE)
+    reference = get_reference_cache().get(key)
+    result = compare_images(
+        stored_image.image.path, uploaded, stored_image.perceptual_hash, stored_image.case.tampering_threshold,
+        temp_dir, uploaded_name, reference=reference,
+        with_scale=settings.REGISTRATION_ESTIMATE_SCALE, working_size=settings.REGISTRATION_WORKING_SIZE,
+        metric=stored_image.case.similarity_metric,
+    )
+    if reference is None:
+        get_reference_cache().set(key, result["reference"])
+    return result
+
+
+def log_detection(user, stored_image, uploaded_name, result):
+    """
+    Record a tampering detection in the case's activity log.
+    """
+    alignment = result["alignment"]
+    frames = result.get("frames")
+    ssim_line = ""
+    if result.get("ssim") is not None:
+        ssim_line = f"\n            Structural Similarity ({result['metric']}): {result['ssim']:.4f}"
+    frames_line = ""
+    if frames:
+        frames_line = (f"\n            Frames: {frames['compared']} compared of {frames['stored']} stored / "
+                       f"{frames['uploaded']} uploaded, first divergent: "
+                       f"{frames['divergent'] if frames['divergent'] is not None else 'none'}")
+    with span("db_write"):
+        ActivityLog.objects.create(
+            user=user,
+            case=stored_image.case,
+            action=stats.DETECTION_ACTION,
+            details=f"""
+            Uploaded Image: {uploaded_name}
+            Stored Image ID: {stored_image.id}
+            Perceptual Hashes - Stored: {stored_image.perceptual_hash}, Uploaded: {result["uploaded_phash"]}
+            Hamming Distance: {result["hamming_distance"]}{ssim_line}{frames_line}
+            Alignment: {f"dx={alignment['dx']}, dy={alignment['dy']}, scale={alignment['scale']:.3f}" if alignment else "none (resized)"}
+            Similarity: {result["similarity"]}%
+            Threshold: {stored_image.case.tampering_threshold}
+            Status: {result["status"]}
+            """
+        )
+        stats.record_detection(stored_image.case, result["tampered"])
+
+
+def detection_context(stored_image, result, user):
+    return {
+        "stored_image": stored_image,
+        "uploaded_image_url": user_temp_url(user, result["uploaded_image_name"]),
+        "diff_image_url": user_temp_url(user, result["diff_image_name"]),
+        "stored_phash": stored_image.perceptual_hash,
+        "uploaded_phash": result["uploaded_phash"],
+        "hamming_distance": result["hamming_distance"],
+        "similarity": round(result["similarity"], 2),
+        "tampered": result["tampered"],
+        "status": result["status"],
+        "threshold": stored_image.case.tampering_threshold,
+        "alignment": result["alignment"],
+        "frames": result.get("frames"),
+        "metric": result.get("metric", PHASH),
+        "ssim": result.get("ssim"),
+        "ssim_map_url": user_temp_url(user, result["ssim_map_name"]) if result.get("ssim_map_name") else None,
+    }
+
+
 @login_required
 def detect_tampering(request, image_id):
-    stored_image = get_object_or_404(Image, id=image_id)
-    case = stored_image.case
-    tampering_threshold = case.tampering_threshold
+    stored_image = get_object_or_404(Image.objects.select_related('case'), id=image_id)
 
     if request.method == 'POST' and 'uploaded_image' in request.FILES:
         try:
             uploaded_image = request.FILES['uploaded_image']
-            uploaded_pil = PILImage.open(uploaded_image)
-            stored_pil = PILImage.open(stored_image.image.path)
-
-            # Resize and convert images to the same mode
-            uploaded_pil = uploaded_pil.resize(stored_pil.size).convert("RGB")
-            stored_pil = stored_pil.convert("RGB")
-
-            # Save the uploaded image temporarily
-            uploaded_image_name = f"temp_{uploaded_image.name}"
-            uploaded_image_path = os.path.join(settings.MEDIA_ROOT, "temp", uploaded_image_name)
-            os.makedirs(os.path.dirname(uploaded_image_path), exist_ok=True)
-            uploaded_pil.save(uploaded_image_path)
-
-            # Generate difference image
-            diff_image = ImageChops.difference(stored_pil, uploaded_pil)
-            diff_image_path = os.path.join(settings.MEDIA_ROOT, "temp", "diff_image.png")
-            diff_image.save(diff_image_path)
-
-            # Compute perceptual hashes
-            uploaded_phash = str(imagehash.phash(uploaded_pil))
-            stored_phash = stored_image.perceptual_hash
-            hamming_distance = imagehash.hex_to_hash(uploaded_phash) - imagehash.hex_to_hash(stored_phash)
-
-            # Calculate similarity percentage
-            similarity = max(0, 100 - (hamming_distance / tampering_threshold) * 100)
-
-            # Determine tampering status
-            diff_bbox = diff_image.getbbox()
-            tampered = bool(diff_bbox)
-            status = "Tampered" if tampered else "Original"
-
-            # Log the action
-            ActivityLog.objects.create(
-                user=request.user,
-                case=case,
-                action="Tampering Detection Performed",
-                details=f"""
-                Uploaded Image: {uploaded_image.name}
-                Stored Image ID: {stored_image.id}
-                Perceptual Hashes - Stored: {stored_phash}, Uploaded: {uploaded_phash}
-                Hamming Distance: {hamming_distance}
-                Similarity: {similarity}%
-                Threshold: {tampering_threshold}
-                Status: {status}
-                """
-            )
-
-            return render(request, "case_app/detect_tampering.html", {
-                "stored_image": stored_image,
-                "uploaded_image_url": f"/media/temp/{uploaded_image_name}",
-                "diff_image_url": f"/media/temp/diff_image.png",
-                "stored_phash": stored_phash,
-                "uploaded_phash": uploaded_phash,
-                "hamming_distance": hamming_distance,
-                "similarity": round(similarity, 2),
-                "tampered": tampered,
-                "status": status,
-                "threshold": tampering_threshold,
-            })
+            with progress.track(request, f"Comparing with image {stored_image.id}"):
+                result = compare_with_stored(
+                    stored_image, uploaded_image, uploaded_image.name, user_temp_dir(request.user),
+                )
+            log_detection(request.user, stored_image, uploaded_image.name, result)
+            return timed_render(request, "case_app/detect_tampering.html",
+                                detection_context(stored_image, result, request.user))
 
         except Exception as e:
-            return render(request, "case_app/detect_tampering.html", {
+            return timed_render(request, "case_app/detect_tampering.html", {
                 "stored_image": stored_image,
                 "error": f"Invalid image or processing error: {str(e)}"
             })
 
-    return render(request, "case_app/detect_tampering.html", {
+    return timed_render(request, "case_app/detect_tampering.html", {
         "stored_image": stored_image,
         "error": "Please upload an image for testing.",
     })
 
+# Async views: the same work as upload_image / detect_tampering, with the
+# decode, hash and diff steps handed to the shared process pool
+def spool_upload(upload):
+    """
+    Return a path to the uploaded file on disk and whether it is a temporary
+    copy the caller must remove (small uploads are kept in memory by Django).
+    """
+    if hasattr(upload, 'temporary_file_path'):
+        return upload.temporary_file_path(), False
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(upload.name)[1])
+    with os.fdopen(fd, 'wb') as handle:
+        for chunk in upload.chunks():
+            handle.write(chunk)
+    return path, True
+
+
+def store_processed_upload(case, user, filename, processed, source_path):
+    """
+    Save an ``Image`` from the output of ``process_upload`` and log it.
+    ``source_path`` is the upload itself, stored when no transcoded copy was made.
+    """
+    encoded_path = processed['encoded_path']
+    try:
+        with open(encoded_path or source_path, 'rb') as handle:
+            image = Image(
+                case=case,
+                original_filename=filename,
+                sha256_hash=processed['sha256_hash'],
+                perceptual_hash=processed['perceptual_hash'],
+            )
+            image.image = File(handle, name=storage_name(filename, processed['storage_format']))
+            image._encoded = True
+            image._frames = processed.get('frames')
+            image._metadata = processed.get('metadata')
+            image.save()
+    finally:
+        if encoded_path:
+            os.remove(encoded_path)
+
+    ActivityLog.objects.create(
+        user=user,
+        action=f"Uploaded image to case: {case.name}",
+        case=case,
+    )
+    return image
+
+
 @login_required
-def case_logs(request, case_id):
+async def upload_image_async(request, case_id):
+    """
+    Upload an image to a case, hashing and re-encoding it in the process pool.
+    Answers 429 with Retry-After when the pool is saturated.
+    """
+    case = await aget_object_or_404(Case, id=case_id)
+    upload = request.FILES.get('image')
+    if request.method != 'POST' or upload is None:
+        return redirect('case_app:upload_image', case_id=case.id)
+
+    # Django has fully received the body before the view runs, so a slow
+    # client never holds a pool slot
+    path, spooled = await sync_to_async(spool_upload)(upload)
+    try:
+        try:
+            processed = await workers.submit(process_upload, path, None, case.storage_format, case.storage_quality)
+        except PoolSaturated:
+            return workers.busy_response()
+        except Exception as e:
+            messages.error(request, f"Invalid image or processing error: {str(e)}")
+            return redirect('case_app:upload_image', case_id=case.id)
+
+        user = await request.auser()
+        await sync_to_async(store_processed_upload)(case, user, upload.name, processed, path)
+    finally:
+        if spooled:
+            os.remove(path)
+    return redirect('case_app:case_details', case_id=case.id)
+
+
+@login_required
+async def detect_tampering_async(request, image_id):
+    """
+    Async variant of detect_tampering with the comparison run in the process pool.
+    """
+    stored_image = await aget_object_or_404(Image.objects.select_related('case'), id=image_id)
+    template = "case_app/detect_tampering.html"
+
+    if request.method != 'POST' or 'uploaded_image' not in request.FILES:
+        return await sync_to_async(timed_render)(request, template, {
+            "stored_image": stored_image,
+            "error": "Please upload an image for testing.",
+        })
+
+    uploaded_image = request.FILES['uploaded_image']
+    user = await request.auser()
+    temp_dir = user_temp_dir(user)
+    key = reference_key(stored_image, settings.REGISTRATION_WORKING_SIZE)
+    reference = None
+    if stored_image.frame_count > 1:
+        frames = [frame async for frame in stored_image.frames.values_list('sha256_hash', 'perceptual_hash')]
+    else:
+        reference = await get_reference_cache().aget(key)
+
+    path, spooled = await sync_to_async(spool_upload)(uploaded_image)
+    try:
+        if stored_image.frame_count > 1:
+            result = await workers.submit(
+                compare_frames, stored_image.image.path, path, frames,
+                stored_image.case.tampering_threshold, temp_dir,
+            )
+        else:
+            result = await workers.submit(
+                compare_images, stored_image.image.path, path, stored_image.perceptual_hash,
+                stored_image.case.tampering_threshold, temp_dir, uploaded_image.name, reference,
+                settings.REGISTRATION_ESTIMATE_SCALE, settings.REGISTRATION_WORKING_SIZE,
+                stored_image.case.similarity_metric,
+            )
+    except PoolSaturated:
+        return workers.busy_response()
+    except Exception as e:
+        return await sync_to_async(timed_render)(request, template, {
+            "stored_image": stored_image,
+            "error": f"Invalid image or processing error: {str(e)}"
+        })
+    finally:
+        if spooled:
+            os.remove(path)
+
+    if reference is None and result["reference"] is not None:
+        await get_reference_cache().aset(key, result["reference"])
+    await sync_to_async(log_detection)(user, stored_image, uploaded_image.name, result)
+    return await sync_to_async(timed_render)(request, template, detection_context(stored_image, result, user))
+
+# Chunked, resumable uploads (see case_app.uploads)
+def upload_session_state(session):
+    """JSON description of an upload session for the client."""
+    return {
+        'id': str(session.id),
+        'filename': session.filename,
+        'size': session.total_size,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'received': session.received,
+        'missing': session.missing(),
+        'image_id': session.image_id,
+        'finalizing': session.finalizing,
+        'status_url': reverse('case_app:upload_session_status', args=[session.id]),
+        'complete_url': reverse('case_app:upload_session_complete', args=[session.id]),
+    }
+
+
+@login_required
+@require_http_methods(['POST'])
+def upload_session_create(request, case_id):
+    """
+    Start a chunked upload. Expects ``filename`` and ``size`` (bytes) and
+    optionally ``chunk_size``; answers 429 when the user has too many open.
+    """
     case = get_object_or_404(Case, id=case_id)
-    logs = case.logs.all().order_by('-timestamp')
-    paginator = Paginator(logs, 10)
+    if not has_case_permission(request.user, case):
+        raise PermissionDenied
+    try:
+        total_size = int(request.POST.get('size', ''))
+        chunk_size = int(request.POST['chunk_size']) if request.POST.get('chunk_size') else None
+        session = uploads.create_session(case, request.user, request.POST.get('filename'), total_size, chunk_size)
+    except ValueError:
+        return JsonResponse({'error': "size and chunk_size must be integers."}, status=400)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(upload_session_state(session), status=201)
+
+
+@login_required
+@require_http_methods(['GET'])
+def upload_session_status(request, session_id):
+    """
+    Report which chunks have been received, so an interrupted client can resume.
+    """
+    session = get_object_or_404(UploadSession, id=session_id, user=request.user)
+    return JsonResponse(upload_session_state(session))
+
+
+@login_required
+@require_http_methods(['PUT'])
+def upload_chunk(request, session_id, index):
+    """
+    Store one chunk; the request body is the raw chunk bytes.
+    """
+    session = get_object_or_404(UploadSession, id=session_id, user=request.user)
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        session = uploads.write_chunk(session, index, request, length)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(upload_session_state(session))
+
+
+@login_required
+@require_http_methods(['POST'])
+def upload_session_complete(request, session_id):
+    """
+    Finalize a chunked upload: ingest the assembled file as an ``Image`` of the case.
+    The session is claimed in a short transaction and processed outside it, so
+    no row lock or transaction is held while a large file is decoded.
+    """
+    with transaction.atomic():
+        session = get_object_or_404(
+            UploadSession.objects.select_for_update().select_related('case'), id=session_id, user=request.user,
+        )
+        claimed = session.image_id is None and not session.finalizing
+        if claimed:
+            session.finalizing = True
+            session.save(update_fields=['finalizing', 'updated_at'])
+
+    if session.image_id is None:
+        if not claimed:
+            return JsonResponse({'error': "This upload is already being finalized."}, status=409)
+        try:
+            sha256_hash = uploads.finish_hash(session)
+            part_path = uploads.part_path(session)
+            processed = process_upload(part_path, sha256_hash, session.case.storage_format,
+                                       session.case.storage_quality)
+        except Exception as e:
+            UploadSession.objects.filter(pk=session.pk).update(finalizing=False)
+            if isinstance(e, UploadError):
+                return JsonResponse({'error': str(e)}, status=e.status)
+            return JsonResponse({'error': f"Invalid image or processing error: {str(e)}"}, status=400)
+
+        with transaction.atomic():
+            image = store_processed_upload(session.case, request.user, session.filename, processed, part_path)
+            session.image = image
+            session.finalizing = False
+            session.save(update_fields=['image', 'finalizing', 'updated_at'])
+        uploads.discard(session)
+
+    state = upload_session_state(session)
+    state['case_url'] = reverse('case_app:case_details', args=[session.case_id])
+    return JsonResponse(state)
+
+
+@login_required
+def image_rendition(request, image_id, name):
+    """
+    Serve a viewing rendition of a stored image, transcoding it on first access.
+    """
+    if name not in RENDITIONS:
+        raise Http404("Unknown rendition.")
+    image = get_object_or_404(Image.objects.select_related('case'), id=image_id)
+    if not has_case_permission(request.user, image.case):
+        raise PermissionDenied
+    try:
+        with span("rendition"):
+            path = image.rendition_path(name)
+    except (OSError, PILImage.DecompressionBombError):
+        raise Http404("The image could not be transcoded.")
+    return media.file_response(
+        request, os.path.relpath(path, settings.MEDIA_ROOT), cache_control='private, max-age=86400',
+        content_type='image/jpeg',
+    )
+
+
+@login_required
+def serve_media(request, path):
+    """
+    Serve a stored file with ETag, 304 and Range support (see case_app.media):
+    a case's images and renditions to its investigator and admins, detection
+    results to the user who ran the detection (and admins).  Partial uploads
+    are never served.
+    """
+    name = media.storage_name(path)
+    area, _, rest = (name or '').partition('/')
+    etag, cache_control = None, media.REVALIDATE
+    if area in ('cases', 'renditions'):
+        case_id = rest.partition('/')[0]
+        investigators = list(Case.objects.filter(id=case_id).values_list('investigator_id', flat=True)) \
+            if case_id.isdigit() else []
+        if not investigators:
+            raise Http404("Unknown case.")
+        if not request.user.is_superuser and investigators[0] != request.user.pk:
+            raise PermissionDenied
+        if area == 'cases':
+            # Stored images get random names and are never rewritten
+            cache_control = media.IMMUTABLE
+            sha256_hash = Image.objects.filter(image=name).values_list('sha256_hash', flat=True).first()
+            etag = f'"{sha256_hash}"' if sha256_hash else None
+    elif area == 'temp':
+        # Detection artifacts are written to temp/<user id>/ (user_temp_dir)
+        if not request.user.is_superuser and rest.partition('/')[0] != str(request.user.pk):
+            raise PermissionDenied
+    else:
+        raise Http404("Unknown media.")
+    try:
+        return media.file_response(request, name, etag=etag, cache_control=cache_control)
+    except FileNotFoundError:
+        raise Http404("File not found.")
+
+@login_required
+async def copy_move_analysis(request, image_id):
+    """
+    Search a stored image for regions cloned from elsewhere in the same image,
+    in the process pool.  Answers 429 with Retry-After when the pool is saturated.
+    """
+    stored_image = await aget_object_or_404(Image.objects.select_related('case__investigator'), id=image_id)
+    user = await request.auser()
+    if not has_case_permission(user, stored_image.case):
+        raise PermissionDenied
+    template = "case_app/copy_move.html"
+
+    overlay_name = f"copy_move_{stored_image.id}.png"
+    try:
+        regions = await workers.submit(
+            copy_move_overlay, stored_image.image.path, os.path.join(user_temp_dir(user), overlay_name),
+            settings.COPY_MOVE_BLOCK_SIZE, settings.COPY_MOVE_MAX_BLOCKS,
+        )
+    except PoolSaturated:
+        return workers.busy_response()
+    except Exception as e:
+        return await sync_to_async(timed_render)(request, template, {
+            "stored_image": stored_image,
+            "error": f"Invalid image or processing error: {str(e)}"
+        })
+
+    status = "Tampered" if regions else "Original"
+    await ActivityLog.objects.acreate(
+        user=user,
+        case=stored_image.case,
+        action="Copy-Move Detection Performed",
+        details=f"""
+            Stored Image ID: {stored_image.id}
+            Cloned Regions: {len(regions)}
+            Status: {status}
+            """
+    )
+    return await sync_to_async(timed_render)(request, template, {
+        "stored_image": stored_image,
+        "overlay_url": user_temp_url(user, overlay_name),
+        "regions": regions,
+        "tampered": bool(regions),
+        "status": status,
+    })
+
+@login_required
+@replica_reads
+def case_logs(request, case_id):
+    case = caching.cached(
+        caching.make_key('case', [caching.details_namespace(case_id)], case_id),
+        lambda: get_object_or_404(Case.objects.select_related('investigator'), id=case_id),
+    )
+    # Entries past the retention period are read from the archive (see case_app.log_archive)
+    logs = log_archive.CaseLogHistory(case.id)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    namespace = caching.logs_namespace(case_id)
+    page_obj = caching.cached_page(caching.make_key('case_logs', [namespace], case_id, params={'page': page_number or ''}), logs, 10, page_number)
 
-    return render(request, 'case_app/case_logs.html', {
+    return timed_render(request, 'case_app/case_logs.html', {
         'logs': page_obj,
-        'case': case
+        'case': case,
+        'logs_version': caching.get_version(namespace),
+        'cache_timeout': settings.CASE_CACHE_TIMEOUT,
     })
+
+
+@login_required
+@replica_reads
+def related_images(request, case_id):
+    """
+    List exact and near-duplicate copies of this case's images, in any case.
+    """
+    case = get_object_or_404(Case, id=case_id)
+    if not has_case_permission(request.user, case):
+        raise PermissionDenied
+    return timed_render(request, 'case_app/related_images.html', {
+        'case': case,
+        'related': clustering.related_images(case, request.user),
+        'max_distance': settings.CLUSTER_MAX_DISTANCE,
+    })
+
+
+@login_required
+def verify_case(request, case_id):
+    """
+    Verify a batch of suspect files against every image of the case and
+    show the match matrix (see case_app.verification).
+    """
+    case = get_object_or_404(Case, id=case_id)
+    if not has_case_permission(request.user, case):
+        raise PermissionDenied
+    template = 'case_app/verify_case.html'
+    context = {'case': case, 'k': 3, 'max_distance': settings.VERIFY_MAX_DISTANCE}
+    if request.method != 'POST':
+        return timed_render(request, template, context)
+
+    files = request.FILES.getlist('suspects')
+    try:
+        k = min(max(int(request.POST.get('k', 3)), 1), 10)
+    except ValueError:
+        k = 3
+    context['k'] = k
+    if not files:
+        context['error'] = "Please choose the suspect files to verify."
+        return timed_render(request, template, context)
+
+    spooled = [spool_upload(upload) for upload in files]
+    try:
+        # A few slots of the shared pool, so the async views keep the rest
+        with workers.reserve(settings.VERIFY_POOL_SLOTS) as pool, span("verify"), \
+                progress.track(request, f"Verifying {len(files)} files"):
+            report = verification.verify_batch(
+                case, [(upload.name, path) for upload, (path, _) in zip(files, spooled)], k=k, executor=pool,
+            )
+    except workers.PoolSaturated:
+        return workers.busy_response()
+    finally:
+        for path, temporary in spooled:
+            if temporary:
+                os.remove(path)
+
+    counts = verification.summary(report)
+    ActivityLog.objects.create(
+        user=request.user,
+        case=case,
+        action="Batch Verification Performed",
+        details=f"{len(report)} suspect files: " + ", ".join(
+            f"{counts[verdict]} {label.lower()}" for verdict, label in verification.VERDICTS.items()),
+    )
+    columns, rows = verification.matrix(report)
+    context.update({
+        'report': report,
+        'columns': columns,
+        'rows': rows,
+        'summary': [(label, counts[verdict]) for verdict, label in verification.VERDICTS.items()],
+        'verdicts': verification.VERDICTS,
+    })
+    return timed_render(request, template, context)
+
+
+
+@login_required
+@replica_reads
+def image_search(request):
+    """
+    Search images in the user's cases by camera, software, capture time and GPS.
+    """
+    images = (
+        Image.objects.select_related('case', 'metadata').defer('sha256_hash', 'perceptual_hash')
+        .order_by('-uploaded_at')
+    )
+    known = ImageMetadata.objects.all()
+    if not request.user.is_superuser:
+        images = images.filter(case__investigator=request.user)
+        known = known.filter(image__case__investigator=request.user)
+
+    conditions = metadata_conditions(request.GET)
+    if conditions:
+        images = images.filter(**{f'metadata__{lookup}': value for lookup, value in conditions.items()})
+
+    page_obj = Paginator(images, 20).get_page(request.GET.get('page'))
+    return timed_render(request, 'case_app/image_search.html', {
+        'images': page_obj,
+        'filters': {name: request.GET.get(name, '') for name in
+                    ('make', 'model', 'software', 'gps', 'captured_from', 'captured_to')},
+        'software_options': known.exclude(software='').order_by('software')
+                                 .values_list('software', flat=True).distinct()[:200],
+        'query': query_without_page(request),
+    })
+
+
+def metrics(request):
+    """
+    Expose the stage histograms in the Prometheus text format.
+    Only available with instrumentation enabled, to local or admin clients.
+    """
+    if not settings.INSTRUMENTATION_ENABLED:
+        raise Http404("Instrumentation is disabled.")
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS and not request.user.is_superuser:
+        return HttpResponseForbidden("Metrics are only available locally.")
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@login_required
+def progress_stream(request, token):
+    """
+    Server-sent events with the progress of the operation started with
+    ``token`` (see case_app.progress); resumes from the latest state.
+    """
+    if not progress.TOKEN.match(token):
+        raise Http404("Unknown progress token.")
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_id = 0
+    response = StreamingHttpResponse(
+        progress.stream(token, request.user.pk, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx would otherwise hold events back
+    return response
@@ -0,0 +1,117 @@
+"""
+Shared process pool for CPU-heavy image work from async views.
+
+The pool accepts at most ``IMAGE_POOL_WORKERS + IMAGE_POOL_QUEUE_SIZE`` jobs
+at a time.  Beyond that ``submit`` raises ``PoolSaturated`` immediately, so
+views can answer 429 with ``Retry-After`` instead of queueing without bound.
+Synchronous batch work (``reserve``) holds a few of the same slots and never
+has more jobs in the pool than it holds.
+"""
+import asyncio
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.http import HttpResponse
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+class PoolSaturated(Exception):
+    """Every worker is busy and the bounded queue is full."""
+
+
+def _init_worker():
+    # Workers may be spawned rather than forked; make settings usable there
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ImageGuard.settings")
+    django.setup()
+
+
+def get_executor():
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = settings.IMAGE_POOL_WORKERS or os.cpu_count() or 1
+                _slots = threading.BoundedSemaphore(workers + settings.IMAGE_POOL_QUEUE_SIZE)
+                _executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    return _executor
+
+
+def shutdown():
+    """Stop the pool (tests, benchmarks and server shutdown hooks)."""
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = _slots = None
+
+
+async def submit(func, *args):
+    """
+    Run ``func(*args)`` in the pool and await its result.  Raises
+    ``PoolSaturated`` without waiting when no slot is free.
+    """
+    executor = get_executor()
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        raise PoolSaturated()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        slots.release()
+
+
+class Reservation:
+    """Slots of the pool held by one synchronous caller."""
+
+    def __init__(self, executor, slots):
+        self.executor = executor
+        self.slots = slots
+
+    def map(self, func, *iterables):
+        """Like ``Executor.map``, with at most ``slots`` jobs in the pool at once."""
+        pending = deque()
+        try:
+            for args in zip(*iterables):
+                if len(pending) >= self.slots:
+                    yield pending.popleft().result()
+                pending.append(self.executor.submit(func, *args))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+@contextmanager
+def reserve(count):
+    """
+    Hold up to ``count`` free slots of the pool and yield a ``Reservation``
+    to run jobs in them.  Raises ``PoolSaturated`` when no slot is free.
+    """
+    executor = get_executor()
+    slots = _slots
+    held = 0
+    while held < count and slots.acquire(blocking=False):
+        held += 1
+    if not held:
+        raise PoolSaturated()
+    try:
+        yield Reservation(executor, held)
+    finally:
+        for _ in range(held):
+            slots.release()
+
+
+def busy_response():
+    """429 response telling the client when to retry."""
+    response = HttpResponse("Image processing is busy, please retry shortly.", status=429)
+    response["Retry-After"] = str(settings.IMAGE_POOL_RETRY_AFTER)
+    return response